@@ -0,0 +1,278 @@
+"""
+Punto de entrada ASGI (producción): uvicorn asgi:app  (ver serve.py)
+
+- Las rutas de más tráfico corren nativas en el event loop, sin ocupar un hilo mientras esperan:
+    GET  /api/esp32/eventos          long-poll de los dispositivos (future por conexión)
+    GET  /api/esp32/eventos/stream   Server-Sent Events
+    GET  /api/weather/temperatura    httpx + caché por celda
+    POST /api/clothing/generar       clima y alerta anterior en paralelo (Cosmos aio, Blob aio, httpx)
+- Todo lo demás lo atiende la app Flask de main.py a través de WsgiToAsgi (pool de hilos),
+  con el mismo comportamiento que bajo el servidor de desarrollo.
+- Solo se montan las rutas nativas de los blueprints habilitados (APP_BLUEPRINTS, ver create_app).
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import Headers, MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header
+
+from main import app as flask_app
+from service.canal_service import CANAL, CANAL_LONGPOLL_MAX_SEG, CANAL_SSE_LATIDO_SEG, CANAL_SSE_MAX_SEG
+from utils import esp32_codec
+from utils.async_clients import cerrar_clientes_async
+
+
+class Peticion:
+    """Lo mínimo de flask.request que usan las rutas nativas, armado desde el scope ASGI."""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        self.headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope.get("headers", [])])
+
+    async def cuerpo(self) -> bytes:
+        partes = []
+        while True:
+            mensaje = await self.receive()
+            if mensaje["type"] == "http.disconnect":
+                break
+            partes.append(mensaje.get("body", b""))
+            if not mensaje.get("more_body"):
+                break
+        return b"".join(partes)
+
+    async def json(self) -> dict:
+        try:
+            datos = json.loads(await self.cuerpo() or b"{}")
+        except ValueError:
+            return {}
+        return datos if isinstance(datos, dict) else {}
+
+    async def desconexion(self):
+        """Termina cuando el cliente cierra la conexión (el cuerpo de un GET ya se consumió)."""
+        while (await self.receive())["type"] != "http.disconnect":
+            pass
+
+    def float_arg(self, clave: str, default=None):
+        try:
+            return float(self.args[clave])
+        except (KeyError, ValueError):
+            return default
+
+    def quienes(self) -> list:
+        """Igual que _quienes_param de esp32_api: ?quien=Ana&quien=Luis o ?quien=Ana,Luis."""
+        quienes = []
+        for valor in self.args.getlist("quien"):
+            quienes.extend(q.strip() for q in valor.split(",") if q.strip())
+        return quienes
+
+    def cursor(self):
+        valor = self.args.get("cursor") or self.headers.get("Last-Event-ID")
+        return (valor or "").strip() or None
+
+    def formatos_audio(self) -> list:
+        return [f.strip() for f in self.args.get("formatos", "").split(",") if f.strip()]
+
+
+async def _enviar(send, status: int, body: bytes, headers=None):
+    lista = [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in (headers or {}).items()]
+    lista.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": lista})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _json(send, datos, status: int = 200):
+    body = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+    await _enviar(send, status, body, {"Content-Type": "application/json"})
+
+
+async def _responder(peticion: Peticion, send, datos, status: int = 200):
+    """Como _responder de esp32_api (JSON | MessagePack, gzip), para respuestas sin lista binaria."""
+    formatos = [f for f in esp32_codec.formatos_disponibles() if f != esp32_codec.BINARIO]
+    accept = peticion.headers.get("Accept")
+    formato = parse_accept_header(accept, MIMEAccept).best_match(formatos) if accept else esp32_codec.JSON
+    if formato is None:
+        return await _json(send, {"detalle": "Formato no soportado",
+                                  "formatos": esp32_codec.formatos_disponibles()}, 406)
+    compacto = peticion.args.get("compacto", "false").lower() in ("1", "true")
+    body = esp32_codec.codificar(datos, formato, compacto)
+    body, gz = esp32_codec.comprimir(body, peticion.headers.get("Accept-Encoding", ""))
+    headers = {
+        "Content-Type": formato + ("; charset=utf-8" if formato == esp32_codec.JSON else ""),
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if gz:
+        headers["Content-Encoding"] = "gzip"
+    await _enviar(send, status, body, headers)
+
+
+async def _esperar_eventos(peticion: Peticion, quienes, desde: str, timeout: float):
+    """
+    Versión async de CANAL.esperar: registra un future que despierta el hilo que publica
+    (call_soon_threadsafe). Corta antes si el dispositivo se desconecta.
+    """
+    loop = asyncio.get_running_loop()
+    aviso = loop.create_future()
+
+    def despertar():
+        loop.call_soon_threadsafe(lambda: aviso.done() or aviso.set_result(None))
+
+    listos = CANAL.registrar(quienes, desde, despertar)
+    if listos is not None:
+        return listos
+    desconexion = asyncio.ensure_future(peticion.desconexion())
+    try:
+        await asyncio.wait({aviso, desconexion}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        CANAL.quitar(quienes, despertar)
+        desconexion.cancel()
+    if desconexion.done() and not desconexion.cancelled():
+        raise ConnectionError("El dispositivo cerró la conexión")
+    return CANAL.pendientes(quienes, desde)
+
+
+# ---------- Rutas nativas ----------
+
+async def eventos_long_poll(peticion: Peticion, send):
+    """GET /api/esp32/eventos - mismo contrato que la ruta Flask (ver routes/esp32_api.py)."""
+    from routes.esp32_api import CONFIG_ESP32, _evento_dispositivo
+
+    quienes = peticion.quienes()
+    if not quienes:
+        return await _json(send, {"detalle": "Falta parametro 'quien'"}, 400)
+    timeout = min(max(peticion.float_arg("timeout", 25.0), 0.0), CANAL_LONGPOLL_MAX_SEG)
+
+    desde = peticion.cursor()
+    if desde is None:
+        eventos, cursor = [], CANAL.token_cursor()
+    else:
+        try:
+            eventos, cursor = await _esperar_eventos(peticion, quienes, desde, timeout)
+        except ConnectionError:
+            return
+
+    formatos = peticion.formatos_audio()
+    await _responder(peticion, send, {
+        "cursor": cursor,
+        "config_version": CONFIG_ESP32.token_version(),
+        "eventos": [_evento_dispositivo(e, formatos) for e in eventos],
+    })
+
+
+async def eventos_sse(peticion: Peticion, send):
+    """GET /api/esp32/eventos/stream - Server-Sent Events sin un hilo por conexión."""
+    from routes.esp32_api import _evento_dispositivo
+
+    quienes = peticion.quienes()
+    if not quienes:
+        return await _json(send, {"detalle": "Falta parametro 'quien'"}, 400)
+    desde = peticion.cursor()
+    if desde is None:
+        desde = CANAL.token_cursor()
+    formatos = peticion.formatos_audio()
+
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]})
+
+    async def escribir(texto: str):
+        await send({"type": "http.response.body", "body": texto.encode("utf-8"), "more_body": True})
+
+    await escribir("retry: 2000\n\n")
+    fin = time.time() + CANAL_SSE_MAX_SEG
+    try:
+        while time.time() < fin:
+            eventos, cursor = await _esperar_eventos(peticion, quienes, desde,
+                                                     min(CANAL_SSE_LATIDO_SEG, fin - time.time()))
+            if not eventos:
+                await escribir(": latido\n\n")
+                continue
+            for evento in eventos:
+                evento = _evento_dispositivo(evento, formatos)
+                datos = json.dumps(evento, ensure_ascii=False, separators=(",", ":"))
+                await escribir(f"id: {evento['cursor']}\nevent: {evento['tipo']}\ndata: {datos}\n\n")
+            desde = cursor
+    except (ConnectionError, OSError):
+        return
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def temperatura(peticion: Peticion, send):
+    """GET /api/weather/temperatura?lat=..&lon=.. - mismo contrato que routes/weather_api.py."""
+    from routes.weather_api import DEFAULT_LAT, DEFAULT_LON
+    from utils.weather_service import obtener_temp_actual_async
+
+    lat, lon = peticion.float_arg("lat"), peticion.float_arg("lon")
+    if lat is None or lon is None:
+        lat, lon = DEFAULT_LAT, DEFAULT_LON
+    try:
+        temp_c = await obtener_temp_actual_async(lat, lon, unidades="metric", lang="es")
+        await _json(send, {"lat": lat, "lon": lon, "units": "C", "temperatura": temp_c}, 200)
+    except Exception as e:
+        await _json(send, {"detalle": "No se pudo obtener la temperatura", "error": str(e)}, 502)
+
+
+async def generar_alerta(peticion: Peticion, send):
+    """POST /api/clothing/generar - mismo contrato que routes/clothing_api.py (201 | 502 | 200)."""
+    from routes.clothing_api import parametros_generar, status_generar
+    from service.clothing_service import generar_alerta_y_guardar_async
+
+    parametros, detalle = parametros_generar(await peticion.json(), peticion.args)
+    if detalle:
+        return await _json(send, {"detalle": detalle}, 400)
+    data = await generar_alerta_y_guardar_async(**parametros)
+    await _json(send, data, status_generar(data))
+
+
+# blueprint -> rutas que se atienden nativas cuando ese blueprint está habilitado
+RUTAS_NATIVAS = {
+    "esp32": {
+        ("GET", "/api/esp32/eventos"): eventos_long_poll,
+        ("GET", "/api/esp32/eventos/stream"): eventos_sse,
+    },
+    "weather": {("GET", "/api/weather/temperatura"): temperatura},
+    "clothing": {("POST", "/api/clothing/generar"): generar_alerta},
+}
+
+
+class AppASGI:
+    """Despacha las rutas nativas y delega el resto en Flask (WsgiToAsgi)."""
+
+    def __init__(self, wsgi_app):
+        self.flask = WsgiToAsgi(wsgi_app)
+        self.rutas = {}
+        for nombre in wsgi_app.config.get("BLUEPRINTS", ()):
+            self.rutas.update(RUTAS_NATIVAS.get(nombre, {}))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http":
+            ruta = self.rutas.get((scope["method"], scope["path"].rstrip("/") or "/"))
+            if ruta is not None:
+                try:
+                    return await ruta(Peticion(scope, receive), send)
+                except Exception as e:
+                    print(f"[ASGI][WARN] Error en {scope['method']} {scope['path']}: {e}")
+                    return await _json(send, {"detalle": "Error interno", "error": str(e)}, 500)
+        return await self.flask(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                # Scheduler y despachador ya arrancaron al importar main
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                await cerrar_clientes_async()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = AppASGI(flask_app)
@@ -1,84 +1,127 @@
-import json
+import importlib
+import os
+import time
 
-from flask import Flask, jsonify, request
+from flask import Flask, current_app, jsonify
 from flask_cors import CORS
-# Rutas de negocio
-from routes.clothing_api import router as clothing_router
-from routes.scheduler_api import scheduler_bp
-from routes.esp32_api import router as esp32_router
-
-# Service del scheduler para inicializarlo (no para rutear)
-from service.scheduler_service import init_scheduler, CONFIG
-# Otros handlers ya existentes
-from service.llm_handler import frase_a_json
-# Service del scheduler para inicializarlo (no para rutear)
-from service.scheduler_service import CONFIG, init_scheduler
-from utils.audio_exporter import subir_a_blob
-from utils.date_calculator import calcular_fechas
-from utils.tts_generator import generar_audio
-
-app = Flask(__name__)
-CORS(app)
-
-# Blueprints
-app.register_blueprint(clothing_router)
-app.register_blueprint(scheduler_bp)
-app.register_blueprint(esp32_router)
-
-@app.route("/frase", methods=["POST"])
-def procesar_frase():
-    datos = request.json or {}
-    frase = datos.get("frase")
-
-    #Para debuggear
-    #print("datos: " + str(datos))
-    #print("frase: " + str(frase))
-
-    print("datos:", datos)
-    print("frase:", frase)
-
-    #Extraer recordatorio con llm_handler
-    json_str = frase_a_json(frase)
-    datos_json = json.loads(json_str)
-
-    #Generar audio localmente con Azure Text-To-Speech usando tts_generator
-    archivo_wav = datos_json["audio_filename"]
-    generar_audio(datos_json["mensaje"], archivo_wav)
-
-    #Subir wav a Azure blob storage
-    url_audio = subir_a_blob(archivo_wav, archivo_wav)
-    datos_json["audio_url"] = url_audio # agregar la URL al JSON
-
-    #Calcular fechas de los recordatorios con date_calculator
-    fecha_inicio, fecha_fin = calcular_fechas(
-        datos_json["hora"],
-        datos_json["dias"],
-        datos_json["duracion_dias"],
-    )
-    datos_json["fecha_inicio"] = fecha_inicio
-    datos_json["fecha_fin"] = fecha_fin
-
-    #Para debuggear
-    print("json_str:", json_str)
-    print("datos_json:", datos_json)
 
-    return jsonify(datos_json)
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# Blueprints que se registran. Los que no están ni se importan (p.ej. APP_BLUEPRINTS=weather
+# para una instancia que solo sirve clima: no abre Cosmos ni carga openai/azure/apscheduler)
+APP_BLUEPRINTS = os.getenv("APP_BLUEPRINTS", "frase,clothing,scheduler,esp32,weather")
+# Subsistemas opcionales
+APP_AUDIO = os.getenv("APP_AUDIO", "true").lower() == "true"                  # /play-audio en el servidor (pygame)
+APP_SMS = os.getenv("APP_SMS", "true").lower() == "true"                      # SMS de los botones (Twilio)
+APP_SCHEDULER = os.getenv("SCHED_ENABLED", "true").lower() == "true"          # alertas de clima periódicas
+APP_DESPACHO = os.getenv("DESPACHO_ENABLED", "true").lower() == "true"        # motor de horarios (requiere esp32)
+
+# nombre -> (módulo, atributo del Blueprint); se importan recién en create_app
+BLUEPRINTS = {
+    "frase": ("routes.frase_api", "router"),
+    "clothing": ("routes.clothing_api", "router"),
+    "scheduler": ("routes.scheduler_api", "scheduler_bp"),
+    "esp32": ("routes.esp32_api", "router"),
+    "weather": ("routes.weather_api", "router"),
+}
+
+
+def create_app(config: dict | None = None) -> Flask:
+    """
+    Arma la app Flask. 'config' pisa los valores por defecto (ENV), por ejemplo:
+        create_app({"BLUEPRINTS": ["weather"], "SCHEDULER_ENABLED": False})
+    Solo se importan los blueprints pedidos y solo se arrancan los subsistemas habilitados;
+    los clientes externos (Cosmos, OpenAI, Blob, Twilio) se crean en su primer uso.
+    El tiempo de cada paso queda en app.config["ARRANQUE"] (GET /estado).
+    """
+    inicio = time.perf_counter()
+    app = Flask(__name__)
+    CORS(app)
+    app.config.update(
+        BLUEPRINTS=[b.strip() for b in APP_BLUEPRINTS.split(",") if b.strip()],
+        AUDIO_ENABLED=APP_AUDIO,
+        SMS_ENABLED=APP_SMS,
+        SCHEDULER_ENABLED=APP_SCHEDULER,
+        DESPACHO_ENABLED=APP_DESPACHO,
+    )
+    app.config.update(config or {})
+
+    tiempos, arranques = {}, {}
+    for nombre in app.config["BLUEPRINTS"]:
+        if nombre not in BLUEPRINTS:
+            raise ValueError(f"Blueprint desconocido: '{nombre}' (opciones: {', '.join(BLUEPRINTS)})")
+        t = time.perf_counter()
+        modulo, atributo = BLUEPRINTS[nombre]
+        app.register_blueprint(getattr(importlib.import_module(modulo), atributo))
+        tiempos[nombre] = round(time.perf_counter() - t, 3)
+
+    # Arranca el scheduler (usa ENV o defaults del service). Cada worker se postula y solo el líder
+    # ejecuta los jobs. Deshabilitado, apscheduler ni se importa (salvo que se pida el blueprint).
+    if app.config["SCHEDULER_ENABLED"]:
+        t = time.perf_counter()
+        from service.scheduler_service import init_scheduler
+
+        init_scheduler(
+            app_debug=app.debug,
+            enabled=True,
+            # overrides opcionales:
+            # every_min=15,
+            # persona="Gabriel",
+            # promedio=25,
+            # margen=3,
+            # incluir_temp=True,
+            # lat=9.9281,
+            # lon=-84.0907,
+        )
+        arranques["scheduler"] = round(time.perf_counter() - t, 3)
+
+    # Despachador de recordatorios del lado del servidor (heap de próximos disparos);
+    # sus vencidos se entregan por /api/esp32, así que solo corre con ese blueprint
+    if app.config["DESPACHO_ENABLED"] and "esp32" in app.config["BLUEPRINTS"]:
+        t = time.perf_counter()
+        from service.despachador_service import DESPACHADOR
+
+        if not app.config["AUDIO_ENABLED"]:
+            DESPACHADOR.precalentar_seg = 0  # sin reproducción local no hace falta bajar los audios
+        DESPACHADOR.iniciar()
+        arranques["despachador"] = round(time.perf_counter() - t, 3)
+
+    app.add_url_rule("/estado", "estado_app", estado_app)
+    app.config["ARRANQUE"] = {
+        "total_seg": round(time.perf_counter() - inicio, 3),
+        "blueprints_seg": tiempos,      # import + registro de cada blueprint
+        "subsistemas_seg": arranques,   # init_scheduler / despachador
+    }
+    print(f"[APP] Lista en {app.config['ARRANQUE']['total_seg']}s: "
+          + ", ".join(f"{k}={v}s" for k, v in {**tiempos, **arranques}.items()))
+    return app
+
+
+def estado_app():
+    """GET /estado - Blueprints y subsistemas activos, y cuánto tardó cada uno en arrancar."""
+    c = current_app.config
+    return jsonify({
+        "blueprints": c["BLUEPRINTS"],
+        "subsistemas": {
+            "audio": c["AUDIO_ENABLED"],
+            "sms": c["SMS_ENABLED"],
+            "scheduler": c["SCHEDULER_ENABLED"],
+            "despachador": c["DESPACHO_ENABLED"] and "esp32" in c["BLUEPRINTS"],
+        },
+        "arranque": c["ARRANQUE"],
+    }), 200
+
+
+def __getattr__(nombre):
+    # 'from main import app' (asgi.py, gunicorn main:app) arma la app con la config del entorno
+    # la primera vez; importar solo create_app no arranca nada.
+    if nombre == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 
 if __name__ == "__main__":
-    # Arranca el scheduler (usa ENV o defaults del service)
-    init_scheduler(
-        app_debug=app.debug,
-        # overrides opcionales:
-        # every_min=15,
-        # persona="Gabriel",
-        # promedio=25,
-        # margen=3,
-        # incluir_temp=True,
-        # lat=9.9281,
-        # lon=-84.0907,
-    )
-
+    app = create_app()
     # Si el scheduler está activo, desactiva reloader para evitar 'not a socket' en Windows
-    use_reloader = not CONFIG["enabled"]
+    use_reloader = not app.config["SCHEDULER_ENABLED"]
     app.run(debug=True, host="0.0.0.0", port=5000, use_reloader=use_reloader)
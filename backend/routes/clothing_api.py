@@ -1,30 +1,27 @@
 from flask import Blueprint, request, jsonify
 from service.clothing_service import generar_alerta_y_guardar, obtener_ultima_alerta
 from service.cosmos_handler import cosmos_handler
+from service.job_service import ColaLlenaError, enviar_job, obtener_job, reportar_progreso
 from azure.cosmos import exceptions
 
 # Helpers de borrado (importados del mismo handler)
 from service.cosmos_handler import (
     eliminar_alertas as ch_eliminar_alertas,
     eliminar_alerta_por_id as ch_eliminar_alerta_por_id,
+    eliminar_alertas_antiguas as ch_eliminar_alertas_antiguas,
+    listar_alertas_pagina as ch_listar_alertas_pagina,
 )
 
 router = Blueprint("clothing_api", __name__, url_prefix="/api/clothing")
 
 
-@router.post("/generar")
-def generar():
+def parametros_generar(datos: dict, args) -> tuple:
     """
-    POST /api/clothing/generar
-    Acepta JSON body o query params.
-      - 201 si se guardó alerta (viene id_documento).
-      - 502 si falló TTS/Blob/Cosmos (viene 'error').
-      - 200 si está en rango normal (sin alerta).
+    Valida los parámetros de /generar (JSON body o query params).
+    Devuelve (kwargs para generar_alerta_y_guardar, None) o (None, detalle del error 400).
+    También lo usa la ruta async equivalente de asgi.py.
     """
 
-    datos = request.get_json(silent=True) or {}
-    args = request.args or {}
-
     def val(key, default=None):
         return datos.get(key, args.get(key, default))
 
@@ -34,12 +31,12 @@ def generar():
     try:
         promedio = float(promedio_raw)
     except (TypeError, ValueError):
-        return jsonify({"detalle": "El parámetro 'promedio' es requerido y debe ser numérico"}), 400
+        return None, "El parámetro 'promedio' es requerido y debe ser numérico"
 
     try:
         margen = float(val("margen", 4.0))
     except ValueError:
-        return jsonify({"detalle": "El parámetro 'margen' debe ser numérico"}), 400
+        return None, "El parámetro 'margen' debe ser numérico"
 
     incluir_raw = val("incluir_temp", False)
     incluir_temp = incluir_raw in (True, "1", "true", "True", 1)
@@ -48,22 +45,42 @@ def generar():
         lat = float(val("lat", 9.9281))
         lon = float(val("lon", -84.0907))
     except ValueError:
-        return jsonify({"detalle": "Parámetros 'lat' y 'lon' deben ser numéricos"}), 400
-
-    data = generar_alerta_y_guardar(
-        persona=persona,
-        promedio=promedio,
-        margen=margen,
-        incluir_temp=incluir_temp,
-        lat=lat,
-        lon=lon,
-    )
+        return None, "Parámetros 'lat' y 'lon' deben ser numéricos"
+
+    return {
+        "persona": persona,
+        "promedio": promedio,
+        "margen": margen,
+        "incluir_temp": incluir_temp,
+        "lat": lat,
+        "lon": lon,
+    }, None
+
 
+def status_generar(data: dict) -> int:
+    """201 si se guardó alerta, 502 si falló TTS/Blob/Cosmos, 200 si está en rango normal."""
     if data.get("id_documento"):
-        return jsonify(data), 201
+        return 201
     if data.get("error"):
-        return jsonify(data), 502
-    return jsonify(data), 200
+        return 502
+    return 200
+
+
+@router.post("/generar")
+def generar():
+    """
+    POST /api/clothing/generar
+    Acepta JSON body o query params.
+      - 201 si se guardó alerta (viene id_documento).
+      - 502 si falló TTS/Blob/Cosmos (viene 'error').
+      - 200 si está en rango normal (sin alerta).
+    """
+    parametros, detalle = parametros_generar(request.get_json(silent=True) or {}, request.args or {})
+    if detalle:
+        return jsonify({"detalle": detalle}), 400
+
+    data = generar_alerta_y_guardar(**parametros)
+    return jsonify(data), status_generar(data)
 
 
 @router.get("/ultimo")
@@ -94,8 +111,9 @@ def ultimo():
 @router.get("/alertas")
 def listar_alertas():
     """
-    GET /api/clothing/alertas?persona=Gabriel&categoria=abrigo|calor&limit=20
-    Lista alertas tipo 'alerta_clima' (más recientes primero).
+    GET /api/clothing/alertas?persona=Gabriel&categoria=abrigo|calor&limit=20&continuation=<token>
+    Lista alertas tipo 'alerta_clima' (más recientes primero), paginadas en el servidor.
+    Si la respuesta trae 'continuation', se pide la página siguiente pasándolo como parámetro.
     """
 
     persona = request.args.get("persona", type=str)
@@ -106,22 +124,13 @@ def listar_alertas():
         return jsonify({"detalle": "El parámetro 'categoria' debe ser 'abrigo' o 'calor'"}), 400
 
     try:
-        base = "SELECT * FROM c WHERE c.tipo = 'alerta_clima'"
-        params = []
-        if persona:
-            base += " AND c.quien = @quien"
-            params.append({"name": "@quien", "value": persona})
-        if categoria:
-            base += " AND c.categoria = @categoria"
-            params.append({"name": "@categoria", "value": categoria})
-        base += " ORDER BY c.creado_en DESC"
-
-        items = list(cosmos_handler.container.query_items(
-            query=base,
-            parameters=params,
-            enable_cross_partition_query=True
-        ))
-        items = items[:max(1, min(limit, 200))]
+        items, continuation = ch_listar_alertas_pagina(
+            cosmos_handler.container,
+            quien=persona,
+            categoria=categoria,
+            limit=limit,
+            continuation=request.args.get("continuation") or None,
+        )
         resp = [
             {
                 "id_documento": d.get("id"),
@@ -131,23 +140,41 @@ def listar_alertas():
                 "promedio": d.get("promedio"),
                 "margen": d.get("margen"),
                 "url_audio": d.get("url_audio"),
+                "url_audio_variantes": d.get("url_audio_variantes") or {},
                 "mensaje": d.get("mensaje"),
                 "creado_en": d.get("creado_en"),
             }
             for d in items
         ]
-        return jsonify({"total": len(resp), "alertas": resp}), 200
+        return jsonify({"total": len(resp), "alertas": resp, "continuation": continuation}), 200
     except exceptions.CosmosHttpResponseError as e:
         return jsonify({"error": f"Cosmos: {e}"}), 502
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _borrar_alertas(persona, categoria):
+    count = ch_eliminar_alertas(
+        cosmos_handler.container, quien=persona, categoria=categoria, progreso=reportar_progreso
+    )
+    return {"eliminados": count}
+
+
+def _respuesta_job(job_id: str, **extra):
+    url = f"/api/clothing/alertas/jobs/{job_id}"
+    resp = jsonify({"job_id": job_id, "estado": "pendiente", "url": url, **extra})
+    resp.status_code = 202
+    resp.headers["Location"] = url
+    return resp
+
+
 @router.delete("/alertas")
 def borrar_alertas():
     """
     DELETE /api/clothing/alertas?persona=Gabriel&categoria=abrigo|calor
     Elimina alertas para 'persona' (requerido). Si se pasa 'categoria', filtra.
-    Devuelve la cantidad de documentos eliminados.
+      - 202 + job_id: el borrado (batch por partición) corre en el pool de jobs;
+        el avance se consulta en GET /api/clothing/alertas/jobs/<job_id> ('progreso').
+      - ?sync=true: responde 200 con la cantidad de documentos eliminados.
     """
 
     persona = request.args.get("persona", type=str)
@@ -158,13 +185,60 @@ def borrar_alertas():
     if categoria and categoria not in ("abrigo", "calor"):
         return jsonify({"detalle": "El parámetro 'categoria' debe ser 'abrigo' o 'calor'"}), 400
 
+    sync = request.args.get("sync", "false").lower() in ("1", "true")
+    try:
+        if sync:
+            return jsonify(_borrar_alertas(persona, categoria)), 200
+        job_id = enviar_job("eliminar_alertas", _borrar_alertas, persona, categoria)
+        return _respuesta_job(job_id)
+    except ColaLlenaError as e:
+        return jsonify({"detalle": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@router.post("/alertas/retencion")
+def retencion_alertas():
+    """
+    POST /api/clothing/alertas/retencion  { "dias": 30, "persona": "Gabriel" (opcional) }
+    Borra alertas con más de 'dias' días de antigüedad. Corre como job (202); ?sync=true responde 200.
+    """
+    datos = request.get_json(silent=True) or {}
+    persona = datos.get("persona") or request.args.get("persona")
     try:
-        count = ch_eliminar_alertas(cosmos_handler.container, quien=persona, categoria=categoria)
-        return jsonify({"eliminados": count}), 200
+        dias = int(datos.get("dias", request.args.get("dias", 0)))
+    except (TypeError, ValueError):
+        dias = 0
+    if dias < 1:
+        return jsonify({"detalle": "El parámetro 'dias' es requerido y debe ser un entero >= 1"}), 400
+
+    sync = request.args.get("sync", "false").lower() in ("1", "true")
+    try:
+        if sync:
+            return jsonify(ch_eliminar_alertas_antiguas(cosmos_handler.container, dias, quien=persona)), 200
+        job_id = enviar_job(
+            "retencion_alertas", ch_eliminar_alertas_antiguas, cosmos_handler.container, dias,
+            quien=persona, progreso=reportar_progreso,
+        )
+        return _respuesta_job(job_id, dias=dias)
+    except ColaLlenaError as e:
+        return jsonify({"detalle": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@router.get("/alertas/jobs/<job_id>")
+def estado_job_alertas(job_id: str):
+    """
+    GET /api/clothing/alertas/jobs/<job_id>
+    Devuelve { job_id, estado, progreso: {hechos, total}, resultado, error }.
+    """
+    job = obtener_job(job_id)
+    if not job:
+        return jsonify({"detalle": "No existe el trabajo (o ya expiró)"}), 404
+    return jsonify(job), 200
+
+
 @router.delete("/alertas/<alerta_id>")
 def borrar_alerta_por_id(alerta_id: str):
     """
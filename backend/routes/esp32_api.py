@@ -1,131 +1,188 @@
-from flask import Blueprint, make_response
+import json
+import time
+from flask import Blueprint, Response, current_app, make_response, redirect
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from backend.service.cosmos_handler import cosmos_handler
-import pygame
-import requests
-from io import BytesIO
-import time, json, hashlib, threading
+from service.cosmos_handler import cosmos_handler
+from service.recordatorio_index import INDICE_RECORDATORIOS
+from service.despachador_service import DESPACHADOR
+from service.canal_service import CANAL, CANAL_LONGPOLL_MAX_SEG, CANAL_SSE_LATIDO_SEG, CANAL_SSE_MAX_SEG
+from service.config_cache import CONFIG_CHANGE_FEED, ConfigCache, ConsumidorChangeFeed
 from flask import request, jsonify
-from service.twilio_handler import enviar_sms
+from service.notificacion_service import NOTIFICADOR, ColaNotificacionesLlena
+from service.reproductor_service import REPRODUCTOR, ColaReproduccionLlena
+from utils import esp32_codec
+from utils.audio_transcoder import elegir_variante
+from utils.ttl_cache import TTLCache
 
 router = Blueprint("esp32_api", __name__, url_prefix="/api/esp32")
 
-# Inicializar pygame para reproducción de audio
-try:
-    pygame.mixer.init()
-    print("🎵 Sistema de audio inicializado correctamente")
-except Exception as e:
-    print(f"⚠️ Error inicializando audio: {e}")
-
 # Zona horaria CR
 TZ_CR = ZoneInfo("America/Costa_Rica")
 
 
 
 # === Caché en memoria ===
-CACHE_TTL = 60  # segundos (ajusta según necesites)
-CONFIG_CACHE = {
-    "body": None,   # bytes
-    "etag": None,   # str
-    "ts": 0.0,      # epoch seconds
-}
-_CACHE_LOCK = threading.Lock()
+# El payload se mantiene al día con el change feed de Cosmos (cambios incrementales);
+# CONFIG_CACHE_TTL_SEG solo fuerza una reconstrucción completa de seguridad.
+CONFIG_ESP32 = ConfigCache(cosmos_handler.obtener_recordatorios_activos)
+CONFIG_FEED = ConsumidorChangeFeed(cosmos_handler, [CONFIG_ESP32.aplicar])
+
+
+# === Canal de avisos (long-poll / SSE) ===
+# Los dispositivos que esperan en /eventos se despiertan cuando cambia su parte de /config
+# (change feed, recargas o escrituras de este proceso) o cuando vence un recordatorio.
+def _aplicar_escritura(evento, documento):
+    CONFIG_ESP32.aplicar([documento])
+
+
+def _avisar_config(quienes, version):
+    for quien in quienes:
+        CANAL.publicar(quien, {"tipo": "config", "version": version})
 
-def _build_config_body():
-    """
-    Obtiene recordatorios del origen (p.ej., Cosmos), los normaliza
-    y devuelve (body_bytes, etag_str). Usa sort_keys para ETag estable.
-    """
-    recordatorios = cosmos_handler.obtener_recordatorios_activos()
-    payload = [{
-        "id": r.get("id"),
-        "quien": r.get("quien"),
-        "hora": r.get("hora"),
-        "medicamento": r.get("medicamento"),
-        "mensaje": r.get("mensaje"),
-        "audio_url": r.get("audio_url"),
-        "activo": r.get("activo", True),
-    } for r in recordatorios]
 
-    body = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
-    etag = hashlib.md5(body).hexdigest()
-    return body, etag
+def _avisar_vencido(vencido):
+    CANAL.publicar(vencido["quien"], {"tipo": "vencido", **{k: v for k, v in vencido.items() if k != "quien"}})
 
-def _get_cached_config():
+
+cosmos_handler.suscribir(_aplicar_escritura)
+CONFIG_ESP32.suscribir(_avisar_config)
+DESPACHADOR.suscribir(_avisar_vencido)
+
+
+# Representaciones ya codificadas de /config: (etag, formato, compacto, gzip) -> (body, etag)
+_REPRESENTACIONES = TTLCache(max_items=256, ttl_seg=3600)
+
+
+def _negociar(admite_binario: bool = True):
     """
-    Devuelve (body, etag) desde caché si está fresca; si no, la regenera.
-    Si el origen falla y hay copia, usa la copia vieja; si no hay copia, relanza el error.
+    Formato según 'Accept' (JSON por defecto) y si el JSON va compacto (?compacto=1).
+    Devuelve (formato, compacto) o (None, False) si no hay formato aceptable.
     """
-    now = time.time()
-    with _CACHE_LOCK:
-        is_stale = (CONFIG_CACHE["body"] is None) or (now - CONFIG_CACHE["ts"] > CACHE_TTL)
-        if not is_stale:
-            return CONFIG_CACHE["body"], CONFIG_CACHE["etag"]
+    formatos = esp32_codec.formatos_disponibles()
+    if not admite_binario:
+        formatos.remove(esp32_codec.BINARIO)
+    if not request.headers.get("Accept"):
+        formato = esp32_codec.JSON
+    else:
+        formato = request.accept_mimetypes.best_match(formatos)
+    compacto = request.args.get("compacto", "false").lower() in ("1", "true")
+    return formato, compacto
+
+
+def _no_aceptable():
+    return jsonify({"detalle": "Formato no soportado", "formatos": esp32_codec.formatos_disponibles()}), 406
+
+
+def _responder(datos, lista=None, status=200, headers=None):
+    """Respuesta negociada (JSON | MessagePack | binario) con gzip si el cliente lo acepta."""
+    formato, compacto = _negociar(admite_binario=lista is not None)
+    if formato is None:
+        return _no_aceptable()
+    body = esp32_codec.codificar(lista if formato == esp32_codec.BINARIO else datos, formato, compacto)
+    body, gz = esp32_codec.comprimir(body, request.headers.get("Accept-Encoding", ""))
+    resp = make_response(body, status)
+    resp.headers["Content-Type"] = formato + ("; charset=utf-8" if formato == esp32_codec.JSON else "")
+    if gz:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
+    for clave, valor in (headers or {}).items():
+        resp.headers[clave] = valor
+    return resp
 
-        try:
-            body, etag = _build_config_body()
-            CONFIG_CACHE.update({"body": body, "etag": etag, "ts": now})
-            return body, etag
-        except Exception as e:
-            # Si falla el origen y hay copia, devolvemos la copia vieja
-            if CONFIG_CACHE["body"] is not None:
-                return CONFIG_CACHE["body"], CONFIG_CACHE["etag"]
-            # Si no hay copia previa, no podemos responder
-            raise
 
+def _representacion(body_json: bytes, etag: str, formato: str, compacto: bool, accept_encoding: str):
+    """(body, etag) de /config en el formato pedido; se codifica una sola vez por ETag."""
+    gz_aceptado = "gzip" in (accept_encoding or "").lower()
+    clave = (etag, formato, compacto, gz_aceptado)
+    cacheado = _REPRESENTACIONES.get(clave)
+    if cacheado:
+        return cacheado
+    body = body_json
+    if formato != esp32_codec.JSON or compacto:
+        body = esp32_codec.codificar(json.loads(body_json), formato, compacto)
+    body, gz = esp32_codec.comprimir(body, accept_encoding)
+    # ETag distinto por representación (no se puede reutilizar el del JSON completo)
+    sufijo = {esp32_codec.JSON: "c" if compacto else "", esp32_codec.MSGPACK: "m", esp32_codec.BINARIO: "b"}[formato]
+    etag_rep = etag + (f"-{sufijo}" if sufijo else "") + ("-gz" if gz else "")
+    resultado = (body, etag_rep, gz)
+    _REPRESENTACIONES.set(clave, resultado)
+    return resultado
+
+
+def _formatos_audio():
+    """Variantes de audio que soporta el dispositivo, en orden de preferencia (?formatos=mp3,ulaw8k)."""
+    return [f.strip() for f in request.args.get("formatos", "").split(",") if f.strip()]
+
+
+def _get_cached_config(quienes=None):
+    """Devuelve (body, etag) del payload de /config, de todos o de 'quienes' (ver ConfigCache)."""
+    if CONFIG_CHANGE_FEED:
+        CONFIG_FEED.iniciar()
+    return CONFIG_ESP32.obtener(quienes)
+
+
+def _deshabilitado(subsistema: str, variable: str):
+    """503 de un subsistema apagado por config (ver create_app en main.py)."""
+    return jsonify({"error": f"Subsistema '{subsistema}' deshabilitado en esta instancia ({variable}=false)",
+                    "status": "failed"}), 503
+
+
+# Botón del ESP32 -> tipo de notificación (ver MENSAJES_BOTON)
+BOTONES = {
+    "ROJO": "EMERGENCIA", "EMERGENCIA_MEDICA": "EMERGENCIA",
+    "AZUL": "TRISTEZA", "TRISTEZA_SOLEDAD": "TRISTEZA",
+    "AMARILLO": "HAMBRE", "HAMBRE": "HAMBRE",
+}
 
-# Agregar este endpoint al archivo esp32_api.py
 
 @router.post("/evento")
 def recibir_estado_botones():
-    """POST /api/esp32/estado - Recibe estado de botones y envía SMS"""
+    """POST /api/esp32/evento - Recibe estado de botones y encola el SMS (202, no espera a Twilio)"""
     try:
         datos = request.get_json(silent=True) or {}
 
         # Obtener datos del botón
         boton = datos.get("boton", "")
         quien = datos.get("quien", "Adulto Mayor")
-        timestamp = datos.get("timestamp", datetime.now().isoformat())
 
+        tipo = BOTONES.get(boton)
+        if tipo is None:
+            # Igual que antes: otros botones se aceptan pero no generan SMS
+            return jsonify({
+                "status": "received",
+                "mensaje": "Botón sin notificación asociada",
+                "timestamp": datetime.now().isoformat()
+            }), 200
+
+        if not current_app.config.get("SMS_ENABLED", True):
+            return _deshabilitado("sms", "APP_SMS")
 
-        # Enviar SMS según el botón presionado
-        if boton == "ROJO" or boton == "EMERGENCIA_MEDICA":
-            enviar_sms_boton("EMERGENCIA", quien)
-        elif boton == "AZUL" or boton == "TRISTEZA_SOLEDAD":
-            enviar_sms_boton("TRISTEZA", quien)
-        elif boton == "AMARILLO" or boton == "HAMBRE":
-            enviar_sms_boton("HAMBRE", quien)
+        # El registro en Cosmos y el SMS los hace el notificador en segundo plano;
+        # pulsaciones repetidas del mismo botón se agrupan (salvo emergencias)
+        try:
+            cola = NOTIFICADOR.notificar(tipo, quien)
+        except ColaNotificacionesLlena as e:
+            return jsonify({"error": str(e)}), 503
 
         return jsonify({
             "status": "received",
-            "mensaje": "Estado de botón procesado",
+            "mensaje": "Estado de botón recibido",
+            "tipo": tipo,
+            "cola": cola,
             "timestamp": datetime.now().isoformat()
-        }), 200
+        }), 202
 
     except Exception as e:
         print(f"❌ Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-def enviar_sms_boton(tipo, quien):
-    """Envía SMS según el tipo de botón"""
-    try:
+@router.get("/evento/estado")
+def estado_notificaciones():
+    """GET /api/esp32/evento/estado - SMS pendientes, reintentos y agrupados."""
+    return jsonify(NOTIFICADOR.estado()), 200
 
-        if tipo == "EMERGENCIA":
-            mensaje = f"🚨 EMERGENCIA MÉDICA\n{quien} presionó el botón rojo\nVerificar inmediatamente"
-        elif tipo == "TRISTEZA":
-            mensaje = f"💙 ALERTA EMOCIONAL\n{quien} presionó el botón azul\nNecesita compañía"
-        elif tipo == "HAMBRE":
-            mensaje = f"🍽️ SOLICITUD DE COMIDA\n{quien} presionó el botón amarillo\nTiene hambre"
-        else:
-            return
-
-        exito = enviar_sms(mensaje)
-        print(f"📱 SMS enviado: {'✅' if exito else '❌'}")
-
-    except Exception as e:
-        print(f"❌ Error enviando SMS: {e}")
 
 @router.get("/siguiente-audio")
 def siguiente_audio():
@@ -134,27 +191,18 @@ def siguiente_audio():
     if not quien or not hora:
         return jsonify({"detalle": "Faltan parametros 'quien' y/o 'hora'"}), 400
 
-    recordatorios = cosmos_handler.obtener_recordatorios_por_persona(quien)
-
-    candidatos = [
-        r for r in recordatorios
-        if r.get("activo", True) and r.get("hora") == hora
-    ]
-    if not candidatos:
+    # Índice en memoria (bucket por minuto del día): no consulta Cosmos en cada poll
+    r = INDICE_RECORDATORIOS.en_hora(quien, hora)
+    if not r:
         return jsonify({"detalle": "No hay recordatorio para esta hora"}), 404
 
-    def _prio(rec):
-        return (rec.get("prioridad", 0), rec.get("fecha_creacion", ""))
-
-    candidatos.sort(key=_prio, reverse=True)
-    r = candidatos[0]
-
-    return jsonify({
+    datos = {
         "recordatorio_id": r.get("id"),
         "hora": r.get("hora"),
-        "audio_url": r.get("audio_url"),
+        "audio_url": elegir_variante(r.get("audio_url"), r.get("audio_variantes"), _formatos_audio()),
         "mensaje": r.get("mensaje"),
-    }), 200
+    }
+    return _responder(datos, lista=[{**datos, "quien": r.get("quien"), "medicamento": r.get("medicamento")}])
 
 
 @router.get("/agenda")
@@ -167,19 +215,11 @@ def agenda():
     hoy_str = now_cr.strftime("%Y-%m-%d")
     hhmm_now = now_cr.strftime("%H:%M")
 
-    recordatorios = cosmos_handler.obtener_recordatorios_por_persona(quien)
-
-    def aplica_hoy(rec) -> bool:
-        if not rec.get("activo", True):
-            return False
-        fi = rec.get("fecha_inicio")
-        ff = rec.get("fecha_fin")
-        if fi and hoy_str < fi:
-            return False
-        if ff not in (None, 0) and hoy_str > ff:
-            return False
-        return True
-
+    formatos = _formatos_audio()
+    agenda_hoy = [
+        {**r, "audio_url": elegir_variante(r.get("audio_url"), r.get("audio_variantes"), formatos)}
+        for r in INDICE_RECORDATORIOS.agenda(quien, hhmm_now, hoy_str)
+    ]
     futuros = [
         {
             "recordatorio_id": r.get("id"),
@@ -187,11 +227,9 @@ def agenda():
             "audio_url": r.get("audio_url"),
             "mensaje": r.get("mensaje"),
         }
-        for r in recordatorios
-        if aplica_hoy(r) and r.get("hora") >= hhmm_now
+        for r in agenda_hoy
     ]
-    futuros.sort(key=lambda x: x["hora"])
-    return jsonify({"recordatorios": futuros}), 200
+    return _responder({"recordatorios": futuros}, lista=agenda_hoy)
 
 
 @router.post("/ack-reproduccion")
@@ -203,13 +241,76 @@ def ack_reproduccion():
     if not recordatorio_id or not quien:
         return jsonify({"detalle": "recordatorio_id y quien son obligatorios"}), 400
     print(f"[ACK] quien={quien} recordatorio_id={recordatorio_id} ts={timestamp}")
-    return jsonify({"ok": True}), 200
+    return jsonify({"ok": True, "confirmado": DESPACHADOR.confirmar(quien, recordatorio_id)}), 200
+
+
+@router.get("/vencidos")
+def recordatorios_vencidos():
+    """
+    GET /api/esp32/vencidos?quien=Ana&desde=<epoch>
+    Recordatorios que ya sonaron según el despachador del servidor (desde 'desde', por defecto todos
+    los que se guardan). Responder con 'ahora' como próximo 'desde' evita repetidos.
+    """
+    quien = request.args.get("quien")
+    if not quien:
+        return jsonify({"detalle": "Falta parametro 'quien'"}), 400
+    desde = request.args.get("desde", default=0.0, type=float)
+
+    ahora = datetime.now().timestamp()
+    formatos = _formatos_audio()
+    vencidos = [
+        {**v, "id": v["recordatorio_id"],
+         "audio_url": elegir_variante(v.get("audio_url"), v.pop("audio_variantes", None), formatos)}
+        for v in DESPACHADOR.vencidos(quien, desde)
+    ]
+    return _responder({"vencidos": vencidos, "ahora": ahora, "proximos": DESPACHADOR.proximos(quien, 3)},
+                      lista=vencidos)
+
+
+def _quienes_param():
+    """Personas pedidas en ?quien=Ana&quien=Luis o ?quien=Ana,Luis (lista vacía = todas)."""
+    quienes = []
+    for valor in request.args.getlist("quien"):
+        quienes.extend(q.strip() for q in valor.split(",") if q.strip())
+    return quienes
 
 
 @router.get("/config")
 def get_esp32_config():
+    """
+    GET /api/esp32/config[?quien=Ana[,Luis]][&desde=<version>]
+      - Sin 'quien': todos los recordatorios activos (compatibilidad).
+      - Con 'quien': solo los de esas personas, con su propio ETag (If-None-Match -> 304).
+      - Con 'desde' (requiere 'quien'): delta desde la versión que tiene el dispositivo,
+        { version, completo, cambios, eliminados } o la lista completa si ya no hay historial
+        o la versión es de otra instancia.
+    La versión actual ("<epoca>:<n>") viaja siempre en el header X-Config-Version.
+    Formato según 'Accept': application/json (por defecto; ?compacto=1 para claves cortas),
+    application/msgpack (si está instalado) o application/x-mediamigo-bin (ver utils/esp32_codec.py).
+    En los formatos compactos 'audio_url' se reemplaza por un id corto: GET /api/esp32/audio/<id>.
+    Con 'Accept-Encoding: gzip' los cuerpos grandes van comprimidos.
+    """
+    quienes = _quienes_param()
+    desde = request.args.get("desde")
     try:
-        body, etag = _get_cached_config()
+        if desde is not None:
+            if not quienes:
+                return jsonify({"detalle": "El modo delta requiere el parámetro 'quien'"}), 400
+            if CONFIG_CHANGE_FEED:
+                CONFIG_FEED.iniciar()
+            delta = CONFIG_ESP32.delta(quienes, desde)
+            lista = delta.get("recordatorios") if delta["completo"] else None
+            return _responder(delta, lista=lista, headers={
+                "X-Config-Version": delta["version"],
+                "Cache-Control": "no-cache",
+            })
+        formato, compacto = _negociar()
+        if formato is None:
+            return _no_aceptable()
+        body_json, etag_json = _get_cached_config(quienes)
+        body, etag, gz = _representacion(
+            body_json, etag_json, formato, compacto, request.headers.get("Accept-Encoding", "")
+        )
     except Exception as e:
         # Sin caché previa y el origen falló
         return jsonify({"error": f"config unavailable: {e}"}), 500
@@ -219,16 +320,42 @@ def get_esp32_config():
         resp = make_response("", 304)
     else:
         resp = make_response(body, 200)
-        resp.headers["Content-Type"] = "application/json; charset=utf-8"
+        resp.headers["Content-Type"] = formato + ("; charset=utf-8" if formato == esp32_codec.JSON else "")
+        if gz:
+            resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
 
     # ETag siempre presente
     resp.headers["ETag"] = etag
+    resp.headers["X-Config-Version"] = CONFIG_ESP32.token_version()
     # Orientativo para clientes: sirve 60s y permite 30s de revalidación perezosa
     resp.headers["Cache-Control"] = "private, max-age=60, stale-while-revalidate=30"
     return resp
 
 
 
+@router.get("/audio/<audio_id>")
+def resolver_audio(audio_id: str):
+    """
+    GET /api/esp32/audio/<audio_id>
+    Resuelve el id corto de los formatos compactos: 302 a la URL del blob
+    (el cuerpo también trae {"audio_url": ...} para clientes que no siguen redirecciones).
+    """
+    url = esp32_codec.resolver_audio(audio_id)
+    if not url:
+        # Tras un reinicio el registro está vacío: se regenera con la config en memoria
+        for entrada in CONFIG_ESP32.entradas():
+            esp32_codec.id_audio(entrada.get("audio_url"))
+        url = esp32_codec.resolver_audio(audio_id)
+    if not url:
+        return jsonify({"detalle": "Audio no encontrado"}), 404
+    resp = redirect(url, code=302)
+    resp.set_data(json.dumps({"audio_url": url}))
+    resp.headers["Content-Type"] = "application/json"
+    resp.headers["Cache-Control"] = "private, max-age=86400"
+    return resp
+
+
 @router.post("/play-audio")
 def play_audio_on_server():
     """Recibe comando del ESP32 para reproducir audio en la computadora servidor."""
@@ -250,35 +377,23 @@ def play_audio_on_server():
 
         if not audio_url:
             return jsonify({"error": "URL de audio requerida", "status": "failed"}), 400
+        if not current_app.config.get("AUDIO_ENABLED", True):
+            return _deshabilitado("audio", "APP_AUDIO")
 
-        def reproducir_audio_async():
-            try:
-                print("Iniciando descarga y reproducción...")
-                response = requests.get(audio_url, timeout=30)
-                response.raise_for_status()
-                print(f"Audio descargado: {len(response.content)} bytes")
-                audio_data = BytesIO(response.content)
-                pygame.mixer.music.load(audio_data)
-                pygame.mixer.music.play()
-                print("Reproduciendo audio en la computadora...")
-                while pygame.mixer.music.get_busy():
-                    pygame.time.wait(100)
-                print("¡Audio reproducido exitosamente!")
-                print(f"Recordatorio completado: {medicamento}")
-            except requests.exceptions.RequestException as e:
-                print(f"Error descargando audio: {e}")
-            except pygame.error as e:
-                print(f"Error de pygame: {e}")
-            except Exception as e:
-                print(f"Error general reproduciendo audio: {e}")
-
-        threading.Thread(target=reproducir_audio_async, daemon=True).start()
+        # Un solo hilo reproduce en orden de prioridad (emergencia primero); la misma URL
+        # pendiente no se encola dos veces y las descargas quedan en caché local
+        prioridad = datos.get("prioridad") or ("emergencia" if datos.get("tipo") == "emergencia" else "recordatorio")
+        try:
+            cola = REPRODUCTOR.encolar(audio_url, prioridad=prioridad, medicamento=medicamento, dispositivo=dispositivo)
+        except ColaReproduccionLlena as e:
+            return jsonify({"error": str(e), "status": "failed"}), 503
 
         return jsonify({
             "status": "success",
-            "message": "Audio enviado para reproducción",
+            "message": "Audio enviado para reproducción" if cola["estado"] == "encolado" else "El audio ya estaba en cola",
             "dispositivo": dispositivo,
             "medicamento": medicamento,
+            "cola": cola,
             "timestamp": datetime.now().isoformat()
         }), 200
 
@@ -287,6 +402,89 @@ def play_audio_on_server():
         return jsonify({"error": str(e), "status": "failed"}), 500
 
 
+def _cursor_param():
+    """Cursor del canal ("<epoca>:<n>"): ?cursor= o el header Last-Event-ID (reconexión SSE). None si no vino."""
+    valor = request.args.get("cursor") or request.headers.get("Last-Event-ID")
+    return (valor or "").strip() or None
+
+
+def _evento_dispositivo(evento: dict, formatos) -> dict:
+    """En los vencidos, el audio va en la variante que acepta el dispositivo."""
+    if evento.get("tipo") != "vencido":
+        return evento
+    evento = dict(evento)
+    evento["audio_url"] = elegir_variante(evento.get("audio_url"), evento.pop("audio_variantes", None), formatos)
+    return evento
+
+
+@router.get("/eventos")
+def eventos_long_poll():
+    """
+    GET /api/esp32/eventos?quien=Ana&cursor=<epoca>:<n>&timeout=25
+    Long-poll: responde apenas haya eventos de 'quien' posteriores a 'cursor'
+    ({tipo: config|vencido|resync}) o, si no llega ninguno, al vencer 'timeout' con la lista vacía.
+    Sin cursor responde al instante con el cursor actual (sincronizar con /config y volver con él).
+    """
+    quienes = _quienes_param()
+    if not quienes:
+        return jsonify({"detalle": "Falta parametro 'quien'"}), 400
+    timeout = min(max(request.args.get("timeout", default=25.0, type=float), 0.0), CANAL_LONGPOLL_MAX_SEG)
+
+    desde = _cursor_param()
+    if desde is None:
+        eventos, cursor = [], CANAL.token_cursor()
+    else:
+        eventos, cursor = CANAL.esperar(quienes, desde, timeout)
+
+    formatos = _formatos_audio()
+    return _responder({
+        "cursor": cursor,
+        "config_version": CONFIG_ESP32.token_version(),
+        "eventos": [_evento_dispositivo(e, formatos) for e in eventos],
+    })
+
+
+@router.get("/eventos/stream")
+def eventos_sse():
+    """
+    GET /api/esp32/eventos/stream?quien=Ana (Server-Sent Events)
+    Una conexión abierta por dispositivo: cada evento lleva 'id: <cursor>' para reconectar con
+    Last-Event-ID. Manda un latido cada CANAL_SSE_LATIDO_SEG y cierra a los CANAL_SSE_MAX_SEG.
+    """
+    quienes = _quienes_param()
+    if not quienes:
+        return jsonify({"detalle": "Falta parametro 'quien'"}), 400
+    desde = _cursor_param()
+    if desde is None:
+        desde = CANAL.token_cursor()
+    formatos = _formatos_audio()
+
+    def generar(desde):
+        yield "retry: 2000\n\n"
+        fin = time.time() + CANAL_SSE_MAX_SEG
+        while time.time() < fin:
+            eventos, cursor = CANAL.esperar(quienes, desde, min(CANAL_SSE_LATIDO_SEG, fin - time.time()))
+            if not eventos:
+                yield ": latido\n\n"
+                continue
+            for evento in eventos:
+                evento = _evento_dispositivo(evento, formatos)
+                datos = json.dumps(evento, ensure_ascii=False, separators=(",", ":"))
+                yield f"id: {evento['cursor']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+            desde = cursor
+
+    resp = Response(generar(desde), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # que nginx no acumule el stream
+    return resp
+
+
+@router.get("/play-audio/estado")
+def estado_reproductor():
+    """GET /api/esp32/play-audio/estado - Profundidad de la cola, audio en curso y caché de descargas."""
+    return jsonify(REPRODUCTOR.estado()), 200
+
+
 @router.get("/test")
 def test_connection():
     return jsonify({
@@ -295,9 +493,20 @@ def test_connection():
         "endpoints": [
             "/api/esp32/config - Obtener recordatorios",
             "/api/esp32/play-audio - Reproducir audio",
+            "/api/esp32/play-audio/estado - Cola de reproducción",
+            "/api/esp32/evento - Botones (SMS en segundo plano)",
+            "/api/esp32/evento/estado - Cola de SMS",
             "/api/esp32/siguiente-audio - Próximo recordatorio",
             "/api/esp32/agenda - Agenda del día",
+            "/api/esp32/vencidos - Recordatorios vencidos (despachador del servidor)",
+            "/api/esp32/eventos - Long-poll de avisos (config, vencidos)",
+            "/api/esp32/eventos/stream - Avisos por Server-Sent Events",
+            "/api/esp32/audio/<id> - Resolver id corto de audio",
             "/api/esp32/test - Probar conexión"
         ],
+        "indice": INDICE_RECORDATORIOS.stats(),
+        "despachador": DESPACHADOR.estado(),
+        "canal": CANAL.stats(),
+        "config": {**CONFIG_ESP32.stats(), "change_feed": CONFIG_FEED.stats()},
         "timestamp": datetime.now().isoformat()
     }), 200
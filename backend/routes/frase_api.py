@@ -0,0 +1,105 @@
+from flask import Blueprint, jsonify, request
+
+# Pipeline de frases y pool de trabajos en segundo plano
+from service.frase_service import (
+    LOTE_MAX_FRASES,
+    procesar_frase as procesar_frase_pipeline,
+    procesar_frases_lote,
+)
+from service.job_service import ColaLlenaError, enviar_job, obtener_job
+from service.llm_handler import parser_status
+from utils.frase_cache import FRASE_CACHE
+
+router = Blueprint("frase_api", __name__)
+
+
+@router.post("/frase")
+def procesar_frase():
+    """
+    POST /frase  { "frase": "..." }
+      - 202 + job_id: el procesamiento (LLM -> TTS -> Blob) corre en el pool de jobs.
+        Consultar el resultado con GET /frase/<job_id>.
+      - ?sync=true: modo anterior, responde 200 con el JSON final (502 si falla el audio).
+    """
+    datos = request.json or {}
+    frase = datos.get("frase")
+
+    #Para debuggear
+    #print("datos: " + str(datos))
+    #print("frase: " + str(frase))
+
+    print("datos:", datos)
+    print("frase:", frase)
+
+    if not frase or not str(frase).strip():
+        return jsonify({"detalle": "Falta el campo 'frase'"}), 400
+
+    sync = request.args.get("sync", "false").lower() in ("1", "true")
+    if sync:
+        datos_json = procesar_frase_pipeline(frase)
+        if datos_json.get("error"):
+            return jsonify(datos_json), 502
+        return jsonify(datos_json)
+
+    try:
+        job_id = enviar_job("frase", procesar_frase_pipeline, frase)
+    except ColaLlenaError as e:
+        return jsonify({"detalle": str(e)}), 503
+
+    resp = jsonify({"job_id": job_id, "estado": "pendiente", "url": f"/frase/{job_id}"})
+    resp.status_code = 202
+    resp.headers["Location"] = f"/frase/{job_id}"
+    return resp
+
+
+@router.post("/frase/batch")
+def procesar_frases_batch():
+    """
+    POST /frase/batch  { "frases": ["...", "..."], "guardar": true }
+    Procesa varias frases (LLM agrupado, TTS/Blob en paralelo, Cosmos en batch por 'quien').
+      - 202 + job_id (consultar con GET /frase/<job_id>); el resultado trae un item por frase.
+      - ?sync=true: responde 200 directamente con los resultados por item.
+    """
+    datos = request.get_json(silent=True) or {}
+    frases = datos.get("frases")
+    guardar = datos.get("guardar", True) in (True, "1", "true", "True", 1)
+
+    if not isinstance(frases, list) or not frases:
+        return jsonify({"detalle": "El campo 'frases' debe ser una lista no vacía"}), 400
+    frases = [str(f).strip() for f in frases]
+    if any(not f for f in frases):
+        return jsonify({"detalle": "Todas las frases deben tener texto"}), 400
+    if len(frases) > LOTE_MAX_FRASES:
+        return jsonify({"detalle": f"Máximo {LOTE_MAX_FRASES} frases por lote"}), 400
+
+    sync = request.args.get("sync", "false").lower() in ("1", "true")
+    if sync:
+        return jsonify(procesar_frases_lote(frases, guardar=guardar)), 200
+
+    try:
+        job_id = enviar_job("frase_batch", procesar_frases_lote, frases, guardar=guardar)
+    except ColaLlenaError as e:
+        return jsonify({"detalle": str(e)}), 503
+
+    resp = jsonify({"job_id": job_id, "estado": "pendiente", "total": len(frases), "url": f"/frase/{job_id}"})
+    resp.status_code = 202
+    resp.headers["Location"] = f"/frase/{job_id}"
+    return resp
+
+
+@router.get("/frase/stats")
+def estadisticas_frase():
+    """GET /frase/stats - Frases resueltas por reglas vs. LLM y aciertos del caché de frases."""
+    return jsonify({"parser": parser_status(), "cache": FRASE_CACHE.stats()}), 200
+
+
+@router.get("/frase/<job_id>")
+def estado_frase(job_id: str):
+    """
+    GET /frase/<job_id>
+    Devuelve { job_id, estado: pendiente|en_proceso|completado|error, resultado, error }.
+    """
+    job = obtener_job(job_id)
+    if not job:
+        return jsonify({"detalle": "No existe el trabajo (o ya expiró)"}), 404
+    return jsonify(job), 200
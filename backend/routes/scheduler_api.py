@@ -16,6 +16,12 @@ def api_scheduler_status():
 
 @scheduler_bp.post("/run-now")
 def api_scheduler_run_now():
-    res = run_job_once()
-    status = 201 if res.get("id_documento") else (502 if res.get("error") else 200)
+    """POST /api/scheduler/run-now[?persona=Ana&persona=Luis] - Ejecuta el job ya (todas las personas o las indicadas)."""
+    res = run_job_once(request.args.getlist("persona") or None)
+    if res["alertas"]:
+        status = 201
+    elif res["personas"] and res["errores"] == res["personas"]:
+        status = 502
+    else:
+        status = 200
     return jsonify(res), status
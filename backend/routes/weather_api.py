@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from utils.weather_service import obtener_temp_actual
+from utils.weather_service import estado_cache, obtener_temp_actual
 
 router = Blueprint("weather_api", __name__, url_prefix="/api/weather")
 
@@ -33,3 +33,9 @@ def temperatura():
             "detalle": "No se pudo obtener la temperatura",
             "error": str(e)
         }), 502
+
+
+@router.get("/cache")
+def cache_clima():
+    """GET /api/weather/cache - Celdas en caché, consultas a OpenWeather y hit rate."""
+    return jsonify(estado_cache()), 200
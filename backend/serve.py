@@ -0,0 +1,39 @@
+"""
+Lanzador de producción (reemplaza a app.run del servidor de desarrollo):
+
+    python serve.py
+
+Equivalente con gunicorn (Linux):
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 -b 0.0.0.0:5000 asgi:app
+
+Cada worker es un proceso: el scheduler se ejecuta solo en el líder (ver service/lider_service.py).
+"""
+import os
+
+try:
+    import uvicorn  # pip install uvicorn
+except ImportError:
+    uvicorn = None
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "5000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+WEB_LOG_LEVEL = os.getenv("WEB_LOG_LEVEL", "info")
+# Conexión ociosa entre un long-poll y el siguiente del mismo dispositivo
+WEB_KEEPALIVE_SEG = int(os.getenv("WEB_KEEPALIVE_SEG", "75"))
+
+
+if __name__ == "__main__":
+    if uvicorn is None:
+        raise SystemExit("[SERVE][ERROR] Falta uvicorn: pip install uvicorn httpx asgiref")
+    # Se pasa como texto para que cada worker importe la app por su cuenta
+    uvicorn.run(
+        "asgi:app",
+        host=WEB_HOST,
+        port=WEB_PORT,
+        workers=WEB_WORKERS,
+        log_level=WEB_LOG_LEVEL,
+        timeout_keep_alive=WEB_KEEPALIVE_SEG,
+        proxy_headers=True,
+    )
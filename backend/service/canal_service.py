@@ -0,0 +1,134 @@
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# Eventos que se guardan para clientes que vuelven con un cursor viejo
+CANAL_EVENTOS_MAX = int(os.getenv("CANAL_EVENTOS_MAX", "5000"))
+# Tiempo máximo que un long-poll queda abierto (los proxies suelen cortar a los 60 s)
+CANAL_LONGPOLL_MAX_SEG = int(os.getenv("CANAL_LONGPOLL_MAX_SEG", "55"))
+# SSE: comentario de latido cada tanto y cierre (el cliente reconecta con Last-Event-ID)
+CANAL_SSE_LATIDO_SEG = int(os.getenv("CANAL_SSE_LATIDO_SEG", "20"))
+CANAL_SSE_MAX_SEG = int(os.getenv("CANAL_SSE_MAX_SEG", "600"))
+
+
+class CanalDispositivos:
+    """
+    Canal de avisos para los dispositivos, por persona ('quien'), con cursor global.
+    - publicar() agrega el evento con el siguiente cursor y despierta a quienes esperan a esa persona.
+    - Los que esperan se registran como callables (registrar/quitar): un threading.Event en modo
+      WSGI o un future de asyncio en modo ASGI. No hay hilos ni polling del lado del canal.
+    - Hacia afuera el cursor viaja como "<epoca>:<n>" (token_cursor); la época es propia de
+      cada instancia. Si el cursor del cliente es más viejo que el evento más antiguo guardado
+      o es de otra época (reinicio u otro worker), recibe {tipo: 'resync'} y debe volver a
+      pedir /config completo.
+    """
+
+    def __init__(self, max_eventos: int = CANAL_EVENTOS_MAX):
+        self.cursor = 0
+        self.epoca = uuid.uuid4().hex[:8]  # identifica esta instancia (ver token_cursor)
+        self._eventos: deque = deque(maxlen=max_eventos)   # (cursor, quien, evento)
+        self._esperas: Dict[str, Set[Callable[[], None]]] = {}
+        self._lock = threading.Lock()
+        self.publicados = 0
+        self.despertados = 0
+
+    def token_cursor(self, cursor: Optional[int] = None) -> str:
+        """Cursor tal como lo ven los dispositivos: "<epoca>:<cursor>"."""
+        return f"{self.epoca}:{self.cursor if cursor is None else cursor}"
+
+    def _parsear_token(self, token) -> Optional[int]:
+        """Número de cursor de un token de esta instancia; None si es de otra época o no se entiende."""
+        epoca, _, numero = str(token).partition(":")
+        if epoca != self.epoca or not numero.isdigit():
+            return None
+        return int(numero)
+
+    def publicar(self, quien: str, evento: Dict[str, Any]):
+        with self._lock:
+            self.cursor += 1
+            self._eventos.append((self.cursor, quien, evento))
+            self.publicados += 1
+            despertar = self._esperas.pop(quien, set())
+            if despertar:
+                # Un cliente de varias personas se despierta una sola vez
+                for otro in list(self._esperas):
+                    self._esperas[otro].difference_update(despertar)
+                    if not self._esperas[otro]:
+                        del self._esperas[otro]
+            self.despertados += len(despertar)
+        for callback in despertar:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CANAL][WARN] Error despertando a un cliente: {e}")
+
+    def _pendientes(self, quienes: Set[str], desde: str) -> List[Dict[str, Any]]:
+        """Requiere self._lock tomado."""
+        numero = self._parsear_token(desde)
+        # cursor de otra época (reinicio del servidor u otro worker), muy viejo, o del futuro
+        if numero is None or (self._eventos and numero < self._eventos[0][0] - 1) or numero > self.cursor:
+            return [{"cursor": self.token_cursor(), "tipo": "resync"}]
+        return [
+            {"cursor": self.token_cursor(cursor), "quien": quien, **evento}
+            for cursor, quien, evento in self._eventos
+            if cursor > numero and quien in quienes
+        ]
+
+    def pendientes(self, quienes: Iterable[str], desde: str) -> Tuple[List[Dict[str, Any]], str]:
+        with self._lock:
+            return self._pendientes(set(quienes), desde), self.token_cursor()
+
+    def registrar(self, quienes: Iterable[str], desde: str,
+                  despertar: Callable[[], None]) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        """
+        Si ya hay eventos después de 'desde' los devuelve (eventos, cursor) sin registrar.
+        Si no, registra 'despertar' para cuando se publique algo de 'quienes' y devuelve None.
+        La verificación y el registro van bajo el mismo lock: no se pierde ningún aviso.
+        """
+        quienes = set(quienes)
+        with self._lock:
+            eventos = self._pendientes(quienes, desde)
+            if eventos:
+                return eventos, self.token_cursor()
+            for quien in quienes:
+                self._esperas.setdefault(quien, set()).add(despertar)
+            return None
+
+    def quitar(self, quienes: Iterable[str], despertar: Callable[[], None]):
+        with self._lock:
+            for quien in quienes:
+                esperas = self._esperas.get(quien)
+                if esperas is not None:
+                    esperas.discard(despertar)
+                    if not esperas:
+                        del self._esperas[quien]
+
+    def esperar(self, quienes: Iterable[str], desde: str, timeout: float) -> Tuple[List[Dict[str, Any]], str]:
+        """Bloquea hasta que haya eventos para 'quienes' después de 'desde' o venza 'timeout'."""
+        quienes = set(quienes)
+        aviso = threading.Event()
+        listos = self.registrar(quienes, desde, aviso.set)
+        if listos is not None:
+            return listos
+        try:
+            aviso.wait(timeout)
+        finally:
+            self.quitar(quienes, aviso.set)
+        return self.pendientes(quienes, desde)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cursor": self.token_cursor(),
+                "eventos_guardados": len(self._eventos),
+                "clientes_esperando": len(set().union(*self._esperas.values())),
+                "publicados": self.publicados,
+                "despertados": self.despertados,
+            }
+
+
+# Instancia global para usar en toda la aplicación
+CANAL = CanalDispositivos()
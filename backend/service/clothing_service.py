@@ -1,4 +1,4 @@
-import os
+import asyncio
 import uuid
 from datetime import datetime
 
@@ -6,25 +6,21 @@ from service.cosmos_handler import (
     cosmos_handler,
     guardar_alerta_clima as ch_guardar_alerta_clima,
     obtener_ultima_alerta as ch_obtener_ultima_alerta,
+    guardar_alerta_clima_async as ch_guardar_alerta_clima_async,
+    obtener_ultima_alerta_async as ch_obtener_ultima_alerta_async,
 )
-from utils.weather_service import obtener_temp_actual
-from utils.tts_generator import generar_audio  # True/False, escribe WAV
-from utils.audio_exporter import subir_a_blob
-
-# === CONFIGURACIÓN DE DIRECTORIOS ===
-# Ruta base -> backend/
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-AUDIO_DIR = os.path.join(BASE_DIR, "esp32", "audio")
-
-# Crear carpeta si no existe
-os.makedirs(AUDIO_DIR, exist_ok=True)
+from utils.async_clients import obtener_container_cosmos_async
+from utils.weather_service import obtener_temp_actual, obtener_temp_actual_async
+from utils.tts_generator import generar_audio, generar_audio_async, clave_tts  # bytes o None (sin archivo)
+from utils.audio_exporter import subir_a_blob, subir_a_blob_async, subir_variantes
+from utils.audio_cache import AUDIO_CACHE
 
 LAT_DEFECTO = 9.9281
 LON_DEFECTO = -84.0907
 
 
 def _mensaje_y_archivo(categoria: str, temp: float, incluir_temp: bool) -> tuple[str, str]:
-    """Genera el mensaje de alerta y nombre de archivo WAV según categoría."""
+    """Genera el mensaje de alerta y nombre del blob WAV según categoría."""
     if categoria == "frio":
         mensaje = (
             f"Está haciendo frío, ponte un abrigo. Temperatura actual {temp:.1f}°C."
@@ -42,6 +38,35 @@ def _mensaje_y_archivo(categoria: str, temp: float, incluir_temp: bool) -> tuple
     return mensaje, archivo
 
 
+# Lo que se lee de la última alerta para decidir si se reutiliza su audio
+CAMPOS_ANTERIOR = ("id", "categoria", "mensaje", "url_audio", "url_audio_variantes")
+
+
+def _ultima_alerta(persona: str) -> dict | None:
+    """Última alerta de la persona (solo CAMPOS_ANTERIOR); si la consulta falla, None (no se reutiliza)."""
+    try:
+        return ch_obtener_ultima_alerta(cosmos_handler.container, quien=persona, campos=CAMPOS_ANTERIOR)
+    except Exception as e:
+        print(f"[WARN] No se pudo leer la alerta anterior de {persona}: {e}")
+        return None
+
+
+async def _ultima_alerta_async(container, persona: str) -> dict | None:
+    try:
+        return await ch_obtener_ultima_alerta_async(container, quien=persona, campos=CAMPOS_ANTERIOR)
+    except Exception as e:
+        print(f"[WARN] No se pudo leer la alerta anterior de {persona}: {e}")
+        return None
+
+
+def _audio_anterior(anterior: dict | None, mensaje: str) -> tuple:
+    """(url_audio, variantes) de la alerta anterior si tenía el mismo mensaje; si no, (None, None)."""
+    if anterior and anterior.get("mensaje") == mensaje and anterior.get("url_audio"):
+        print(f"[DEBUG] Audio reutilizado de la alerta anterior: {anterior['url_audio']}")
+        return anterior["url_audio"], anterior.get("url_audio_variantes") or {}
+    return None, None
+
+
 def generar_alerta_y_guardar(
     persona: str,
     promedio: float,
@@ -49,87 +74,67 @@ def generar_alerta_y_guardar(
     incluir_temp: bool = False,
     lat: float = LAT_DEFECTO,
     lon: float = LON_DEFECTO,
+    temp: float | None = None,
 ) -> dict:
     """
     MODO ESTRICTO:
       - Dentro de (promedio±margen) => SIN alerta (no se guarda nada).
-      - Fuera de rango => generar WAV, subir a Blob (ambos obligatorios) y guardar en Cosmos.
+      - Fuera de rango => generar WAV en memoria, subir a Blob (ambos obligatorios) y guardar en Cosmos.
       - Si falla TTS o Blob => error (no guarda).
+    'temp': temperatura ya consultada (el scheduler la obtiene una vez por ubicación); si no, se consulta.
+    Si la última alerta de la persona tiene el mismo mensaje, se reutiliza su audio (sin TTS ni Blob,
+    aunque el caché local esté vacío). La respuesta incluye 'alerta_anterior' (id o None).
     """
-    temp = obtener_temp_actual(lat, lon)
+    if temp is None:
+        temp = obtener_temp_actual(lat, lon)
+    anterior = _ultima_alerta(persona)
+    base = {"temperatura": float(temp), "promedio": float(promedio), "margen": float(margen),
+            "alerta_anterior": anterior.get("id") if anterior else None}
 
     # Decisión: dentro del margen => no hay alerta
     if (promedio - margen) < temp < (promedio + margen):
         print("[INFO] Sin alerta: la temperatura está dentro del rango normal.")
-        return {
-            "debe_reproducir": False,
-            "estado": "normal",
-            "temperatura": float(temp),
-            "promedio": float(promedio),
-            "margen": float(margen),
-        }
+        return {"debe_reproducir": False, "estado": "normal", **base}
 
     # Fuera del rango => hay alerta
     categoria = "frio" if temp <= (promedio - margen) else "calor"
     mensaje, archivo = _mensaje_y_archivo(categoria, temp, incluir_temp)
+    base.update(categoria=categoria, mensaje=mensaje)
 
-    # === Paso 1: Generar audio local (OBLIGATORIO) ===
-    local_path = os.path.join(AUDIO_DIR, archivo)
-    print(f"[DEBUG] Generando audio en {local_path}")
-    ok_audio = generar_audio(mensaje, local_path)
-    if not ok_audio:
-        print("[ERROR] No se pudo generar el audio TTS. No se guardará alerta.")
-        return {
-            "error": "ERROR_TTS",
-            "detalle": "No se pudo generar el audio de la alerta.",
-            "categoria": categoria,
-            "temperatura": float(temp),
-            "promedio": float(promedio),
-            "margen": float(margen),
-            "mensaje": mensaje,
-        }
-
-    # === Paso 2: Subir a Blob y obtener URL (OBLIGATORIO) ===
-    try:
-        print(f"[DEBUG] Subiendo {local_path} a Blob Storage.")
-        url_audio = subir_a_blob(local_path, archivo)
-    except Exception as e:
-        print(f"[ERROR] Falló la subida a Blob: {e}")
-        try:
-            if os.path.exists(local_path):
-                os.remove(local_path)
-                print(f"[CLEANUP] WAV eliminado tras fallo de subida: {local_path}")
-        except Exception as e2:
-            print(f"[WARN] No se pudo borrar {local_path}: {e2}")
-        return {
-            "error": "ERROR_BLOB",
-            "detalle": "No se pudo subir el audio a Blob Storage.",
-            "categoria": categoria,
-            "temperatura": float(temp),
-            "promedio": float(promedio),
-            "margen": float(margen),
-            "mensaje": mensaje,
-        }
-    finally:
-        # Siempre limpiar el WAV local si existe
+    # === Paso 0: Reutilizar audio de la alerta anterior o ya subido para el mismo mensaje ===
+    clave = clave_tts(mensaje)
+    url_audio, variantes = _audio_anterior(anterior, mensaje)
+    if not url_audio:
+        url_audio = AUDIO_CACHE.url_subida(clave)
+        if url_audio:
+            print(f"[DEBUG] Audio reutilizado desde caché: {url_audio}")
+    if not url_audio:
+        # === Paso 1: Generar audio en memoria (OBLIGATORIO) ===
+        print(f"[DEBUG] Generando audio para {archivo}")
+        audio_bytes = generar_audio(mensaje)
+        if not audio_bytes:
+            print("[ERROR] No se pudo generar el audio TTS. No se guardará alerta.")
+            return {"error": "ERROR_TTS", "detalle": "No se pudo generar el audio de la alerta.", **base}
+
+        # === Paso 2: Subir a Blob directo desde memoria y obtener URL (OBLIGATORIO) ===
         try:
-            if os.path.exists(local_path):
-                os.remove(local_path)
-                print(f"[CLEANUP] WAV eliminado: {local_path}")
+            print(f"[DEBUG] Subiendo {archivo} ({len(audio_bytes)} bytes) a Blob Storage.")
+            url_audio = subir_a_blob(audio_bytes, archivo, clave=clave)
         except Exception as e:
-            print(f"[WARN] No se pudo borrar {local_path}: {e}")
+            print(f"[ERROR] Falló la subida a Blob: {e}")
+            return {"error": "ERROR_BLOB", "detalle": "No se pudo subir el audio a Blob Storage.", **base}
 
     if not url_audio:
         print("[ERROR] Subida a Blob no devolvió URL. No se guardará alerta.")
-        return {
-            "error": "ERROR_URL_AUDIO",
-            "detalle": "No se obtuvo la URL del audio.",
-            "categoria": categoria,
-            "temperatura": float(temp),
-            "promedio": float(promedio),
-            "margen": float(margen),
-            "mensaje": mensaje,
-        }
+        return {"error": "ERROR_URL_AUDIO", "detalle": "No se obtuvo la URL del audio.", **base}
+
+    # === Paso 2b: Variantes comprimidas (opcionales; si fallan se usa solo el WAV) ===
+    if variantes is None:
+        try:
+            variantes = subir_variantes(lambda: generar_audio(mensaje), archivo, clave=clave)
+        except Exception as e:
+            print(f"[WARN] No se pudieron generar variantes de audio: {e}")
+            variantes = {}
 
     # === Paso 3: Guardar en Cosmos (PK = /quien) con url_audio ===
     alerta_doc = {
@@ -141,32 +146,100 @@ def generar_alerta_y_guardar(
         "margen": float(margen),
         "mensaje": mensaje,
         "url_audio": url_audio,                 # obligatorio en modo estricto
+        "url_audio_variantes": variantes,       # { 'ulaw8k': url, 'mp3': url, ... }
         # 'tipo', 'activo', 'creado_en' e 'id' los setea el helper si no vienen
     }
     try:
         saved = ch_guardar_alerta_clima(cosmos_handler.container, alerta_doc)
     except Exception as e:
         print(f"[ERROR] Cosmos guardado falló: {e}")
-        return {
-            "error": "ERROR_COSMOS",
-            "detalle": "No se pudo guardar el documento en CosmosDB.",
-            "categoria": categoria,
-            "temperatura": float(temp),
-            "promedio": float(promedio),
-            "margen": float(margen),
-            "mensaje": mensaje,
-        }
+        return {"error": "ERROR_COSMOS", "detalle": "No se pudo guardar el documento en CosmosDB.", **base}
 
     # Respuesta OK (la API responderá 201 si ve id_documento)
     return {
         "debe_reproducir": True,
         "id_documento": saved.get("id"),
+        **base,
+        "url_audio": url_audio,
+        "url_audio_variantes": variantes,
+        "estado": "alerta_guardada",
+    }
+
+
+async def generar_alerta_y_guardar_async(
+    persona: str,
+    promedio: float,
+    margen: float = 4.0,
+    incluir_temp: bool = False,
+    lat: float = LAT_DEFECTO,
+    lon: float = LON_DEFECTO,
+) -> dict:
+    """
+    Versión async de generar_alerta_y_guardar (modo ASGI), con las mismas reglas y respuestas.
+    El clima y la última alerta de la persona se consultan a la vez.
+    """
+    container = await obtener_container_cosmos_async()
+    temp, anterior = await asyncio.gather(
+        obtener_temp_actual_async(lat, lon),
+        _ultima_alerta_async(container, persona),
+    )
+    base = {"temperatura": float(temp), "promedio": float(promedio), "margen": float(margen),
+            "alerta_anterior": anterior.get("id") if anterior else None}
+
+    if (promedio - margen) < temp < (promedio + margen):
+        print("[INFO] Sin alerta: la temperatura está dentro del rango normal.")
+        return {"debe_reproducir": False, "estado": "normal", **base}
+
+    categoria = "frio" if temp <= (promedio - margen) else "calor"
+    mensaje, archivo = _mensaje_y_archivo(categoria, temp, incluir_temp)
+    base.update(categoria=categoria, mensaje=mensaje)
+
+    clave = clave_tts(mensaje)
+    url_audio, variantes = _audio_anterior(anterior, mensaje)
+    if not url_audio:
+        url_audio = AUDIO_CACHE.url_subida(clave)
+    if not url_audio:
+        audio_bytes = await generar_audio_async(mensaje)
+        if not audio_bytes:
+            return {"error": "ERROR_TTS", "detalle": "No se pudo generar el audio de la alerta.", **base}
+        try:
+            url_audio = await subir_a_blob_async(audio_bytes, archivo, clave=clave)
+        except Exception as e:
+            print(f"[ERROR] Falló la subida a Blob: {e}")
+            return {"error": "ERROR_BLOB", "detalle": "No se pudo subir el audio a Blob Storage.", **base}
+    if not url_audio:
+        return {"error": "ERROR_URL_AUDIO", "detalle": "No se obtuvo la URL del audio.", **base}
+
+    if variantes is None:
+        try:
+            # Transcodificar es CPU/ffmpeg: fuera del event loop
+            variantes = await asyncio.to_thread(subir_variantes, lambda: generar_audio(mensaje), archivo, clave=clave)
+        except Exception as e:
+            print(f"[WARN] No se pudieron generar variantes de audio: {e}")
+            variantes = {}
+
+    alerta_doc = {
+        "quien": persona,
         "categoria": categoria,
-        "temperatura": float(temp),
+        "temperatura_actual": float(temp),
         "promedio": float(promedio),
         "margen": float(margen),
         "mensaje": mensaje,
         "url_audio": url_audio,
+        "url_audio_variantes": variantes,
+    }
+    try:
+        saved = await ch_guardar_alerta_clima_async(container, alerta_doc)
+    except Exception as e:
+        print(f"[ERROR] Cosmos guardado falló: {e}")
+        return {"error": "ERROR_COSMOS", "detalle": "No se pudo guardar el documento en CosmosDB.", **base}
+
+    return {
+        "debe_reproducir": True,
+        "id_documento": saved.get("id"),
+        **base,
+        "url_audio": url_audio,
+        "url_audio_variantes": variantes,
         "estado": "alerta_guardada",
     }
 
@@ -199,5 +272,6 @@ def obtener_ultima_alerta(persona: str, categoria: str | None = None) -> dict |
         "margen": doc.get("margen"),
         "mensaje": doc.get("mensaje"),
         "url_audio": doc.get("url_audio"),
+        "url_audio_variantes": doc.get("url_audio_variantes") or {},
         "creado_en": doc.get("creado_en"),
     }
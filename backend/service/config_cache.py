@@ -0,0 +1,371 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+CONFIG_CHANGE_FEED = os.getenv("CONFIG_CHANGE_FEED", "true").lower() == "true"
+CONFIG_FEED_INTERVALO_SEG = float(os.getenv("CONFIG_FEED_INTERVALO_SEG", "2"))
+# Con change feed el TTL es solo una red de seguridad (reconstrucción completa)
+CONFIG_CACHE_TTL_SEG = int(os.getenv("CONFIG_CACHE_TTL_SEG", "600" if CONFIG_CHANGE_FEED else "60"))
+# Cambios que se recuerdan para responder deltas (?desde=<version>)
+CONFIG_DELTA_HISTORIAL = int(os.getenv("CONFIG_DELTA_HISTORIAL", "2000"))
+# Vistas por combinación de personas (?quien=...) que se guardan serializadas (LRU)
+CONFIG_VISTAS_MAX = int(os.getenv("CONFIG_VISTAS_MAX", "500"))
+# Espera mínima entre refrescos en segundo plano cuando el origen está fallando
+CONFIG_REFRESH_REINTENTO_SEG = float(os.getenv("CONFIG_REFRESH_REINTENTO_SEG", "10"))
+
+
+def _entrada_config(r: dict) -> dict:
+    """Campos de un recordatorio que viajan al ESP32."""
+    return {
+        "id": r.get("id"),
+        "quien": r.get("quien"),
+        "hora": r.get("hora"),
+        "medicamento": r.get("medicamento"),
+        "mensaje": r.get("mensaje"),
+        "audio_url": r.get("audio_url"),
+        "activo": r.get("activo", True),
+    }
+
+
+class ConfigCache:
+    """
+    Payload de /api/esp32/config en memoria: id -> entrada, con body y ETag precalculados.
+    - reconstruir(): carga completa desde 'fuente' (p.ej. obtener_recordatorios_activos).
+    - aplicar(): cambios incrementales (change feed); el body y el ETag solo se
+      recalculan si alguna entrada cambió de verdad.
+    - Cada cambio real sube 'version' y queda en un historial acotado (id, quien) para
+      responder deltas por persona; las vistas por persona se cachean con su propio ETag.
+    - Hacia afuera la versión viaja como "<epoca>:<version>" (token_version): la época es
+      propia de cada instancia, así una versión de antes de un reinicio o de otro worker
+      nunca se confunde con una de esta y recibe la lista completa.
+    - Stale-while-revalidate: vencido el TTL, los lectores reciben la copia actual al
+      instante y UN solo hilo de fondo reconstruye (single-flight). Solo la primera
+      carga, sin copia previa, espera al origen.
+    """
+
+    def __init__(self, fuente: Callable[[], List[dict]], ttl_seg: int = CONFIG_CACHE_TTL_SEG,
+                 max_historial: int = CONFIG_DELTA_HISTORIAL, max_vistas: int = CONFIG_VISTAS_MAX):
+        self.fuente = fuente
+        self.ttl_seg = ttl_seg
+        self._entradas: Dict[str, dict] = {}
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.ts = 0.0           # última reconstrucción completa
+        self.version = 0        # sube con cada cambio real del payload
+        self.epoca = uuid.uuid4().hex[:8]  # identifica esta instancia (ver token_version)
+        self._historial: deque = deque(maxlen=max_historial)  # (version, id, quien)
+        self._version_base = 0  # el historial tiene todos los cambios posteriores a esta versión
+        # quienes -> (body, etag); LRU acotado: las combinaciones vienen de los dispositivos
+        self._vistas: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.max_vistas = max_vistas
+        self.reconstrucciones = 0
+        self.cambios_aplicados = 0
+        self._suscriptores: List[Callable[[set, int], Any]] = []
+        self._lock = threading.Lock()
+        self._primera_carga = threading.Lock()
+        self._refrescando = False
+        self._proximo_intento = 0.0
+        # Métricas del refresco
+        self.errores_refresco = 0
+        self.lecturas_vencidas = 0
+        self.max_edad_servida = 0.0
+        self._duracion_total = 0.0
+        self._duracion_ultima = 0.0
+        self._duracion_max = 0.0
+
+    @staticmethod
+    def _serializar(entradas: Iterable[dict]) -> tuple:
+        """(body, etag) con orden estable para un ETag estable."""
+        payload = sorted(entradas, key=lambda e: (e["quien"] or "", e["hora"] or "", e["id"]))
+        body = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return body, hashlib.md5(body).hexdigest()
+
+    def token_version(self, version: Optional[int] = None) -> str:
+        """Versión tal como la ven los dispositivos: "<epoca>:<version>"."""
+        return f"{self.epoca}:{self.version if version is None else version}"
+
+    def _parsear_token(self, token) -> Optional[int]:
+        """Número de versión de un token de esta instancia; None si es de otra época o no se entiende."""
+        epoca, _, numero = str(token).partition(":")
+        if epoca != self.epoca or not numero.isdigit():
+            return None
+        return int(numero)
+
+    def suscribir(self, callback: Callable[[set, str], Any]):
+        """callback(quienes, token_version) después de cada cambio real del payload (fuera del lock)."""
+        self._suscriptores.append(callback)
+
+    def _avisar(self, quienes: set, version: str):
+        for callback in self._suscriptores:
+            try:
+                callback(quienes, version)
+            except Exception as e:
+                print(f"[CONFIG][WARN] Suscriptor falló: {e}")
+
+    def _registrar(self, cambios: List[tuple]):
+        """Nueva versión con los (id, quien) modificados. Se llama con _lock tomado."""
+        if cambios:
+            self.version += 1
+            for rec_id, quien in cambios:
+                if len(self._historial) == self._historial.maxlen:
+                    self._version_base = self._historial[0][0]
+                self._historial.append((self.version, rec_id, quien))
+            afectados = {quien for _, quien in cambios}
+            self._vistas = OrderedDict((k, v) for k, v in self._vistas.items() if not afectados.intersection(k))
+        if cambios or self.body is None:
+            self.body, self.etag = self._serializar(self._entradas.values())
+
+    def _reconstruir(self):
+        """
+        Carga completa desde 'fuente'. La consulta corre SIN el lock: los lectores siguen
+        respondiendo con la copia actual mientras tanto.
+        """
+        inicio = time.time()
+        with self._lock:
+            version_inicio = self.version
+            habia_copia = self.body is not None
+        recordatorios = self.fuente()
+        nuevas = {r["id"]: _entrada_config(r) for r in recordatorios if r.get("id")}
+        with self._lock:
+            # Lo que llegó por el change feed durante la consulta es más nuevo que el snapshot
+            for version, rec_id, _ in self._historial:
+                if version <= version_inicio:
+                    continue
+                if rec_id in self._entradas:
+                    nuevas[rec_id] = self._entradas[rec_id]
+                else:
+                    nuevas.pop(rec_id, None)
+            anteriores = self._entradas
+            cambios = [
+                (rec_id, (nuevas.get(rec_id) or anteriores[rec_id])["quien"])
+                for rec_id in set(anteriores) | set(nuevas)
+                if anteriores.get(rec_id) != nuevas.get(rec_id)
+            ]
+            self._entradas = nuevas
+            self._registrar(cambios)
+            self.ts = time.time()
+            self.reconstrucciones += 1
+            duracion = self.ts - inicio
+            self._duracion_ultima = duracion
+            self._duracion_total += duracion
+            self._duracion_max = max(self._duracion_max, duracion)
+            version = self.token_version()
+        if cambios and habia_copia:  # la primera carga no es un "cambio" para los dispositivos
+            self._avisar({quien for _, quien in cambios}, version)
+
+    def reconstruir(self):
+        self._reconstruir()
+
+    def _refrescar_en_fondo(self):
+        try:
+            self._reconstruir()
+        except Exception as e:
+            with self._lock:
+                self.errores_refresco += 1
+                self._proximo_intento = time.time() + CONFIG_REFRESH_REINTENTO_SEG
+            print(f"[CONFIG][WARN] Falló el refresco en segundo plano; se sigue sirviendo la copia: {e}")
+        finally:
+            with self._lock:
+                self._refrescando = False
+
+    def _preparar(self):
+        """
+        Garantiza que haya copia. Si está vencida, la sirve igual y lanza un único refresco
+        en segundo plano. Sin copia previa, un solo hilo carga y el resto espera (o relanza el error).
+        """
+        with self._lock:
+            if self.body is not None:
+                ahora = time.time()
+                edad = ahora - self.ts
+                if edad > self.ttl_seg:
+                    self.lecturas_vencidas += 1
+                    self.max_edad_servida = max(self.max_edad_servida, edad)
+                    if not self._refrescando and ahora >= self._proximo_intento:
+                        self._refrescando = True
+                        threading.Thread(target=self._refrescar_en_fondo, daemon=True, name="config-refresh").start()
+                return
+        with self._primera_carga:
+            if self.body is None:
+                self._reconstruir()
+
+    def aplicar(self, documentos: Iterable[dict]) -> bool:
+        """Aplica documentos modificados. Devuelve True si el payload cambió."""
+        cambios = []
+        with self._lock:
+            for doc in documentos:
+                if doc.get("tipo") != "recordatorio" or not doc.get("id"):
+                    continue
+                actual = self._entradas.get(doc["id"])
+                if doc.get("activo", True):
+                    nueva = _entrada_config(doc)
+                    if nueva != actual:
+                        self._entradas[doc["id"]] = nueva
+                        cambios.append((doc["id"], doc.get("quien")))
+                elif actual is not None:
+                    del self._entradas[doc["id"]]
+                    cambios.append((doc["id"], actual["quien"]))
+            avisar = bool(cambios) and self.body is not None
+            if avisar:
+                self._registrar(cambios)
+                self.cambios_aplicados += 1
+            version = self.token_version()
+        if avisar:
+            self._avisar({quien for _, quien in cambios}, version)
+        return bool(cambios)
+
+    def _vista(self, quienes: tuple) -> tuple:
+        vista = self._vistas.get(quienes)
+        if vista is not None:
+            self._vistas.move_to_end(quienes)
+            return vista
+        vista = self._serializar(e for e in self._entradas.values() if e["quien"] in quienes)
+        self._vistas[quienes] = vista
+        while len(self._vistas) > self.max_vistas:
+            self._vistas.popitem(last=False)
+        return vista
+
+    def obtener(self, quienes: Optional[Iterable[str]] = None) -> tuple:
+        """
+        Devuelve (body, etag) de todos los recordatorios o solo de las personas 'quienes'.
+        Si el origen falla y hay copia, usa la copia vieja; si no hay copia, relanza el error.
+        """
+        self._preparar()
+        with self._lock:
+            if not quienes:
+                return self.body, self.etag
+            return self._vista(tuple(sorted(set(quienes))))
+
+    def entradas(self) -> List[dict]:
+        """Copia de las entradas actuales (sin forzar reconstrucción)."""
+        with self._lock:
+            return list(self._entradas.values())
+
+    def delta(self, quienes: Iterable[str], desde: str) -> Dict[str, Any]:
+        """
+        Cambios de las personas 'quienes' posteriores a la versión 'desde' ("<epoca>:<n>"):
+        { version, completo: false, cambios: [...], eliminados: [ids] }.
+        Si 'desde' ya salió del historial o es de otra instancia (otra época: reinicio u otro
+        worker), devuelve la lista completa: { version, completo: true, recordatorios: [...] }.
+        """
+        quienes = set(quienes)
+        self._preparar()
+        with self._lock:
+            numero = self._parsear_token(desde)
+            if numero is None or numero < self._version_base or numero > self.version:
+                recordatorios = [e for e in self._entradas.values() if e["quien"] in quienes]
+                recordatorios.sort(key=lambda e: (e["quien"] or "", e["hora"] or "", e["id"]))
+                return {"version": self.token_version(), "completo": True, "recordatorios": recordatorios}
+            ids = list(dict.fromkeys(
+                rec_id for version, rec_id, quien in self._historial
+                if version > numero and quien in quienes
+            ))
+            return {
+                "version": self.token_version(),
+                "completo": False,
+                "cambios": [self._entradas[i] for i in ids if i in self._entradas],
+                "eliminados": [i for i in ids if i not in self._entradas],
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "recordatorios": len(self._entradas),
+                "version": self.token_version(),
+                "etag": self.etag,
+                "ttl_seg": self.ttl_seg,
+                "vistas_cacheadas": len(self._vistas),
+                "historial": len(self._historial),
+                "reconstrucciones": self.reconstrucciones,
+                "cambios_aplicados": self.cambios_aplicados,
+                "edad_seg": round(time.time() - self.ts, 1) if self.ts else None,
+                "refrescando": self._refrescando,
+                "errores_refresco": self.errores_refresco,
+                "lecturas_vencidas": self.lecturas_vencidas,
+                "max_edad_servida_seg": round(self.max_edad_servida, 1),
+                "refresco_ms": {
+                    "ultimo": round(self._duracion_ultima * 1000, 1),
+                    "max": round(self._duracion_max * 1000, 1),
+                    "promedio": round(self._duracion_total * 1000 / self.reconstrucciones, 1)
+                    if self.reconstrucciones else None,
+                },
+            }
+
+
+class ConsumidorChangeFeed:
+    """
+    Lee el change feed del contenedor en un hilo de fondo y pasa los documentos
+    modificados a cada callback (p.ej. ConfigCache.aplicar).
+    Arranca desde "ahora": lo anterior ya lo cubre la carga completa inicial.
+    'handler' es cosmos_handler (o cualquier objeto con .container: ContainerProxy o
+    utils.cosmos_memoria.ContenedorMemoria); el contenedor se resuelve recién al leer.
+    """
+
+    def __init__(self, handler, callbacks: List[Callable[[List[dict]], Any]],
+                 intervalo_seg: float = CONFIG_FEED_INTERVALO_SEG):
+        self.handler = handler
+        self.callbacks = list(callbacks)
+        self.intervalo_seg = intervalo_seg
+        self.continuation: Optional[str] = None
+        self.lecturas = 0
+        self.documentos = 0
+        self.errores = 0
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+
+    def leer_cambios(self) -> int:
+        """Una pasada por el feed. Devuelve cuántos documentos se leyeron."""
+        if self.continuation is None:
+            feed = self.handler.container.query_items_change_feed(start_time="Now")
+        else:
+            feed = self.handler.container.query_items_change_feed(continuation=self.continuation)
+        paginas = feed.by_page()
+        documentos = [doc for pagina in paginas for doc in pagina]
+        # El token se toma al final: si algo falla antes, la próxima pasada relee los cambios
+        self.continuation = paginas.continuation_token or self.continuation
+        if documentos:
+            for callback in self.callbacks:
+                callback(documentos)
+        self.lecturas += 1
+        self.documentos += len(documentos)
+        return len(documentos)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self.leer_cambios()
+            except Exception as e:
+                self.errores += 1
+                print(f"[CHANGE_FEED][WARN] Falló la lectura del change feed: {e}")
+            self._detener.wait(self.intervalo_seg)
+
+    def iniciar(self):
+        """Arranca el hilo una sola vez (idempotente). La primera lectura fija el punto de partida."""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            try:
+                self.leer_cambios()
+            except Exception as e:
+                print(f"[CHANGE_FEED][WARN] No se pudo iniciar el change feed: {e}")
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="change-feed")
+            self._hilo.start()
+            print(f"[CHANGE_FEED] Iniciado: cada {self.intervalo_seg}s")
+
+    def detener(self):
+        self._detener.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "activo": self._hilo is not None and not self._detener.is_set(),
+            "intervalo_seg": self.intervalo_seg,
+            "lecturas": self.lecturas,
+            "documentos": self.documentos,
+            "errores": self.errores,
+        }
@@ -6,15 +6,72 @@ from config.config import (
     AZURE_COSMOS_KEY,
     AZURE_COSMOS_URL
 )
+import os
+import threading
 import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Límite de operaciones por transactional batch en Cosmos DB
+MAX_OPERACIONES_BATCH = 100
+# Borrados individuales en paralelo cuando un batch no se puede aplicar completo
+ELIMINAR_MAX_WORKERS = int(os.getenv("ELIMINAR_MAX_WORKERS", "8"))
+
+# Columnas que exponen los endpoints de alertas (proyección en el servidor)
+CAMPOS_ALERTA = [
+    "id", "quien", "categoria", "temperatura_actual", "promedio",
+    "margen", "url_audio", "url_audio_variantes", "mensaje", "creado_en",
+]
 
 
 class cosmos_handler:
     def __init__(self):
-        self.client = CosmosClient(AZURE_COSMOS_URL, AZURE_COSMOS_KEY)
-        self.database = self.client.get_database_client(AZURE_COSMOS_DATABASE_NAME)
-        self.container = self.database.get_container_client(AZURE_COSMOS_DB_CONTAINER_NAME)
+        # El CosmosClient se abre en el primer uso de .container, no al importar el módulo
+        self.client = None
+        self.database = None
+        self._container = None
+        self._lock = threading.Lock()
+        self._suscriptores = []
+
+    @property
+    def container(self):
+        if self._container is None:
+            with self._lock:
+                if self._container is None:
+                    self.client = CosmosClient(AZURE_COSMOS_URL, AZURE_COSMOS_KEY)
+                    self.database = self.client.get_database_client(AZURE_COSMOS_DATABASE_NAME)
+                    self._container = self.database.get_container_client(AZURE_COSMOS_DB_CONTAINER_NAME)
+        return self._container
+
+    @container.setter
+    def container(self, container):
+        """Permite inyectar otro contenedor (p.ej. utils.cosmos_memoria.ContenedorMemoria en pruebas)."""
+        self._container = container
+
+    def suscribir(self, callback):
+        """
+        Registra 'callback(evento, documento)' para enterarse de escrituras de recordatorios
+        hechas por este proceso. Eventos: 'guardado', 'desactivado'.
+        """
+        self._suscriptores.append(callback)
+
+    def _notificar(self, evento, documento):
+        for callback in self._suscriptores:
+            try:
+                callback(evento, documento)
+            except Exception as e:
+                print(f"[Cosmos][WARN] Suscriptor falló ({evento}): {e}")
+
+    @staticmethod
+    def _documento_recordatorio(datos_json):
+        """Arma el documento de recordatorio con sus metadatos."""
+        return {
+            "id": str(uuid.uuid4()),
+            "tipo": "recordatorio",
+            "fecha_creacion": datetime.now().isoformat(),
+            "activo": True,
+            **datos_json
+        }
 
     def guardar_recordatorio(self, datos_json):
         """
@@ -22,16 +79,11 @@ class cosmos_handler:
         """
         try:
             # Agregar metadatos
-            documento = {
-                "id": str(uuid.uuid4()),
-                "tipo": "recordatorio",
-                "fecha_creacion": datetime.now().isoformat(),
-                "activo": True,
-                **datos_json
-            }
+            documento = self._documento_recordatorio(datos_json)
 
             # Crear el item - el partition key se toma automáticamente del campo 'quien'
             response = self.container.create_item(body=documento)
+            self._notificar("guardado", documento)
 
             print(f"Recordatorio guardado con ID: {response['id']}")
             return response['id']
@@ -43,6 +95,42 @@ class cosmos_handler:
             print(f"Error general: {e}")
             return None
 
+    def guardar_recordatorios_lote(self, lista_datos):
+        """
+        Guarda varios recordatorios usando transactional batch por partición ('quien'),
+        en grupos de hasta MAX_OPERACIONES_BATCH operaciones.
+        Devuelve una lista alineada con 'lista_datos': el id guardado o None si falló.
+        Si un batch falla completo, reintenta sus documentos uno por uno con guardar_recordatorio.
+        """
+        ids = [None] * len(lista_datos)
+        por_particion = {}
+        for i, datos in enumerate(lista_datos):
+            por_particion.setdefault(datos.get("quien"), []).append(i)
+
+        for quien, indices in por_particion.items():
+            if not quien:
+                print("Recordatorio sin 'quien'; no se puede guardar (partition key).")
+                continue
+            for inicio in range(0, len(indices), MAX_OPERACIONES_BATCH):
+                grupo = indices[inicio:inicio + MAX_OPERACIONES_BATCH]
+                documentos = [self._documento_recordatorio(lista_datos[i]) for i in grupo]
+                try:
+                    self.container.execute_item_batch(
+                        batch_operations=[("create", (doc,)) for doc in documentos],
+                        partition_key=quien,
+                    )
+                    for i, doc in zip(grupo, documentos):
+                        ids[i] = doc["id"]
+                        self._notificar("guardado", doc)
+                    print(f"Batch de {len(documentos)} recordatorios guardado (quien={quien})")
+                except exceptions.CosmosBatchOperationError as e:
+                    print(f"Batch falló (quien={quien}, índice={e.error_index}); guardando uno por uno")
+                    for i in grupo:
+                        ids[i] = self.guardar_recordatorio(lista_datos[i])
+                except exceptions.CosmosHttpResponseError as e:
+                    print(f"Error guardando batch de recordatorios (quien={quien}): {e}")
+        return ids
+
     def obtener_recordatorios_activos(self):
         """
         Obtiene todos los recordatorios activos
@@ -59,6 +147,22 @@ class cosmos_handler:
             print(f"Error obteniendo recordatorios: {e}")
             return []
 
+    def obtener_perfiles_alerta(self):
+        """
+        Obtiene los perfiles de alerta de clima activos (uno por persona):
+        { tipo: 'perfil_alerta', quien, promedio, margen, lat, lon, incluir_temp, activo }
+        """
+        try:
+            query = "SELECT * FROM c WHERE c.tipo = 'perfil_alerta' AND c.activo = true"
+            return list(self.container.query_items(
+                query=query,
+                enable_cross_partition_query=True
+            ))
+
+        except exceptions.CosmosHttpResponseError as e:
+            print(f"Error obteniendo perfiles de alerta: {e}")
+            return []
+
     def obtener_recordatorios_por_hora(self, hora):
         """
         Obtiene recordatorios para una hora específica (formato HH:MM)
@@ -85,7 +189,7 @@ class cosmos_handler:
             recordatorios = list(self.container.query_items(
                 query=query,
                 parameters=[{"name": "@quien", "value": quien}],
-                enable_cross_partition_query=False  # Ya que usamos partition key
+                partition_key=quien  # Solo la partición de la persona
             ))
             return recordatorios
 
@@ -113,6 +217,7 @@ class cosmos_handler:
                 item=recordatorio_id,
                 body=documento
             )
+            self._notificar("desactivado", documento)
 
             print(f"Recordatorio {recordatorio_id} desactivado")
             return True
@@ -203,23 +308,44 @@ def guardar_alerta_clima(container, alerta: dict):
         print(f"[ERROR] guardar_alerta_clima: {e}")
         raise
 
-def obtener_ultima_alerta(container, quien: str, categoria: str = None):
+def _alcance_particion(quien: str | None) -> dict:
+    """kwargs de query_items: partition_key si se conoce 'quien'; si no, consulta cross-partition."""
+    if quien:
+        return {"partition_key": quien}
+    return {"enable_cross_partition_query": True}
+
+
+def _proyeccion(campos) -> str:
+    if not campos:
+        return "*"
+    return ", ".join(f"c.{campo}" for campo in campos)
+
+
+def _filtro_alertas(quien: str = None, categoria: str = None) -> tuple[str, list]:
+    where = " WHERE c.tipo = 'alerta_clima'"
+    params = []
+    if quien:
+        where += " AND c.quien = @quien"
+        params.append({"name": "@quien", "value": quien})
+    if categoria:
+        where += " AND c.categoria = @categoria"
+        params.append({"name": "@categoria", "value": categoria})
+    return where, params
+
+
+def obtener_ultima_alerta(container, quien: str, categoria: str = None, campos=None):
     """
     Devuelve la última alerta para 'quien' y opcionalmente por 'categoria' ('abrigo'|'calor').
-    Ordena por 'creado_en' descendente.
+    Ordena por 'creado_en' descendente. TOP 1 en el servidor y solo la partición de 'quien'.
     """
     try:
-        query = "SELECT * FROM c WHERE c.quien = @quien AND c.tipo = 'alerta_clima'"
-        params = [{"name": "@quien", "value": quien}]
-        if categoria:
-            query += " AND c.categoria = @categoria"
-            params.append({"name": "@categoria", "value": categoria})
-        query += " ORDER BY c.creado_en DESC"
+        where, params = _filtro_alertas(quien, categoria)
+        query = f"SELECT TOP 1 {_proyeccion(campos)} FROM c{where} ORDER BY c.creado_en DESC"
 
         items = list(container.query_items(
             query=query,
             parameters=params,
-            enable_cross_partition_query=True
+            **_alcance_particion(quien)
         ))
         return items[0] if items else None
     except exceptions.CosmosResourceNotFoundError:
@@ -228,34 +354,113 @@ def obtener_ultima_alerta(container, quien: str, categoria: str = None):
         print(f"[ERROR] obtener_ultima_alerta: {e}")
         raise
 
-def listar_alertas(container, quien: str = None, categoria: str = None, limit: int = 50):
+async def obtener_ultima_alerta_async(container, quien: str, categoria: str = None, campos=None):
+    """obtener_ultima_alerta sobre un ContainerProxy de azure.cosmos.aio (modo ASGI)."""
+    where, params = _filtro_alertas(quien, categoria)
+    query = f"SELECT TOP 1 {_proyeccion(campos)} FROM c{where} ORDER BY c.creado_en DESC"
+    try:
+        async for item in container.query_items(query=query, parameters=params, partition_key=quien):
+            return item
+        return None
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+async def guardar_alerta_clima_async(container, alerta: dict):
+    """guardar_alerta_clima sobre un ContainerProxy de azure.cosmos.aio (modo ASGI)."""
+    if "quien" not in alerta or not alerta["quien"]:
+        raise ValueError("Campo 'quien' es requerido para la partición.")
+    alerta.setdefault("tipo", "alerta_clima")
+    alerta.setdefault("activo", True)
+    alerta.setdefault("creado_en", datetime.utcnow().isoformat())
+    alerta["id"] = str(uuid.uuid4())
+    await container.create_item(body=alerta)
+    return alerta
+
+
+def listar_alertas(container, quien: str = None, categoria: str = None, limit: int = 50, campos=None):
     """
     Lista alertas tipo='alerta_clima', opcionalmente filtradas por 'quien' y 'categoria'.
     TOP usa literal (no parámetro).
     """
     try:
         limit = max(1, min(int(limit or 50), 200))
-        base = f"SELECT TOP {limit} * FROM c WHERE c.tipo = 'alerta_clima'"
-        params = []
-        if quien:
-            base += " AND c.quien = @quien"
-            params.append({"name": "@quien", "value": quien})
-        if categoria:
-            base += " AND c.categoria = @categoria"
-            params.append({"name": "@categoria", "value": categoria})
-        base += " ORDER BY c.creado_en DESC"
+        where, params = _filtro_alertas(quien, categoria)
+        base = f"SELECT TOP {limit} {_proyeccion(campos)} FROM c{where} ORDER BY c.creado_en DESC"
 
         items = list(container.query_items(
             query=base,
             parameters=params,
-            enable_cross_partition_query=True
+            **_alcance_particion(quien)
         ))
         return items
     except Exception as e:
         print(f"[ERROR] listar_alertas: {e}")
         raise
 
-def eliminar_alertas(container, quien: str, categoria: str | None = None) -> int:
+def listar_alertas_pagina(container, quien: str = None, categoria: str = None, limit: int = 20,
+                          continuation: str = None, campos=CAMPOS_ALERTA):
+    """
+    Una página de alertas (más recientes primero) con solo las columnas de 'campos'.
+    Devuelve (items, continuation_token); el token es None cuando no hay más páginas.
+    Solo se lee del servidor la página pedida (max_item_count=limit).
+    """
+    try:
+        limit = max(1, min(int(limit or 20), 200))
+        where, params = _filtro_alertas(quien, categoria)
+        query = f"SELECT {_proyeccion(campos)} FROM c{where} ORDER BY c.creado_en DESC"
+
+        paginas = container.query_items(
+            query=query,
+            parameters=params,
+            max_item_count=limit,
+            **_alcance_particion(quien)
+        ).by_page(continuation)
+        items = list(next(paginas, []))
+        return items, paginas.continuation_token
+    except Exception as e:
+        print(f"[ERROR] listar_alertas_pagina: {e}")
+        raise
+
+def _eliminar_uno(container, _id: str, quien: str) -> bool:
+    try:
+        container.delete_item(item=_id, partition_key=quien)
+        return True
+    except exceptions.CosmosResourceNotFoundError:
+        return False  # ya lo borró otra petición
+    except exceptions.CosmosHttpResponseError as e:
+        print(f"[Cosmos] No se pudo borrar id={_id} (quien={quien}): {e}")
+        return False
+
+
+def eliminar_ids(container, quien: str, ids: list, progreso=None) -> int:
+    """
+    Borra los documentos 'ids' de la partición 'quien'.
+    Usa transactional batch de hasta MAX_OPERACIONES_BATCH deletes; si un batch falla
+    (p.ej. un id ya no existe) ese grupo se borra con deletes concurrentes (ELIMINAR_MAX_WORKERS).
+    'progreso(hechos, total)' se llama después de cada grupo. Devuelve la cantidad eliminada.
+    """
+    ids = [i for i in ids if i]
+    total = len(ids)
+    eliminados = 0
+    for inicio in range(0, total, MAX_OPERACIONES_BATCH):
+        grupo = ids[inicio:inicio + MAX_OPERACIONES_BATCH]
+        try:
+            container.execute_item_batch(
+                batch_operations=[("delete", (_id,)) for _id in grupo],
+                partition_key=quien,
+            )
+            eliminados += len(grupo)
+        except (exceptions.CosmosBatchOperationError, exceptions.CosmosHttpResponseError) as e:
+            print(f"[Cosmos] Batch de borrado falló (quien={quien}): {e}; borrando en paralelo")
+            with ThreadPoolExecutor(max_workers=min(len(grupo), ELIMINAR_MAX_WORKERS)) as pool:
+                eliminados += sum(pool.map(lambda _id: _eliminar_uno(container, _id, quien), grupo))
+        if progreso:
+            progreso(min(inicio + len(grupo), total), total)
+    return eliminados
+
+
+def eliminar_alertas(container, quien: str, categoria: str | None = None, progreso=None) -> int:
     """
     Borra documentos tipo 'alerta_clima' para la persona 'quien'.
     Si se pasa 'categoria' ('abrigo'|'calor'), filtra por ella.
@@ -265,32 +470,58 @@ def eliminar_alertas(container, quien: str, categoria: str | None = None) -> int
         raise ValueError("El parámetro 'quien' es requerido para eliminar alertas.")
 
     # Buscar ids a eliminar
-    query = "SELECT c.id FROM c WHERE c.tipo = 'alerta_clima' AND c.quien = @quien"
+    query = "SELECT VALUE c.id FROM c WHERE c.tipo = 'alerta_clima' AND c.quien = @quien"
     params = [{"name": "@quien", "value": quien}]
     if categoria:
         query += " AND c.categoria = @categoria"
         params.append({"name": "@categoria", "value": categoria})
 
-    items = list(container.query_items(
+    ids = list(container.query_items(
         query=query,
         parameters=params,
-        enable_cross_partition_query=True
+        partition_key=quien
     ))
 
-    # Borrar uno por uno con PK
-    eliminados = 0
-    for it in items:
-        _id = it.get("id")
-        if not _id:
-            continue
-        try:
-            container.delete_item(item=_id, partition_key=quien)
-            eliminados += 1
-        except exceptions.CosmosHttpResponseError as e:
-            print(f"[Cosmos] No se pudo borrar id={_id} (quien={quien}): {e}")
-            continue
+    # Borrar en batch dentro de la partición
+    return eliminar_ids(container, quien, ids, progreso=progreso)
 
-    return eliminados
+
+def eliminar_alertas_antiguas(container, dias: int, quien: str | None = None, progreso=None) -> dict:
+    """
+    Retención: borra alertas con 'creado_en' de hace más de 'dias' días
+    (de una persona o de todas). El filtro por fecha se resuelve en el servidor.
+    Devuelve { dias, limite, eliminados, por_persona }.
+    """
+    dias = int(dias)
+    if dias < 1:
+        raise ValueError("El parámetro 'dias' debe ser un entero mayor o igual a 1.")
+
+    # 'creado_en' se guarda como ISO UTC, así que se puede comparar como texto
+    limite = (datetime.utcnow() - timedelta(days=dias)).isoformat()
+    query = "SELECT c.id, c.quien FROM c WHERE c.tipo = 'alerta_clima' AND c.creado_en < @limite"
+    params = [{"name": "@limite", "value": limite}]
+    if quien:
+        query += " AND c.quien = @quien"
+        params.append({"name": "@quien", "value": quien})
+
+    por_particion = {}
+    for it in container.query_items(query=query, parameters=params, **_alcance_particion(quien)):
+        if it.get("quien"):
+            por_particion.setdefault(it["quien"], []).append(it.get("id"))
+
+    total = sum(len(ids) for ids in por_particion.values())
+    hechos_previos = 0
+    por_persona = {}
+    for persona, ids in por_particion.items():
+        def _progreso(hechos, _total, base=hechos_previos):
+            if progreso:
+                progreso(base + hechos, total)
+        por_persona[persona] = eliminar_ids(container, persona, ids, progreso=_progreso)
+        hechos_previos += len(ids)
+
+    eliminados = sum(por_persona.values())
+    print(f"[Cosmos] Retención {dias} días: {eliminados}/{total} alertas eliminadas")
+    return {"dias": dias, "limite": limite, "eliminados": eliminados, "por_persona": por_persona}
 
 def eliminar_alerta_por_id(container, alerta_id: str) -> bool:
     """
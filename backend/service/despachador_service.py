@@ -0,0 +1,280 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from service.cosmos_handler import cosmos_handler
+from service.recordatorio_index import aplica_en_fecha, minuto_del_dia
+from service.reproductor_service import REPRODUCTOR
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+DESPACHO_TZ = ZoneInfo(os.getenv("DESPACHO_TZ", "America/Costa_Rica"))
+# Minutos antes del disparo en que se descarga el audio al caché de reproducción
+DESPACHO_PRECALENTAR_SEG = int(os.getenv("DESPACHO_PRECALENTAR_SEG", "120"))
+# Recompilación completa desde Cosmos (cubre escrituras de otros procesos)
+DESPACHO_RECARGA_SEG = int(os.getenv("DESPACHO_RECARGA_SEG", "600"))
+# Recordatorios vencidos que se guardan por persona
+DESPACHO_VENCIDOS_MAX = int(os.getenv("DESPACHO_VENCIDOS_MAX", "50"))
+
+DIAS_SEMANA = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+
+
+def _sin_tildes(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+
+def _dias_validos(rec: dict) -> Optional[set]:
+    """Índices de día de semana (lunes=0) en que aplica; None = todos los días."""
+    dias = [_sin_tildes(str(d).strip().lower()) for d in (rec.get("dias") or [])]
+    if not dias or "todos" in dias:
+        return None
+    return {DIAS_SEMANA.index(d) for d in dias if d in DIAS_SEMANA}
+
+
+def proximo_disparo(rec: dict, desde: datetime) -> Optional[datetime]:
+    """
+    Próximo instante (> 'desde', con zona horaria) en que suena el recordatorio según
+    hora, dias, fecha_inicio y fecha_fin. None si no vuelve a sonar.
+    """
+    minuto = minuto_del_dia(rec.get("hora"))
+    if minuto is None or not rec.get("activo", True):
+        return None
+    dias = _dias_validos(rec)
+    if dias is not None and not dias:
+        return None
+    fecha = desde.date()
+    if rec.get("fecha_inicio"):
+        try:
+            fecha = max(fecha, datetime.strptime(rec["fecha_inicio"], "%Y-%m-%d").date())
+        except ValueError:
+            pass
+    for _ in range(8):  # una semana alcanza para cualquier combinación de días
+        fecha_str = fecha.strftime("%Y-%m-%d")
+        ff = rec.get("fecha_fin")
+        if ff not in (None, 0) and fecha_str > ff:
+            return None
+        if (dias is None or fecha.weekday() in dias) and aplica_en_fecha(rec, fecha_str):
+            instante = datetime(fecha.year, fecha.month, fecha.day, minuto // 60, minuto % 60, tzinfo=desde.tzinfo)
+            if instante > desde:
+                return instante
+        fecha += timedelta(days=1)
+    return None
+
+
+class DespachadorRecordatorios:
+    """
+    Motor de horarios de los recordatorios de medicamentos del lado del servidor.
+    - Heap de próximos disparos (un hilo que duerme hasta el siguiente instante, sin polling).
+    - Los cambios de cosmos_handler (suscripción) reprograman solo el recordatorio afectado;
+      cada DESPACHO_RECARGA_SEG se recompila todo desde Cosmos.
+    - DESPACHO_PRECALENTAR_SEG antes de cada disparo descarga el audio al caché del reproductor.
+    - Al vencer, el recordatorio queda en la lista de vencidos de la persona y se avisa a los suscriptores.
+    """
+
+    def __init__(self, handler, reproductor, tz=DESPACHO_TZ, precalentar_seg: int = DESPACHO_PRECALENTAR_SEG,
+                 recarga_seg: int = DESPACHO_RECARGA_SEG):
+        self.handler = handler
+        self.reproductor = reproductor
+        self.tz = tz
+        self.precalentar_seg = precalentar_seg
+        self.recarga_seg = recarga_seg
+        self._heap: List[tuple] = []                    # (ts, secuencia, accion, rec_id, disparo_ts)
+        self._programados: Dict[str, tuple] = {}        # rec_id -> (disparo_ts, rec)
+        self._vencidos: Dict[str, deque] = {}           # quien -> últimos vencidos
+        self._suscriptores: List[Callable[[dict], None]] = []
+        self._secuencia = itertools.count()
+        self._cond = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._precalentador = ThreadPoolExecutor(max_workers=2, thread_name_prefix="precalentar")
+        self.ultima_recarga = 0.0
+        # Hasta este instante (epoch) ya se atendieron todos los disparos vencidos del heap
+        self._procesado_hasta = 0.0
+        self.stats = {"disparos": 0, "precalentados": 0, "errores_precalentar": 0, "reprogramados": 0}
+        handler.suscribir(self._on_cambio)
+
+    def suscribir(self, callback: Callable[[dict], None]):
+        """callback(vencido) se llama cuando un recordatorio vence (desde el hilo del despachador)."""
+        self._suscriptores.append(callback)
+
+    # ---------- Programación ----------
+
+    def _programar(self, rec: dict, desde: datetime):
+        """Requiere self._cond tomado. Reemplaza el disparo anterior del recordatorio (si había)."""
+        rec_id = rec.get("id")
+        if not rec_id:
+            return
+        self._programados.pop(rec_id, None)
+        if rec.get("tipo", "recordatorio") != "recordatorio":
+            return
+        instante = proximo_disparo(rec, desde)
+        if instante is None:
+            return
+        disparo_ts = instante.timestamp()
+        self._programados[rec_id] = (disparo_ts, rec)
+        heapq.heappush(self._heap, (disparo_ts, next(self._secuencia), "disparo", rec_id, disparo_ts))
+        if rec.get("audio_url") and self.precalentar_seg > 0:
+            heapq.heappush(self._heap, (disparo_ts - self.precalentar_seg, next(self._secuencia),
+                                        "precalentar", rec_id, disparo_ts))
+        self._cond.notify()
+
+    def _on_cambio(self, evento: str, documento: dict):
+        """Callback de cosmos_handler: recalcula solo el recordatorio que cambió."""
+        with self._cond:
+            if evento == "desactivado":
+                self._programados.pop(documento.get("id"), None)  # sus entradas del heap quedan inválidas
+            else:
+                self._programar(documento, datetime.now(self.tz))
+            self.stats["reprogramados"] += 1
+
+    def recompilar(self):
+        """
+        Recalcula todos los próximos disparos desde los recordatorios activos de Cosmos.
+        Se programa a partir del último instante ya atendido (leído antes de la consulta), así un
+        recordatorio que vence mientras se consulta Cosmos queda vencido en el heap y suena igual.
+        """
+        self.ultima_recarga = time.time()  # también si falla: se reintenta en el próximo período
+        with self._cond:
+            desde = datetime.fromtimestamp(self._procesado_hasta or time.time(), self.tz)
+        recordatorios = self.handler.obtener_recordatorios_activos()
+        with self._cond:
+            self._heap, self._programados = [], {}
+            for rec in recordatorios:
+                self._programar(rec, desde)
+            total = len(self._programados)
+        print(f"[DESPACHO] Compilados {total} recordatorios con próximo disparo")
+
+    # ---------- Hilo ----------
+
+    def iniciar(self):
+        with self._cond:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="despachador-recordatorios")
+        try:
+            self.recompilar()
+        except Exception as e:
+            print(f"[DESPACHO][WARN] Falló la compilación inicial: {e}")
+        self._hilo.start()
+
+    def _siguiente(self) -> Optional[tuple]:
+        """
+        Espera al próximo evento válido del heap, o a que toque recompilar (devuelve None).
+        Los eventos ya vencidos se entregan antes de recompilar.
+        """
+        with self._cond:
+            while True:
+                ahora = time.time()
+                while self._heap:
+                    ts, _, accion, rec_id, disparo_ts = self._heap[0]
+                    programado = self._programados.get(rec_id)
+                    if programado is not None and programado[0] == disparo_ts:
+                        break
+                    heapq.heappop(self._heap)  # reprogramado o desactivado
+                if self._heap and self._heap[0][0] <= ahora:
+                    ts, _, accion, rec_id, disparo_ts = heapq.heappop(self._heap)
+                    return accion, self._programados[rec_id][1], disparo_ts
+                self._procesado_hasta = ahora
+                recarga_ts = self.ultima_recarga + self.recarga_seg
+                if ahora >= recarga_ts:
+                    return None
+                limite = min(self._heap[0][0], recarga_ts) if self._heap else recarga_ts
+                self._cond.wait(timeout=max(limite - ahora, 0.01))
+
+    def _precalentar(self, rec: dict):
+        try:
+            self.reproductor.obtener_audio(rec["audio_url"])
+            self.stats["precalentados"] += 1
+        except Exception as e:
+            self.stats["errores_precalentar"] += 1
+            print(f"[DESPACHO][WARN] No se pudo precalentar el audio de {rec.get('id')}: {e}")
+
+    def _disparar(self, rec: dict, disparo_ts: float):
+        vencido = {
+            "recordatorio_id": rec.get("id"),
+            "quien": rec.get("quien"),
+            "hora": rec.get("hora"),
+            "medicamento": rec.get("medicamento"),
+            "mensaje": rec.get("mensaje"),
+            "audio_url": rec.get("audio_url"),
+            "audio_variantes": rec.get("audio_variantes"),
+            "vence_ts": disparo_ts,
+            "confirmado": False,
+        }
+        with self._cond:
+            self._vencidos.setdefault(rec.get("quien"), deque(maxlen=DESPACHO_VENCIDOS_MAX)).append(vencido)
+            self.stats["disparos"] += 1
+            # Siguiente ocurrencia (a partir del minuto que acaba de sonar)
+            self._programar(rec, datetime.fromtimestamp(disparo_ts, self.tz))
+        print(f"[DESPACHO] Vence {rec.get('hora')} {rec.get('quien')}: {rec.get('medicamento')}")
+        for callback in list(self._suscriptores):
+            try:
+                callback(vencido)
+            except Exception as e:
+                print(f"[DESPACHO][WARN] Suscriptor falló: {e}")
+
+    def _bucle(self):
+        while True:
+            try:
+                siguiente = self._siguiente()
+                if siguiente is None:
+                    self.recompilar()
+                    continue
+                accion, rec, disparo_ts = siguiente
+                if accion == "precalentar":
+                    self._precalentador.submit(self._precalentar, rec)
+                else:
+                    self._disparar(rec, disparo_ts)
+            except Exception as e:
+                print(f"[DESPACHO][WARN] Error en el despachador: {e}")
+                time.sleep(1)
+
+    # ---------- Consultas ----------
+
+    def vencidos(self, quien: str, desde_ts: float = 0.0) -> List[dict]:
+        """Recordatorios de 'quien' que vencieron después de 'desde_ts' (epoch), más viejos primero."""
+        with self._cond:
+            return [dict(v) for v in self._vencidos.get(quien, ()) if v["vence_ts"] > desde_ts]
+
+    def confirmar(self, quien: str, recordatorio_id: str) -> bool:
+        """Marca como confirmado (ack del dispositivo) el último vencimiento del recordatorio."""
+        with self._cond:
+            for v in reversed(self._vencidos.get(quien, ())):
+                if v["recordatorio_id"] == recordatorio_id:
+                    v["confirmado"] = True
+                    return True
+        return False
+
+    def proximos(self, quien: str, limite: int = 10) -> List[dict]:
+        with self._cond:
+            items = sorted(
+                ((ts, rec) for ts, rec in self._programados.values() if rec.get("quien") == quien),
+                key=lambda x: x[0],
+            )
+        return [
+            {"recordatorio_id": rec.get("id"), "hora": rec.get("hora"), "medicamento": rec.get("medicamento"),
+             "proximo": datetime.fromtimestamp(ts, self.tz).isoformat()}
+            for ts, rec in items[:limite]
+        ]
+
+    def estado(self) -> Dict[str, Any]:
+        with self._cond:
+            proximo = min((ts for ts, _ in self._programados.values()), default=None)
+            return {
+                "activo": self._hilo is not None,
+                "programados": len(self._programados),
+                "heap": len(self._heap),
+                "proximo_disparo": datetime.fromtimestamp(proximo, self.tz).isoformat() if proximo else None,
+                "ultima_recarga": self.ultima_recarga or None,
+                **self.stats,
+            }
+
+
+# Instancia global para usar en toda la aplicación
+DESPACHADOR = DespachadorRecordatorios(cosmos_handler, REPRODUCTOR)
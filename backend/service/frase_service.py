@@ -0,0 +1,190 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from service.cosmos_handler import cosmos_handler
+from service.llm_handler import frase_a_dict, frases_a_json
+from utils.audio_cache import AUDIO_CACHE
+from utils.audio_exporter import subir_a_blob, subir_variantes
+from utils.date_calculator import calcular_fechas
+from utils.tts_generator import generar_audio, clave_tts
+
+LOTE_MAX_FRASES = int(os.getenv("LOTE_MAX_FRASES", "50"))
+AUDIO_MAX_WORKERS = int(os.getenv("AUDIO_MAX_WORKERS", "6"))
+
+# Pool para adelantar TTS + Blob mientras el LLM termina de responder
+_AUDIO_POOL = ThreadPoolExecutor(max_workers=AUDIO_MAX_WORKERS, thread_name_prefix="tts")
+
+
+def _url_audio(mensaje: str, nombre_blob: str) -> str | None:
+    """TTS + subida a Blob del mensaje (o la URL ya existente si se subió antes). None si falla el TTS."""
+    #Si el mismo mensaje ya se sintetizó y subió antes, se reutiliza su URL
+    clave = clave_tts(mensaje)
+    url_audio = AUDIO_CACHE.url_subida(clave)
+    if url_audio:
+        return url_audio
+
+    #Generar audio con Azure Text-To-Speech usando tts_generator (stream en memoria, sin WAV en disco)
+    audio_stream = generar_audio(mensaje, stream=True)
+    if audio_stream is None:
+        return None
+
+    #Subir el audio a Azure blob storage a medida que llega de Azure TTS
+    return subir_a_blob(audio_stream, nombre_blob, clave=clave)
+
+
+def _variantes_audio(mensaje: str, nombre_blob: str) -> dict:
+    """
+    Variantes comprimidas del audio (8 kHz u-law, MP3, Opus...) subidas junto al original.
+    Nunca falla el pipeline: si algo sale mal devuelve las que se pudieron generar.
+    """
+    try:
+        # El WAV ya quedó en el caché de disco al sintetizarlo, así que no se vuelve a llamar a Azure
+        return subir_variantes(lambda: generar_audio(mensaje), nombre_blob, clave=clave_tts(mensaje))
+    except Exception as e:
+        print(f"[WARN] No se pudieron generar variantes de audio: {e}")
+        return {}
+
+
+def _audio_completo(mensaje: str, nombre_blob: str) -> tuple:
+    """(url_audio, variantes). url_audio None si falla el TTS; sin URL no se generan variantes."""
+    url_audio = _url_audio(mensaje, nombre_blob)
+    if not url_audio:
+        return None, {}
+    return url_audio, _variantes_audio(mensaje, nombre_blob)
+
+
+def _agregar_fechas(datos_json: dict):
+    #Calcular fechas de los recordatorios con date_calculator
+    fecha_inicio, fecha_fin = calcular_fechas(
+        datos_json["hora"],
+        datos_json["dias"],
+        datos_json["duracion_dias"],
+    )
+    datos_json["fecha_inicio"] = fecha_inicio
+    datos_json["fecha_fin"] = fecha_fin
+
+
+def procesar_frase(frase: str) -> dict:
+    """
+    Pipeline completo de una frase: LLM -> TTS -> Blob -> fechas.
+    El TTS arranca en cuanto el LLM entrega el campo 'mensaje' (sin esperar el resto del JSON).
+    Devuelve el JSON del recordatorio con 'audio_url', 'audio_variantes', 'fecha_inicio' y 'fecha_fin',
+    o un dict con 'error' y 'detalle' si algún paso falla.
+    """
+    adelantado = {}
+
+    def _adelantar_audio(mensaje, audio_filename):
+        nombre_blob = audio_filename or f"{clave_tts(mensaje)[:16]}.wav"
+        adelantado["mensaje"] = mensaje
+        adelantado["futuro"] = _AUDIO_POOL.submit(_audio_completo, mensaje, nombre_blob)
+
+    #Extraer recordatorio con llm_handler (el audio se empieza a generar en paralelo)
+    datos_json = frase_a_dict(frase, on_mensaje=_adelantar_audio)
+    if datos_json.get("error"):
+        print(f"[ERROR] LLM: {datos_json['error']}")
+        return {"error": "ERROR_LLM", "detalle": datos_json["error"]}
+
+    try:
+        if adelantado.get("mensaje") == datos_json["mensaje"]:
+            url_audio, variantes = adelantado["futuro"].result()
+        else:
+            url_audio, variantes = _audio_completo(datos_json["mensaje"], datos_json["audio_filename"])
+    except Exception as e:
+        print(f"[ERROR] Falló la subida a Blob: {e}")
+        return {"error": "ERROR_BLOB", "detalle": "No se pudo subir el audio a Blob Storage."}
+    if not url_audio:
+        return {"error": "ERROR_TTS", "detalle": "No se pudo generar el audio."}
+    datos_json["audio_url"] = url_audio # agregar la URL al JSON
+    if variantes:
+        datos_json["audio_variantes"] = variantes # { 'ulaw8k': url, 'mp3': url, ... }
+
+    _agregar_fechas(datos_json)
+
+    #Para debuggear
+    print("datos_json:", datos_json)
+
+    return datos_json
+
+
+def procesar_frases_lote(frases: list[str], guardar: bool = True) -> dict:
+    """
+    Pipeline para varias frases a la vez:
+      1. LLM: varias frases por prompt (llm_handler.frases_a_json).
+      2. TTS + Blob en paralelo (un solo audio por mensaje repetido dentro del lote),
+         con sus variantes comprimidas.
+      3. Fechas y, si 'guardar', escritura en Cosmos con transactional batch por 'quien'.
+    Devuelve { total, ok, errores, resultados: [ {indice, frase, estado, recordatorio|error} ] }.
+    """
+    resultados = [{"indice": i, "frase": f, "estado": "pendiente"} for i, f in enumerate(frases)]
+    datos: dict[int, dict] = {}
+
+    def _fallo(i, codigo, detalle):
+        resultados[i].update({"estado": "error", "error": codigo, "detalle": detalle})
+        datos.pop(i, None)
+
+    # === Paso 1: LLM ===
+    for i, json_str in enumerate(frases_a_json(frases)):
+        try:
+            if isinstance(json_str, dict):
+                raise ValueError(json_str.get("error"))
+            objeto = json.loads(json_str)
+            if not isinstance(objeto, dict):
+                raise ValueError("El LLM no devolvió un objeto JSON")
+            datos[i] = objeto
+        except Exception as e:
+            _fallo(i, "ERROR_LLM", str(e))
+
+    # === Paso 2: TTS + Blob concurrentes, agrupando mensajes idénticos ===
+    por_mensaje: dict[str, list[int]] = {}
+    for i, d in datos.items():
+        if not d.get("mensaje"):
+            continue
+        por_mensaje.setdefault(d["mensaje"], []).append(i)
+    for i in [i for i, d in datos.items() if not d.get("mensaje")]:
+        _fallo(i, "ERROR_LLM", "El LLM no devolvió 'mensaje'")
+
+    if por_mensaje:
+        with ThreadPoolExecutor(max_workers=min(len(por_mensaje), AUDIO_MAX_WORKERS)) as pool:
+            futuros = {
+                pool.submit(_audio_completo, mensaje, datos[indices[0]].get("audio_filename") or f"recordatorio_{indices[0]}.wav"): indices
+                for mensaje, indices in por_mensaje.items()
+            }
+            for futuro in as_completed(futuros):
+                indices = futuros[futuro]
+                try:
+                    url_audio, variantes = futuro.result()
+                    error = None if url_audio else "No se pudo generar el audio."
+                except Exception as e:
+                    url_audio, variantes, error = None, {}, f"No se pudo subir el audio a Blob Storage: {e}"
+                for i in indices:
+                    if error:
+                        _fallo(i, "ERROR_AUDIO", error)
+                    else:
+                        datos[i]["audio_url"] = url_audio
+                        if variantes:
+                            datos[i]["audio_variantes"] = variantes
+
+    # === Paso 3: Fechas ===
+    for i in list(datos):
+        try:
+            _agregar_fechas(datos[i])
+        except Exception as e:
+            _fallo(i, "ERROR_FECHAS", str(e))
+
+    # === Paso 4: Guardar en Cosmos (batch por partición) ===
+    indices_ok = sorted(datos)
+    if guardar and indices_ok:
+        ids = cosmos_handler.guardar_recordatorios_lote([datos[i] for i in indices_ok])
+        for i, id_doc in zip(indices_ok, ids):
+            if id_doc:
+                datos[i]["id"] = id_doc
+            else:
+                _fallo(i, "ERROR_COSMOS", "No se pudo guardar el recordatorio en CosmosDB.")
+
+    for i, d in datos.items():
+        resultados[i].update({"estado": "ok", "recordatorio": d})
+
+    ok = sum(1 for r in resultados if r["estado"] == "ok")
+    print(f"[LOTE] {ok}/{len(frases)} frases procesadas correctamente")
+    return {"total": len(frases), "ok": ok, "errores": len(frases) - ok, "resultados": resultados}
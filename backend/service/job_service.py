@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "4"))
+JOBS_MAX_PENDIENTES = int(os.getenv("JOBS_MAX_PENDIENTES", "50"))
+JOBS_TTL_SEG = int(os.getenv("JOBS_TTL_SEG", "3600"))  # cuánto se conserva un job terminado
+
+# Estados posibles de un job
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=JOBS_MAX_WORKERS, thread_name_prefix="job")
+_JOBS: Dict[str, Dict[str, Any]] = {}
+_LOCK = threading.Lock()
+_CUPOS = threading.BoundedSemaphore(JOBS_MAX_PENDIENTES)
+_ACTUAL = threading.local()  # job que corre en el hilo actual (para reportar_progreso)
+
+
+class ColaLlenaError(RuntimeError):
+    """No hay cupo para más jobs pendientes."""
+
+
+def _ahora() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _purgar_vencidos():
+    """Elimina jobs terminados hace más de JOBS_TTL_SEG (se llama con _LOCK tomado)."""
+    limite = time.time() - JOBS_TTL_SEG
+    vencidos = [
+        jid for jid, j in _JOBS.items()
+        if j["estado"] in (COMPLETADO, ERROR) and j["_fin_ts"] < limite
+    ]
+    for jid in vencidos:
+        _JOBS.pop(jid, None)
+
+
+def _ejecutar(job_id: str, funcion: Callable[..., Dict[str, Any]], args: tuple, kwargs: dict):
+    with _LOCK:
+        _JOBS[job_id].update({"estado": EN_PROCESO, "iniciado_en": _ahora()})
+    _ACTUAL.job_id = job_id
+    try:
+        resultado = funcion(*args, **kwargs)
+        # Convención del proyecto: los services devuelven dict con 'error' si algo falló
+        estado = ERROR if isinstance(resultado, dict) and resultado.get("error") else COMPLETADO
+        cambios = {"estado": estado, "resultado": resultado}
+        if estado == ERROR:
+            cambios["error"] = resultado.get("error")
+    except Exception as e:
+        print(f"[JOBS][ERROR] job={job_id}: {e}")
+        cambios = {"estado": ERROR, "error": str(e)}
+    finally:
+        _ACTUAL.job_id = None
+        _CUPOS.release()
+
+    with _LOCK:
+        _JOBS[job_id].update({**cambios, "terminado_en": _ahora(), "_fin_ts": time.time()})
+
+
+def enviar_job(tipo: str, funcion: Callable[..., Dict[str, Any]], *args, **kwargs) -> str:
+    """
+    Encola 'funcion(*args, **kwargs)' en el pool acotado y devuelve el job_id.
+    Lanza ColaLlenaError si ya hay JOBS_MAX_PENDIENTES jobs sin terminar.
+    """
+    if not _CUPOS.acquire(blocking=False):
+        raise ColaLlenaError("Demasiados trabajos en cola, intente más tarde")
+
+    job_id = uuid.uuid4().hex
+    with _LOCK:
+        _purgar_vencidos()
+        _JOBS[job_id] = {
+            "job_id": job_id,
+            "tipo": tipo,
+            "estado": PENDIENTE,
+            "creado_en": _ahora(),
+            "resultado": None,
+            "error": None,
+        }
+    try:
+        _EXECUTOR.submit(_ejecutar, job_id, funcion, args, kwargs)
+    except RuntimeError:
+        # El executor está cerrado (apagado del proceso)
+        _CUPOS.release()
+        with _LOCK:
+            _JOBS.pop(job_id, None)
+        raise
+    return job_id
+
+
+def reportar_progreso(hechos: int, total: int):
+    """
+    Actualiza el campo 'progreso' del job que corre en este hilo.
+    Fuera de un job (p.ej. llamada síncrona) no hace nada, así los services lo pueden usar siempre.
+    """
+    job_id = getattr(_ACTUAL, "job_id", None)
+    if not job_id:
+        return
+    with _LOCK:
+        if job_id in _JOBS:
+            _JOBS[job_id]["progreso"] = {"hechos": hechos, "total": total}
+
+
+def obtener_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Devuelve una copia pública del job, o None si no existe (o ya venció)."""
+    with _LOCK:
+        job = _JOBS.get(job_id)
+        if not job:
+            return None
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+def jobs_status() -> Dict[str, Any]:
+    """Resumen de la cola para monitoreo."""
+    with _LOCK:
+        conteo: Dict[str, int] = {}
+        for j in _JOBS.values():
+            conteo[j["estado"]] = conteo.get(j["estado"], 0) + 1
+    return {
+        "max_workers": JOBS_MAX_WORKERS,
+        "max_pendientes": JOBS_MAX_PENDIENTES,
+        "por_estado": conteo,
+    }
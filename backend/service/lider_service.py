@@ -0,0 +1,204 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from azure.cosmos import exceptions
+from azure.core import MatchConditions
+
+try:
+    import fcntl  # Linux / macOS
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt  # Windows
+except ImportError:
+    msvcrt = None
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# "archivo" (lock de archivo, un solo host), "cosmos" (lease en Cosmos, varios hosts) o "ninguno"
+LIDER_MODO = os.getenv("SCHED_LIDER", "archivo").lower()
+LIDER_ARCHIVO = os.getenv("SCHED_LIDER_ARCHIVO", os.path.join(os.path.dirname(__file__), "..", "scheduler.lock"))
+LIDER_LEASE_SEG = int(os.getenv("SCHED_LIDER_LEASE_SEG", "60"))
+# Cada cuánto un seguidor reintenta (y el líder renueva el lease)
+LIDER_REINTENTO_SEG = int(os.getenv("SCHED_LIDER_REINTENTO_SEG", "20"))
+
+LEASE_ID = "lider_scheduler"
+LEASE_PARTICION = "_sistema"
+
+
+def _identidad() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LiderArchivo:
+    """
+    Lock exclusivo y no bloqueante sobre un archivo. Lo suelta el sistema operativo
+    cuando el proceso muere, así que otro worker del mismo host toma el relevo.
+    """
+
+    def __init__(self, ruta: str = LIDER_ARCHIVO):
+        self.ruta = os.path.abspath(ruta)
+        self.identidad = _identidad()
+        self._fd = None
+
+    def intentar(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = open(self.ruta, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                fd.seek(0)
+                msvcrt.locking(fd.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fd.close()
+            return False
+        fd.seek(0)
+        fd.truncate()
+        fd.write(self.identidad)
+        fd.flush()
+        self._fd = fd
+        return True
+
+    def soltar(self):
+        if self._fd is not None:
+            self._fd.close()  # cerrar el descriptor libera el lock
+            self._fd = None
+
+
+class LiderCosmos:
+    """
+    Lease en Cosmos DB: documento {id: 'lider_scheduler', quien: '_sistema', duenio, expira}.
+    Se toma si no existe o ya venció y se renueva con concurrencia optimista (ETag),
+    así dos procesos nunca creen tenerlo a la vez.
+    'handler' es cosmos_handler (o cualquier objeto con .container); se usa recién al postularse.
+    """
+
+    def __init__(self, handler, lease_seg: int = LIDER_LEASE_SEG):
+        self.handler = handler
+        self.lease_seg = lease_seg
+        self.identidad = _identidad()
+
+    def _doc(self) -> dict:
+        return {
+            "id": LEASE_ID,
+            "quien": LEASE_PARTICION,
+            "tipo": "lease",
+            "duenio": self.identidad,
+            "expira": time.time() + self.lease_seg,
+            "renovado_en": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def intentar(self) -> bool:
+        try:
+            actual = self.handler.container.read_item(item=LEASE_ID, partition_key=LEASE_PARTICION)
+        except exceptions.CosmosResourceNotFoundError:
+            try:
+                self.handler.container.create_item(body=self._doc())
+                return True
+            except exceptions.CosmosResourceExistsError:
+                return False
+        if actual.get("duenio") != self.identidad and actual.get("expira", 0) > time.time():
+            return False
+        try:
+            self.handler.container.replace_item(
+                item=LEASE_ID, body=self._doc(),
+                etag=actual.get("_etag"), match_condition=MatchConditions.IfNotModified,
+            )
+            return True
+        except exceptions.CosmosHttpResponseError as e:
+            # 412: otro proceso lo tomó/renovó entre la lectura y el reemplazo
+            if e.status_code != 412:
+                print(f"[LIDER][WARN] Error renovando lease: {e}")
+            return False
+
+    def soltar(self):
+        try:
+            actual = self.handler.container.read_item(item=LEASE_ID, partition_key=LEASE_PARTICION)
+            if actual.get("duenio") == self.identidad:
+                self.handler.container.delete_item(item=LEASE_ID, partition_key=LEASE_PARTICION)
+        except exceptions.CosmosHttpResponseError:
+            pass
+
+
+class SinEleccion:
+    """Todos los procesos son líderes (despliegue de un solo proceso)."""
+
+    identidad = _identidad()
+
+    def intentar(self) -> bool:
+        return True
+
+    def soltar(self):
+        pass
+
+
+class EleccionLider:
+    """
+    Mantiene la candidatura en un hilo: cada LIDER_REINTENTO_SEG el seguidor intenta
+    tomar el liderazgo y el líder lo renueva. Llama a al_ganar() / al_perder() en cada cambio.
+    """
+
+    def __init__(self, estrategia, reintento_seg: int = LIDER_REINTENTO_SEG):
+        self.estrategia = estrategia
+        self.reintento_seg = reintento_seg
+        self.es_lider = False
+        self.desde: Optional[str] = None
+        self._al_ganar: Optional[Callable[[], None]] = None
+        self._al_perder: Optional[Callable[[], None]] = None
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self, al_ganar: Callable[[], None], al_perder: Callable[[], None]):
+        if self._hilo is not None:
+            return
+        self._al_ganar, self._al_perder = al_ganar, al_perder
+        self._ciclo()  # primer intento sincrónico: el líder arranca sin esperar
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="eleccion-lider")
+        self._hilo.start()
+
+    def _ciclo(self):
+        try:
+            ganado = self.estrategia.intentar()
+        except Exception as e:
+            print(f"[LIDER][WARN] Error en la elección: {e}")
+            ganado = False
+        if ganado and not self.es_lider:
+            self.es_lider, self.desde = True, datetime.now(timezone.utc).isoformat()
+            print(f"[LIDER] Este proceso es el líder del scheduler ({self.estrategia.identidad})")
+            self._al_ganar()
+        elif not ganado and self.es_lider:
+            self.es_lider, self.desde = False, None
+            print("[LIDER][WARN] Se perdió el liderazgo; el scheduler queda en pausa")
+            self._al_perder()
+
+    def _bucle(self):
+        while not self._detener.wait(self.reintento_seg):
+            self._ciclo()
+
+    def detener(self):
+        self._detener.set()
+        if self.es_lider:
+            self.estrategia.soltar()
+            self.es_lider = False
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "modo": LIDER_MODO,
+            "es_lider": self.es_lider,
+            "identidad": self.estrategia.identidad,
+            "desde": self.desde,
+        }
+
+
+def crear_eleccion(handler=None) -> EleccionLider:
+    if LIDER_MODO == "cosmos":
+        return EleccionLider(LiderCosmos(handler))
+    if LIDER_MODO == "ninguno":
+        return EleccionLider(SinEleccion())
+    return EleccionLider(LiderArchivo())
@@ -1,9 +1,12 @@
-from config.config import OPENAI_API_KEY
-from openai import OpenAI
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-client = OpenAI(
-    api_key=OPENAI_API_KEY
-)
+from utils.client_registry import obtener_openai
+from utils.frase_cache import FRASE_CACHE
+from utils.frase_parser import parsear_frase
 
 PROMPT_INICIAL = """
 Actuá como un sistema que convierte frases en lenguaje natural en recordatorios de medicamentos estructurados.
@@ -61,19 +64,291 @@ Salida:
 
 
 
-def frase_a_json(frase):
+# Versión recortada del prompt (menos tokens de entrada) para el modo estructurado.
+# 'audio_filename' va antes de 'mensaje' para tener ambos cuando el mensaje termina de llegar.
+PROMPT_COMPACTO = """
+Convertí la frase en un recordatorio de medicamento. Respondé SOLO un objeto JSON con estas claves, en este orden:
+quien (persona, tal como aparece), hora ("HH:MM" 24h), medicamento (nombre corto, minúscula),
+audio_filename ("medicamento_hhmm.wav"), mensaje (para el adulto mayor, hora en palabras, p.ej. "Olga, son las ocho. Hora de tomar ibuprofeno."),
+frecuencia (texto del usuario, p.ej. "cada 12 horas"; si no dice, "una vez al día"),
+dias (lista en minúscula, p.ej. ["lunes","viernes"], o ["todos"] si es diario o no se indica),
+duracion_dias (entero; "durante X días" => X; si no hay duración, 0).
+"""
+
+CAMPOS_OBLIGATORIOS = ("quien", "hora", "medicamento", "audio_filename", "mensaje", "frecuencia", "dias", "duracion_dias")
+
+ESQUEMA_RECORDATORIO = {
+    "type": "object",
+    "properties": {
+        "quien": {"type": "string"},
+        "hora": {"type": "string"},
+        "medicamento": {"type": "string"},
+        "audio_filename": {"type": "string"},
+        "mensaje": {"type": "string"},
+        "frecuencia": {"type": "string"},
+        "dias": {"type": "array", "items": {"type": "string"}},
+        "duracion_dias": {"type": "integer"},
+    },
+    "required": list(CAMPOS_OBLIGATORIOS),
+    "additionalProperties": False,
+}
+
+PROMPT_LOTE = """
+Vas a recibir VARIAS frases numeradas (1., 2., 3., ...), una por línea.
+Aplicá a cada frase exactamente las mismas reglas anteriores y devolvé SOLO un arreglo JSON
+con un objeto por frase, en el mismo orden y con la misma cantidad de elementos que frases recibidas.
+"""
+
+# Cantidad de frases que se envían juntas en un mismo prompt
+FRASES_POR_PROMPT = int(os.getenv("LLM_FRASES_POR_PROMPT", "8"))
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "4"))
+
+# Modelo y modo de extracción:
+#   - "estructurado": prompt compacto + salida JSON forzada + streaming (permite adelantar el TTS)
+#   - "clasico": prompt original con ejemplos, respuesta completa
+LLM_MODELO = os.getenv("LLM_MODELO", "gpt-3.5-turbo")
+LLM_MODO = os.getenv("LLM_MODO", "estructurado")
+# "json_object" funciona con gpt-3.5-turbo; "json_schema" requiere modelos con structured outputs (p.ej. gpt-4o-mini)
+LLM_FORMATO_SALIDA = os.getenv("LLM_FORMATO_SALIDA", "json_object")
+
+# Confianza mínima del parser por reglas para no llamar al LLM
+PARSER_UMBRAL = float(os.getenv("PARSER_UMBRAL", "0.85"))
+PARSER_STATS = {"reglas": 0, "llm": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _completar(sistema, usuario):
+    response = obtener_openai().chat.completions.create(
+        model=LLM_MODELO,
+        temperature=0.2, #determina que tan creativo o arriesgado es el modelo al generar texto. 0.2 corresponde a poco aleatorio, responde de manera confiable y controlada
+        messages=[
+        {"role": "system", "content": sistema},
+        {"role": "user", "content": usuario},
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
+
+def extraer_json(texto):
+    """
+    Extrae el primer objeto/arreglo JSON de 'texto' aunque el modelo lo envuelva en prosa
+    o en bloques ```json. Devuelve el objeto Python o None si no hay JSON válido.
+    """
+    if not isinstance(texto, str):
+        return None
+    decoder = json.JSONDecoder()
+    for i, c in enumerate(texto):
+        if c not in "{[":
+            continue
+        try:
+            obj, _ = decoder.raw_decode(texto[i:])
+            return obj
+        except ValueError:
+            continue
+    return None
+
+
+def _validar(datos):
+    """Devuelve el dict si tiene los campos obligatorios; si no, un dict con 'error'."""
+    if not isinstance(datos, dict):
+        return {"error": "El LLM no devolvió un objeto JSON"}
+    faltantes = [c for c in CAMPOS_OBLIGATORIOS if c not in datos]
+    if faltantes:
+        return {"error": f"Faltan campos en la respuesta del LLM: {', '.join(faltantes)}"}
+    return datos
+
+
+def _campo_completo(buffer, campo):
+    """Valor de un campo string del JSON parcial si ya llegó completo (comilla de cierre incluida)."""
+    m = re.search(r'"' + campo + r'"\s*:\s*"((?:[^"\\]|\\.)*)"', buffer)
+    if not m:
+        return None
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            temperature=0.2, #determina que tan creativo o arriesgado es el modelo al generar texto. 0.2 corresponde a poco aleatorio, responde de manera confiable y controlada
-            messages=[
-            {"role": "system", "content": PROMPT_INICIAL},
+        return json.loads('"' + m.group(1) + '"')
+    except ValueError:
+        return None
+
+
+def _formato_respuesta():
+    if LLM_FORMATO_SALIDA == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "recordatorio", "strict": True, "schema": ESQUEMA_RECORDATORIO},
+        }
+    return {"type": "json_object"}
+
+
+def _stream_estructurado(frase, on_mensaje=None):
+    """
+    Llama al LLM con salida JSON forzada y en streaming. Apenas el campo 'mensaje' llega
+    completo se llama on_mensaje(mensaje, audio_filename) para adelantar el TTS.
+    """
+    stream = obtener_openai().chat.completions.create(
+        model=LLM_MODELO,
+        temperature=0.2,
+        response_format=_formato_respuesta(),
+        stream=True,
+        messages=[
+            {"role": "system", "content": PROMPT_COMPACTO},
             {"role": "user", "content": frase},
-            ]
-        )
-        contenido = response.choices[0].message.content.strip()
-        return contenido
+        ],
+    )
+    buffer = ""
+    avisado = on_mensaje is None
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        buffer += chunk.choices[0].delta.content or ""
+        if not avisado:
+            mensaje = _campo_completo(buffer, "mensaje")
+            if mensaje:
+                avisado = True
+                try:
+                    on_mensaje(mensaje, _campo_completo(buffer, "audio_filename"))
+                except Exception as ex:
+                    print(f"[LLM][WARN] on_mensaje falló: {ex}")
+    return extraer_json(buffer)
+
+
+def _frase_a_dict_llm(frase, on_mensaje=None):
+    try:
+        if LLM_MODO == "estructurado":
+            datos = _stream_estructurado(frase, on_mensaje)
+        else:
+            datos = extraer_json(_completar(PROMPT_INICIAL, frase))
+        return _validar(datos)
     except Exception as ex:
         return {"error": str(ex)}
 
 
+def _frase_a_json_llm(frase):
+    datos = _frase_a_dict_llm(frase)
+    if datos.get("error"):
+        return datos
+    return json.dumps(datos, ensure_ascii=False)
+
+
+def _frase_por_reglas(frase):
+    """JSON del parser por reglas si su confianza alcanza PARSER_UMBRAL; si no, None."""
+    try:
+        datos, confianza = parsear_frase(frase)
+    except Exception as ex:
+        print(f"[PARSER][WARN] Error parseando '{frase}': {ex}")
+        datos, confianza = None, 0.0
+    usar = datos is not None and confianza >= PARSER_UMBRAL
+    with _STATS_LOCK:
+        PARSER_STATS["reglas" if usar else "llm"] += 1
+    if not usar:
+        print(f"[PARSER] confianza={confianza} < {PARSER_UMBRAL}; se usa el LLM")
+        return None
+    print(f"[PARSER] Frase resuelta por reglas (confianza={confianza})")
+    return json.dumps(datos, ensure_ascii=False)
+
+
+def frase_a_dict(frase, on_mensaje=None):
+    """
+    Convierte la frase en el dict del recordatorio: primero busca en el caché de frases
+    (normalizadas), luego prueba el parser por reglas y, si no alcanza, llama al LLM.
+    Si se pasa on_mensaje(mensaje, audio_filename), se llama en cuanto el mensaje está
+    disponible (en modo estructurado, antes de que el LLM termine de responder).
+    Nunca lanza excepción: si algo falla devuelve {"error": "..."}.
+    El JSON cacheado no incluye fecha_inicio/fecha_fin (se recalculan con date_calculator).
+    """
+    cacheado = FRASE_CACHE.get(frase)
+    if cacheado is not None:
+        print("[FRASE_CACHE] Frase resuelta desde caché")
+        datos = json.loads(cacheado)
+    else:
+        rapido = _frase_por_reglas(frase)
+        if rapido:
+            datos = json.loads(rapido)
+        else:
+            datos = _frase_a_dict_llm(frase, on_mensaje)
+            if datos.get("error"):
+                return datos
+            FRASE_CACHE.set(frase, json.dumps(datos, ensure_ascii=False))
+            return datos
+        FRASE_CACHE.set(frase, rapido)
+
+    if on_mensaje is not None:
+        try:
+            on_mensaje(datos["mensaje"], datos.get("audio_filename"))
+        except Exception as ex:
+            print(f"[LLM][WARN] on_mensaje falló: {ex}")
+    return datos
+
+
+def frase_a_json(frase):
+    """Igual que frase_a_dict pero devuelve el JSON como str (o un dict con 'error')."""
+    datos = frase_a_dict(frase)
+    if datos.get("error"):
+        return datos
+    return json.dumps(datos, ensure_ascii=False)
+
+
+def parser_status():
+    """Tasa de frases resueltas por reglas (sin llamar al LLM)."""
+    with _STATS_LOCK:
+        reglas, llm = PARSER_STATS["reglas"], PARSER_STATS["llm"]
+    total = reglas + llm
+    return {
+        "umbral": PARSER_UMBRAL,
+        "reglas": reglas,
+        "llm": llm,
+        "tasa_reglas": round(reglas / total, 3) if total else None,
+    }
+
+
+def _grupo_a_json(frases):
+    """Un solo llamado al LLM para varias frases; si la respuesta no cuadra, cae a una por una."""
+    if len(frases) == 1:
+        return [_frase_a_json_llm(frases[0])]
+    usuario = "\n".join(f"{i}. {f}" for i, f in enumerate(frases, start=1))
+    try:
+        contenido = _completar(PROMPT_INICIAL + PROMPT_LOTE, usuario)
+        objetos = extraer_json(contenido)
+        if isinstance(objetos, list) and len(objetos) == len(frases):
+            # Cada objeto se valida como en el camino de a una; los que no pasan se reintentan solos
+            resultados = []
+            for frase, objeto in zip(frases, objetos):
+                datos = _validar(objeto)
+                if datos.get("error"):
+                    print(f"[LLM][WARN] Objeto del lote inválido ({datos['error']}); se reintenta la frase sola")
+                    resultados.append(_frase_a_json_llm(frase))
+                else:
+                    resultados.append(json.dumps(datos, ensure_ascii=False))
+            return resultados
+        print(f"[LLM][WARN] Lote devolvió {len(objetos) if isinstance(objetos, list) else '?'} "
+              f"objetos para {len(frases)} frases; procesando una por una")
+    except Exception as ex:
+        print(f"[LLM][WARN] Falló el lote de {len(frases)} frases ({ex}); procesando una por una")
+    return [_frase_a_json_llm(f) for f in frases]
+
+
+def frases_a_json(frases):
+    """
+    Igual que frase_a_json pero para una lista de frases: las que el parser por reglas
+    (ni el caché) resuelve se agrupan de a FRASES_POR_PROMPT por llamado al LLM.
+    Devuelve una lista alineada con 'frases' (str JSON o dict con 'error').
+    """
+    resultados = []
+    for frase in frases:
+        js = FRASE_CACHE.get(frase)
+        if js is None:
+            js = _frase_por_reglas(frase)
+            if js is not None:
+                FRASE_CACHE.set(frase, js)  # como en frase_a_dict: la próxima vez ni se parsea
+        resultados.append(js)
+    pendientes = [i for i, r in enumerate(resultados) if r is None]
+    grupos = [pendientes[i:i + FRASES_POR_PROMPT] for i in range(0, len(pendientes), FRASES_POR_PROMPT)]
+    if not grupos:
+        return resultados
+    # Los grupos se envían en paralelo; map conserva el orden
+    with ThreadPoolExecutor(max_workers=min(len(grupos), LLM_MAX_WORKERS)) as pool:
+        respuestas = pool.map(lambda g: _grupo_a_json([frases[i] for i in g]), grupos)
+        for grupo, jsons in zip(grupos, respuestas):
+            for i, js in zip(grupo, jsons):
+                resultados[i] = js
+                if isinstance(js, str):  # solo JSON ya validado (_grupo_a_json); los errores son dict
+                    FRASE_CACHE.set(frases[i], js)
+    return resultados
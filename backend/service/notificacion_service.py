@@ -0,0 +1,230 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from service.cosmos_handler import cosmos_handler
+from service.twilio_handler import enviar_sms
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# Pulsaciones del mismo botón (misma persona) dentro de esta ventana se agrupan en un solo SMS
+SMS_VENTANA_SEG = int(os.getenv("SMS_VENTANA_SEG", "120"))
+SMS_REINTENTOS = int(os.getenv("SMS_REINTENTOS", "4"))
+SMS_BACKOFF_SEG = float(os.getenv("SMS_BACKOFF_SEG", "2"))
+SMS_BACKOFF_MAX_SEG = float(os.getenv("SMS_BACKOFF_MAX_SEG", "60"))
+SMS_COLA_MAX = int(os.getenv("SMS_COLA_MAX", "200"))
+
+EMERGENCIA = "EMERGENCIA"
+
+MENSAJES_BOTON = {
+    "EMERGENCIA": "🚨 EMERGENCIA MÉDICA\n{quien} presionó el botón rojo\nVerificar inmediatamente",
+    "TRISTEZA": "💙 ALERTA EMOCIONAL\n{quien} presionó el botón azul\nNecesita compañía",
+    "HAMBRE": "🍽️ SOLICITUD DE COMIDA\n{quien} presionó el botón amarillo\nTiene hambre",
+}
+
+
+class ColaNotificacionesLlena(RuntimeError):
+    """No hay cupo para más notificaciones pendientes."""
+
+
+def mensaje_boton(tipo: str, quien: str, veces: int = 1) -> Optional[str]:
+    plantilla = MENSAJES_BOTON.get(tipo)
+    if plantilla is None:
+        return None
+    mensaje = plantilla.format(quien=quien)
+    if veces > 1:
+        mensaje += f"\n(presionado {veces} veces)"
+    return mensaje
+
+
+class NotificadorBotones:
+    """
+    Cola de SMS de los botones del ESP32, atendida por un solo hilo en segundo plano.
+    - El SMS sale primero; después cada pulsación queda registrada en Cosmos (guardar_evento_boton)
+      y se marca procesada (marcar_evento_procesado). Si Cosmos falla, el SMS igual se envía.
+    - Las pulsaciones de un mismo (quien, tipo) se agrupan: si hay un SMS pendiente se suman a él;
+      si ya se envió uno hace menos de SMS_VENTANA_SEG, solo se registran.
+      Las emergencias no se agrupan nunca y pasan antes que el resto.
+    - Un envío fallido se reintenta con backoff exponencial (SMS_REINTENTOS veces); si se agotan,
+      los eventos quedan con procesado=false (ver obtener_eventos_pendientes).
+    """
+
+    def __init__(self, handler, enviar: Callable[[str], bool] = enviar_sms,
+                 ventana_seg: int = SMS_VENTANA_SEG, reintentos: int = SMS_REINTENTOS,
+                 backoff_seg: float = SMS_BACKOFF_SEG, max_cola: int = SMS_COLA_MAX):
+        self.handler = handler
+        self.enviar = enviar
+        self.ventana_seg = ventana_seg
+        self.reintentos = reintentos
+        self.backoff_seg = backoff_seg
+        self.max_cola = max_cola
+        self._heap: List[tuple] = []                  # (listo_ts, nivel, secuencia, item)
+        self._pendientes: Dict[tuple, dict] = {}      # (quien, tipo) -> SMS aún no enviado
+        self._ultimo_envio: Dict[tuple, float] = {}   # (quien, tipo) -> ts del último SMS enviado
+        self._secuencia = itertools.count()
+        self._cond = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self.stats = {"eventos": 0, "agrupados": 0, "enviados": 0, "reintentos": 0, "fallidos": 0,
+                      "errores_registro": 0}
+
+    # ---------- Encolar ----------
+
+    def notificar(self, tipo: str, quien: str) -> Dict[str, Any]:
+        """
+        Registra la pulsación y programa su SMS. No bloquea: Cosmos y Twilio se llaman desde el hilo.
+        Devuelve { estado: encolado|agrupado, profundidad }. Lanza ColaNotificacionesLlena si no hay cupo
+        (las emergencias se aceptan siempre).
+        """
+        if tipo not in MENSAJES_BOTON:
+            raise ValueError(f"Tipo de botón desconocido: {tipo}")
+        clave = (quien, tipo)
+        evento = {"id": None, "ts": time.time()}
+        ahora = evento["ts"]
+        with self._cond:
+            self.stats["eventos"] += 1
+            if tipo != EMERGENCIA:
+                pendiente = self._pendientes.get(clave)
+                if pendiente is not None:
+                    pendiente["eventos"].append(evento)
+                    self.stats["agrupados"] += 1
+                    return {"estado": "agrupado", "profundidad": len(self._heap)}
+                if ahora - self._ultimo_envio.get(clave, 0.0) < self.ventana_seg:
+                    # Ya se avisó hace poco: solo queda el registro en Cosmos
+                    self._programar({"clave": clave, "tipo": tipo, "quien": quien, "eventos": [evento],
+                                     "intentos": 0, "solo_registro": True}, ahora)
+                    self.stats["agrupados"] += 1
+                    return {"estado": "agrupado", "profundidad": len(self._heap)}
+            if tipo != EMERGENCIA and len(self._heap) >= self.max_cola:
+                raise ColaNotificacionesLlena("Demasiadas notificaciones en cola, intente más tarde")
+            item = {"clave": clave, "tipo": tipo, "quien": quien, "eventos": [evento],
+                    "intentos": 0, "solo_registro": False}
+            if tipo != EMERGENCIA:
+                self._pendientes[clave] = item
+            self._programar(item, ahora)
+            profundidad = len(self._heap)
+        self._asegurar_hilo()
+        return {"estado": "encolado", "profundidad": profundidad}
+
+    def _programar(self, item: dict, listo_ts: float):
+        """Requiere self._cond tomado."""
+        nivel = 0 if item["tipo"] == EMERGENCIA else 1
+        heapq.heappush(self._heap, (listo_ts, nivel, next(self._secuencia), item))
+        self._cond.notify()
+
+    def _asegurar_hilo(self):
+        with self._cond:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="notificador-sms")
+                self._hilo.start()
+
+    # ---------- Hilo ----------
+
+    def _siguiente(self) -> dict:
+        """Espera al próximo item listo; entre los listos, las emergencias primero."""
+        with self._cond:
+            while True:
+                ahora = time.time()
+                listos = [e for e in self._heap if e[0] <= ahora]
+                if listos:
+                    entrada = min(listos, key=lambda e: (e[1], e[0], e[2]))
+                    self._heap.remove(entrada)
+                    heapq.heapify(self._heap)
+                    return entrada[3]
+                self._cond.wait(timeout=(self._heap[0][0] - ahora) if self._heap else None)
+
+    def _registrar_eventos(self, item: dict, eventos: List[dict]):
+        """Guarda en Cosmos las pulsaciones que aún no tienen id. Un error de Cosmos no frena el SMS."""
+        for evento in eventos:
+            if evento["id"] is None:
+                try:
+                    evento["id"] = self.handler.guardar_evento_boton(item["tipo"], item["quien"])
+                except Exception as e:
+                    self.stats["errores_registro"] += 1
+                    print(f"[SMS][WARN] No se pudo registrar el evento en Cosmos ({item['tipo']}, {item['quien']}): {e}")
+
+    def _marcar_procesados(self, item: dict, eventos: List[dict]):
+        for evento in eventos:
+            if evento["id"]:
+                try:
+                    self.handler.marcar_evento_procesado(evento["id"], item["quien"])
+                except Exception as e:
+                    self.stats["errores_registro"] += 1
+                    print(f"[SMS][WARN] No se pudo marcar el evento {evento['id']} como procesado: {e}")
+
+    def _soltar(self, item: dict):
+        """Requiere self._cond tomado. Las próximas pulsaciones de la clave ya no se suman a este item."""
+        if self._pendientes.get(item["clave"]) is item:
+            del self._pendientes[item["clave"]]
+
+    def _procesar(self, item: dict):
+        if item["solo_registro"]:
+            self._registrar_eventos(item, item["eventos"])
+            self._marcar_procesados(item, item["eventos"])
+            return
+
+        reintento = False
+        try:
+            with self._cond:
+                veces = len(item["eventos"])
+            # El SMS sale primero: el registro en Cosmos se hace después y nunca lo bloquea
+            try:
+                exito = bool(self.enviar(mensaje_boton(item["tipo"], item["quien"], veces)))
+            except Exception as e:
+                print(f"[SMS][WARN] Error enviando SMS ({item['tipo']}, {item['quien']}): {e}")
+                exito = False
+            with self._cond:
+                if exito:
+                    self.stats["enviados"] += 1
+                    self._ultimo_envio[item["clave"]] = time.time()
+                else:
+                    item["intentos"] += 1
+                    if item["intentos"] <= self.reintentos:
+                        espera = min(self.backoff_seg * 2 ** (item["intentos"] - 1), SMS_BACKOFF_MAX_SEG)
+                        self.stats["reintentos"] += 1
+                        print(f"[SMS][WARN] Falló el envío ({item['tipo']}, {item['quien']}); "
+                              f"reintento {item['intentos']}/{self.reintentos} en {espera:.0f}s")
+                        self._programar(item, time.time() + espera)
+                        reintento = True
+                    else:
+                        self.stats["fallidos"] += 1
+                        print(f"[SMS][WARN] Se agotaron los reintentos ({item['tipo']}, {item['quien']}); "
+                              f"{len(item['eventos'])} evento(s) quedan sin procesar")
+                if not reintento:
+                    self._soltar(item)
+                # Incluye las pulsaciones que llegaron mientras se enviaba (quedan cubiertas por este SMS)
+                eventos = list(item["eventos"])
+            self._registrar_eventos(item, eventos)
+            if exito:
+                self._marcar_procesados(item, eventos)
+        finally:
+            if not reintento:
+                with self._cond:
+                    self._soltar(item)
+
+    def _bucle(self):
+        while True:
+            item = self._siguiente()
+            try:
+                self._procesar(item)
+            except Exception as e:
+                self.stats["fallidos"] += 1
+                print(f"[SMS][WARN] Error procesando notificación: {e}")
+
+    def estado(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "profundidad": len(self._heap),
+                "max_cola": self.max_cola,
+                "pendientes": [
+                    {"quien": i["quien"], "tipo": i["tipo"], "eventos": len(i["eventos"]), "intentos": i["intentos"]}
+                    for _, _, _, i in sorted(self._heap) if not i["solo_registro"]
+                ],
+                "ventana_seg": self.ventana_seg,
+                **self.stats,
+            }
+
+
+# Instancia global para usar en toda la aplicación
+NOTIFICADOR = NotificadorBotones(cosmos_handler)
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional
+
+from service.cosmos_handler import cosmos_handler
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# Cada cuánto se recarga el índice completo desde Cosmos (cubre escrituras de otros procesos)
+INDICE_REFRESH_SEG = int(os.getenv("INDICE_REFRESH_SEG", "300"))
+
+
+def minuto_del_dia(hhmm: str) -> Optional[int]:
+    """'HH:MM' -> minutos desde medianoche (0..1439). None si el formato no es válido."""
+    try:
+        hora, minuto = str(hhmm).split(":")[:2]
+        valor = int(hora) * 60 + int(minuto)
+    except (TypeError, ValueError):
+        return None
+    return valor if 0 <= valor < 24 * 60 else None
+
+
+def _prioridad(rec: dict):
+    return (rec.get("prioridad", 0), rec.get("fecha_creacion", ""))
+
+
+def aplica_en_fecha(rec: dict, fecha_str: str) -> bool:
+    """True si el recordatorio está activo y 'fecha_str' (YYYY-MM-DD) cae en su rango de fechas."""
+    if not rec.get("activo", True):
+        return False
+    fi = rec.get("fecha_inicio")
+    ff = rec.get("fecha_fin")
+    if fi and fecha_str < fi:
+        return False
+    if ff not in (None, 0) and fecha_str > ff:
+        return False
+    return True
+
+
+class _IndicePersona:
+    """Recordatorios activos de una persona agrupados por minuto del día."""
+
+    def __init__(self):
+        self.minutos: List[int] = []               # minutos con al menos un recordatorio (ordenados)
+        self.buckets: Dict[int, List[dict]] = {}   # minuto -> recordatorios (mejor prioridad primero)
+
+    def agregar(self, minuto: int, rec: dict):
+        bucket = self.buckets.get(minuto)
+        if bucket is None:
+            bucket = self.buckets[minuto] = []
+            insort(self.minutos, minuto)
+        bucket.append(rec)
+        bucket.sort(key=_prioridad, reverse=True)
+
+    def quitar(self, minuto: int, rec_id: str):
+        bucket = self.buckets.get(minuto)
+        if not bucket:
+            return
+        bucket[:] = [r for r in bucket if r.get("id") != rec_id]
+        if not bucket:
+            del self.buckets[minuto]
+            i = bisect_left(self.minutos, minuto)
+            if i < len(self.minutos) and self.minutos[i] == minuto:
+                self.minutos.pop(i)
+
+
+class IndiceRecordatorios:
+    """
+    Índice en memoria de recordatorios activos: quien -> minuto del día -> recordatorios.
+    - Se mantiene al día con las escrituras de cosmos_handler (suscripción) y con una
+      recarga completa cada INDICE_REFRESH_SEG segundos en un hilo de fondo.
+    - Una persona que todavía no está en el índice se carga una vez desde su partición.
+    Las búsquedas por hora y la agenda del resto del día no consultan Cosmos.
+    """
+
+    def __init__(self, handler, refresh_seg: int = INDICE_REFRESH_SEG):
+        self.handler = handler
+        self.refresh_seg = refresh_seg
+        self._personas: Dict[str, _IndicePersona] = {}
+        self._ubicacion: Dict[str, tuple] = {}  # id -> (quien, minuto)
+        self._lock = threading.RLock()
+        self._recargas_en_curso = 0
+        self._cambios_en_recarga: List[tuple] = []  # (evento, documento) mientras corre una recarga
+        self._hilo: Optional[threading.Thread] = None
+        self.ultima_carga = 0.0
+        self.cargas_persona = 0
+        self.consultas = 0
+        handler.suscribir(self._on_cambio)
+
+    # ---------- Mantenimiento ----------
+
+    def _agregar(self, rec: dict):
+        quien, rec_id = rec.get("quien"), rec.get("id")
+        minuto = minuto_del_dia(rec.get("hora"))
+        if not quien or not rec_id or minuto is None:
+            return
+        self._quitar(rec_id)
+        if not rec.get("activo", True) or rec.get("tipo", "recordatorio") != "recordatorio":
+            return
+        self._personas.setdefault(quien, _IndicePersona()).agregar(minuto, rec)
+        self._ubicacion[rec_id] = (quien, minuto)
+
+    def _quitar(self, rec_id: str):
+        ubicacion = self._ubicacion.pop(rec_id, None)
+        if ubicacion:
+            quien, minuto = ubicacion
+            self._personas[quien].quitar(minuto, rec_id)
+
+    def _on_cambio(self, evento: str, documento: dict):
+        """Callback de cosmos_handler: 'guardado' agrega/actualiza, 'desactivado' quita."""
+        with self._lock:
+            if self._recargas_en_curso:
+                # La consulta de la recarga pudo leer antes de este cambio: se reaplica al final
+                self._cambios_en_recarga.append((evento, documento))
+            if evento == "desactivado":
+                self._quitar(documento.get("id"))
+            elif documento.get("quien") in self._personas:
+                self._agregar(documento)
+
+    def recargar(self):
+        """
+        Reconstruye el índice completo con los recordatorios activos de Cosmos.
+        La consulta corre sin el lock; los cambios que llegan mientras tanto se reaplican
+        sobre el índice nuevo para que el snapshot no los pise.
+        """
+        with self._lock:
+            self._recargas_en_curso += 1
+            inicio = len(self._cambios_en_recarga)
+        try:
+            recordatorios = self.handler.obtener_recordatorios_activos()
+            personas: Dict[str, _IndicePersona] = {}
+            ubicacion: Dict[str, tuple] = {}
+            for rec in recordatorios:
+                quien, rec_id = rec.get("quien"), rec.get("id")
+                minuto = minuto_del_dia(rec.get("hora"))
+                if quien and rec_id and minuto is not None:
+                    personas.setdefault(quien, _IndicePersona()).agregar(minuto, rec)
+                    ubicacion[rec_id] = (quien, minuto)
+            with self._lock:
+                # Las personas sin recordatorios activos quedan cargadas (vacías) para no consultar Cosmos
+                for quien in self._personas:
+                    personas.setdefault(quien, _IndicePersona())
+                self._personas, self._ubicacion = personas, ubicacion
+                for evento, documento in self._cambios_en_recarga[inicio:]:
+                    if evento == "desactivado":
+                        self._quitar(documento.get("id"))
+                    else:
+                        self._agregar(documento)
+                self.ultima_carga = time.time()
+        finally:
+            with self._lock:
+                self._recargas_en_curso -= 1
+                if not self._recargas_en_curso:
+                    self._cambios_en_recarga.clear()
+        print(f"[INDICE] Recargado: {len(self._ubicacion)} recordatorios de {len(self._personas)} personas")
+
+    def _bucle_refresh(self):
+        while True:
+            time.sleep(self.refresh_seg)
+            try:
+                self.recargar()
+            except Exception as e:
+                print(f"[INDICE][WARN] Falló la recarga periódica: {e}")
+
+    def _asegurar_persona(self, quien: str) -> _IndicePersona:
+        if self._hilo is None:
+            with self._lock:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._bucle_refresh, daemon=True, name="indice-recordatorios")
+                    self._hilo.start()
+        with self._lock:
+            persona = self._personas.get(quien)
+        if persona is not None:
+            return persona
+
+        recordatorios = self.handler.obtener_recordatorios_por_persona(quien)
+        with self._lock:
+            if quien not in self._personas:
+                self._personas[quien] = _IndicePersona()
+                for rec in recordatorios:
+                    self._agregar(rec)
+                self.cargas_persona += 1
+            return self._personas[quien]
+
+    # ---------- Consultas ----------
+
+    def en_hora(self, quien: str, hhmm: str) -> Optional[dict]:
+        """Recordatorio de mayor prioridad de 'quien' exactamente a la hora 'hhmm', o None."""
+        minuto = minuto_del_dia(hhmm)
+        if minuto is None:
+            return None
+        persona = self._asegurar_persona(quien)
+        with self._lock:
+            self.consultas += 1
+            bucket = persona.buckets.get(minuto)
+            return bucket[0] if bucket else None
+
+    def agenda(self, quien: str, desde_hhmm: str, fecha_str: str) -> List[dict]:
+        """Recordatorios de 'quien' que aplican en 'fecha_str' desde 'desde_hhmm', ordenados por hora."""
+        minuto = minuto_del_dia(desde_hhmm) or 0
+        persona = self._asegurar_persona(quien)
+        with self._lock:
+            self.consultas += 1
+            inicio = bisect_left(persona.minutos, minuto)
+            return [
+                rec
+                for m in persona.minutos[inicio:]
+                for rec in persona.buckets[m]
+                if aplica_en_fecha(rec, fecha_str)
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "personas": len(self._personas),
+                "recordatorios": len(self._ubicacion),
+                "consultas": self.consultas,
+                "cargas_persona": self.cargas_persona,
+                "refresh_seg": self.refresh_seg,
+                "ultima_carga": self.ultima_carga or None,
+            }
+
+
+# Instancia global para usar en toda la aplicación
+INDICE_RECORDATORIOS = IndiceRecordatorios(cosmos_handler)
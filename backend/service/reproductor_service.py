@@ -0,0 +1,233 @@
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+import requests
+
+from utils.audio_cache import CACHE_DIR, AudioCache
+from utils.client_registry import obtener_sesion_http
+
+# pygame se importa recién al arrancar el hilo de reproducción (ver _iniciar_mixer)
+pygame = None
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+PLAYBACK_COLA_MAX = int(os.getenv("PLAYBACK_COLA_MAX", "20"))
+PLAYBACK_CACHE_DIR = os.getenv("PLAYBACK_CACHE_DIR", os.path.join(CACHE_DIR, "descargas"))
+PLAYBACK_CACHE_MAX_MB = int(os.getenv("PLAYBACK_CACHE_MAX_MB", "100"))
+# Con un audio en caché validado hace menos de esto, no se consulta al Blob
+PLAYBACK_REVALIDAR_SEG = int(os.getenv("PLAYBACK_REVALIDAR_SEG", "300"))
+
+# Archivo (en el directorio del caché) con el ETag de cada URL descargada: url -> etag
+ETAGS_INDEX = "etags.json"
+
+# Prioridades (menor = se reproduce antes)
+PRIORIDADES = {"emergencia": 0, "recordatorio": 1, "normal": 2}
+
+
+class ColaReproduccionLlena(RuntimeError):
+    """No hay cupo para más audios pendientes."""
+
+
+class ReproductorAudio:
+    """
+    Un solo hilo reproduce los audios pedidos por /api/esp32/play-audio, en orden de prioridad.
+    - Cola acotada (PLAYBACK_COLA_MAX); la misma URL pendiente no se encola dos veces
+      (si llega con más prioridad, reemplaza a la pendiente).
+    - Las descargas se guardan en un AudioCache LRU en disco, con clave URL + ETag;
+      un audio en caché se revalida con If-None-Match (304 = no se descarga de nuevo).
+    - El ETag de cada URL se persiste en ETAGS_INDEX junto a los audios, así después de
+      un reinicio la copia en disco se sigue encontrando (se revalida antes de usarla).
+    """
+
+    def __init__(self, cache: AudioCache, max_cola: int = PLAYBACK_COLA_MAX):
+        self.cache = cache
+        self.max_cola = max_cola
+        self._cola: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._pendientes: Dict[str, dict] = {}   # url -> item pendiente
+        self._etags: Dict[str, tuple] = {}       # url -> (etag, validado_ts)
+        self._lock_etags = threading.Lock()      # obtener_audio corre también en el despachador (precalentar)
+        self._secuencia = itertools.count()
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self.actual: Optional[dict] = None
+        self.stats = {"encolados": 0, "duplicados": 0, "reproducidos": 0, "errores": 0,
+                      "descargas": 0, "revalidados_304": 0, "desde_cache": 0}
+        self._cargar_etags()
+
+    # ---------- Encolar ----------
+
+    def encolar(self, audio_url: str, prioridad: str = "recordatorio", **info) -> Dict[str, Any]:
+        """
+        Agrega el audio a la cola. Devuelve { estado: encolado|duplicado, profundidad }.
+        Lanza ColaReproduccionLlena si no hay cupo.
+        """
+        nivel = PRIORIDADES.get(prioridad, PRIORIDADES["normal"])
+        with self._lock:
+            pendiente = self._pendientes.get(audio_url)
+            if pendiente and pendiente["nivel"] <= nivel:
+                self.stats["duplicados"] += 1
+                return {"estado": "duplicado", "profundidad": len(self._pendientes)}
+            if not pendiente and len(self._pendientes) >= self.max_cola:
+                raise ColaReproduccionLlena("Demasiados audios en cola, intente más tarde")
+            if pendiente:
+                pendiente["cancelado"] = True  # se reemplaza por el de mayor prioridad
+            item = {"url": audio_url, "nivel": nivel, "prioridad": prioridad, "info": info,
+                    "encolado_ts": time.time(), "cancelado": False}
+            self._pendientes[audio_url] = item
+            self._cola.put((nivel, next(self._secuencia), item))
+            self.stats["encolados"] += 1
+            profundidad = len(self._pendientes)
+        self._asegurar_hilo()
+        return {"estado": "encolado", "profundidad": profundidad}
+
+    def _asegurar_hilo(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="reproductor")
+                self._hilo.start()
+
+    # ---------- Descarga con caché ----------
+
+    @staticmethod
+    def _clave(url: str, etag: str) -> str:
+        return hashlib.sha256(f"{url}\x1f{etag}".encode("utf-8")).hexdigest()
+
+    def _cargar_etags(self):
+        """Recupera url -> etag del disco; validado_ts = 0 obliga a revalidar la primera vez."""
+        ruta = os.path.join(self.cache.directorio, ETAGS_INDEX)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                self._etags = {url: (etag, 0.0) for url, etag in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[AUDIO][WARN] Registro de ETags ilegible, se reinicia: {e}")
+
+    def _persistir_etags(self):
+        """
+        Guarda url -> etag de los audios que siguen en disco (los desalojados se olvidan).
+        Requiere self._lock_etags tomado.
+        """
+        ruta = os.path.join(self.cache.directorio, ETAGS_INDEX)
+        tmp = ruta + ".tmp"
+        for url, (etag, _) in list(self._etags.items()):
+            if not self.cache.contiene(self._clave(url, etag)):
+                del self._etags[url]
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({url: etag for url, (etag, _) in self._etags.items()}, f)
+            os.replace(tmp, ruta)
+        except OSError as e:
+            print(f"[AUDIO][WARN] No se pudo persistir el registro de ETags: {e}")
+
+    def obtener_audio(self, url: str) -> bytes:
+        """Bytes del audio desde el caché en disco (revalidado por ETag) o descargados."""
+        with self._lock_etags:
+            etag, validado = self._etags.get(url, (None, 0.0))
+        datos = self.cache.leer(self._clave(url, etag)) if etag else None
+        if datos is not None and time.time() - validado < PLAYBACK_REVALIDAR_SEG:
+            self.stats["desde_cache"] += 1
+            return datos
+
+        headers = {"If-None-Match": etag} if datos is not None else {}
+        try:
+            response = obtener_sesion_http().get(url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException:
+            if datos is not None:
+                print("[AUDIO] Sin conexión al Blob; se reproduce la copia en caché")
+                self.stats["desde_cache"] += 1
+                return datos
+            raise
+        if response.status_code == 304 and datos is not None:
+            with self._lock_etags:
+                self._etags[url] = (etag, time.time())
+            self.stats["revalidados_304"] += 1
+            return datos
+        response.raise_for_status()
+
+        datos = response.content
+        etag_nuevo = response.headers.get("ETag") or hashlib.sha256(datos).hexdigest()
+        self.cache.guardar(self._clave(url, etag_nuevo), datos)
+        with self._lock_etags:
+            self._etags[url] = (etag_nuevo, time.time())
+            self._persistir_etags()
+        self.stats["descargas"] += 1
+        print(f"Audio descargado: {len(datos)} bytes")
+        return datos
+
+    # ---------- Reproducción ----------
+
+    def _iniciar_mixer(self) -> bool:
+        global pygame
+        try:
+            import pygame
+        except ImportError:
+            print("⚠️ pygame no está instalado: no se puede reproducir audio en el servidor")
+            return False
+        try:
+            pygame.mixer.init()
+            print("🎵 Sistema de audio inicializado correctamente")
+            return True
+        except Exception as e:
+            print(f"⚠️ Error inicializando audio: {e}")
+            return False
+
+    def _reproducir(self, datos: bytes):
+        pygame.mixer.music.load(BytesIO(datos))
+        pygame.mixer.music.play()
+        print("Reproduciendo audio en la computadora...")
+        while pygame.mixer.music.get_busy():
+            pygame.time.wait(100)
+
+    def _bucle(self):
+        mixer_ok = self._iniciar_mixer()
+        while True:
+            _, _, item = self._cola.get()
+            with self._lock:
+                if item["cancelado"]:
+                    continue
+                self._pendientes.pop(item["url"], None)
+                self.actual = item
+            try:
+                print(f"Iniciando descarga y reproducción ({item['prioridad']})...")
+                datos = self.obtener_audio(item["url"])
+                if mixer_ok:
+                    self._reproducir(datos)
+                    print("¡Audio reproducido exitosamente!")
+                    if item["info"].get("medicamento"):
+                        print(f"Recordatorio completado: {item['info']['medicamento']}")
+                self.stats["reproducidos"] += 1
+            except requests.exceptions.RequestException as e:
+                self.stats["errores"] += 1
+                print(f"Error descargando audio: {e}")
+            except Exception as e:
+                # Incluye pygame.error
+                self.stats["errores"] += 1
+                print(f"Error general reproduciendo audio: {e}")
+            finally:
+                with self._lock:
+                    self.actual = None
+
+    def estado(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profundidad": len(self._pendientes),
+                "max_cola": self.max_cola,
+                "reproduciendo": self.actual["url"] if self.actual else None,
+                "pendientes": [
+                    {"url": i["url"], "prioridad": i["prioridad"]}
+                    for i in sorted(self._pendientes.values(), key=lambda i: (i["nivel"], i["encolado_ts"]))
+                ],
+                **self.stats,
+                "cache": self.cache.estado(),
+            }
+
+
+# Instancia global para usar en toda la aplicación
+REPRODUCTOR = ReproductorAudio(AudioCache(PLAYBACK_CACHE_DIR, PLAYBACK_CACHE_MAX_MB * 1024 * 1024))
@@ -1,12 +1,23 @@
 import os
+import json
 import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+try:
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore  # requiere: pip install sqlalchemy
+except ImportError:
+    SQLAlchemyJobStore = None
+
 from service.clothing_service import generar_alerta_y_guardar
+from service.cosmos_handler import cosmos_handler, eliminar_alertas_antiguas
+from service.lider_service import crear_eleccion
+from utils.weather_service import celda, obtener_temp_actual
 
 # ======== Config por defecto (puede ser sobrescrita por ENV) ========
 DEF_ENABLED = os.getenv("SCHED_ENABLED", "true").lower() == "true"
@@ -17,6 +28,20 @@ DEF_MARGEN = float(os.getenv("SCHED_MARGEN", "3"))
 DEF_INCLUIR_TEMP = os.getenv("SCHED_INCLUIR_TEMP", "true").lower() == "true"
 DEF_LAT = float(os.getenv("SCHED_LAT", "9.9281"))
 DEF_LON = float(os.getenv("SCHED_LON", "-84.0907"))
+# Retención de alertas: borra las de más de N días (0 = deshabilitado)
+DEF_RETENCION_DIAS = int(os.getenv("SCHED_RETENCION_DIAS", "0"))
+DEF_RETENCION_CADA_HORAS = int(os.getenv("SCHED_RETENCION_CADA_HORAS", "24"))
+# Origen de los perfiles por persona: "env" (solo SCHED_PERSONA), "archivo" (JSON) o "cosmos"
+DEF_PERFILES = os.getenv("SCHED_PERFILES", "env").lower()
+DEF_PERFILES_ARCHIVO = os.getenv("SCHED_PERFILES_ARCHIVO", "perfiles_alerta.json")
+DEF_MAX_WORKERS = int(os.getenv("SCHED_MAX_WORKERS", "4"))
+# Job store persistente (SQLAlchemy): los próximos disparos sobreviven a un reinicio. "memoria" = sin persistencia
+DEF_JOBSTORE_URL = os.getenv(
+    "SCHED_JOBSTORE_URL",
+    "sqlite:///" + os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scheduler_jobs.sqlite")),
+)
+# Un disparo perdido (proceso caído, sin líder) se ejecuta al volver si no pasó más que esto
+DEF_MISFIRE_GRACE_SEG = int(os.getenv("SCHED_MISFIRE_GRACE_SEG", "900"))
 
 CONFIG: Dict[str, Any] = {
     "enabled": DEF_ENABLED,
@@ -27,35 +52,149 @@ CONFIG: Dict[str, Any] = {
     "incluir_temp": DEF_INCLUIR_TEMP,
     "lat": DEF_LAT,
     "lon": DEF_LON,
+    "retencion_dias": DEF_RETENCION_DIAS,
+    "retencion_cada_horas": DEF_RETENCION_CADA_HORAS,
+    "perfiles": DEF_PERFILES,
+    "perfiles_archivo": DEF_PERFILES_ARCHIVO,
+    "max_workers": DEF_MAX_WORKERS,
+    "jobstore_url": DEF_JOBSTORE_URL,
+    "misfire_grace_seg": DEF_MISFIRE_GRACE_SEG,
 }
 
 SCHEDULER = BackgroundScheduler(timezone="UTC")
 JOB_ID = "job_clothing_alert"
+JOB_RETENCION_ID = "job_retencion_alertas"
+# Solo el proceso líder del despliegue ejecuta los jobs (ver lider_service)
+ELECCION = crear_eleccion(cosmos_handler)
 
+# persona -> resumen de su última ejecución (ver scheduler_status)
+RESULTADOS: Dict[str, Dict[str, Any]] = {}
+_RESULTADOS_LOCK = threading.Lock()
+
+
+def _perfil(datos: dict) -> Dict[str, Any]:
+    """Perfil completo de una persona; lo que falte se toma de CONFIG."""
+    persona = datos.get("persona") or datos.get("quien")
+    if not persona:
+        raise ValueError("Perfil sin 'persona'")
+    return {
+        "persona": persona,
+        "promedio": float(datos.get("promedio", CONFIG["promedio"])),
+        "margen": float(datos.get("margen", CONFIG["margen"])),
+        # Mismo criterio que clothing_api.parametros_generar: "false" no es True
+        "incluir_temp": datos.get("incluir_temp", CONFIG["incluir_temp"]) in (True, "1", "true", "True", 1),
+        "lat": float(datos.get("lat", CONFIG["lat"])),
+        "lon": float(datos.get("lon", CONFIG["lon"])),
+    }
+
+
+def cargar_perfiles() -> List[Dict[str, Any]]:
+    """
+    Perfiles de alerta según CONFIG['perfiles']:
+      - "env": una sola persona con la config del entorno (comportamiento original)
+      - "archivo": lista JSON en CONFIG['perfiles_archivo']
+      - "cosmos": documentos tipo='perfil_alerta' activos
+    Una persona con más de un perfil se ejecuta una sola vez, con el primero (el resto se ignora).
+    """
+    origen = CONFIG["perfiles"]
+    if origen == "archivo":
+        with open(CONFIG["perfiles_archivo"], "r", encoding="utf-8") as f:
+            crudos = [p for p in json.load(f) if p.get("activo", True)]
+    elif origen == "cosmos":
+        crudos = cosmos_handler.obtener_perfiles_alerta()
+    else:
+        crudos = [CONFIG]
+
+    perfiles: Dict[str, Dict[str, Any]] = {}
+    for crudo in crudos:
+        try:
+            perfil = _perfil(crudo)
+        except (TypeError, ValueError) as e:
+            print(f"[SCHED][WARN] Perfil inválido ignorado ({e}): {crudo.get('id') or crudo}")
+            continue
+        if perfil["persona"] in perfiles:
+            print(f"[SCHED][WARN] Perfil duplicado de '{perfil['persona']}' ignorado: {crudo.get('id') or crudo}")
+            continue
+        perfiles[perfil["persona"]] = perfil
+    return list(perfiles.values())
+
+
+def _ejecutar_persona(perfil: Dict[str, Any], temp: Optional[float], error_clima: Optional[str]) -> Dict[str, Any]:
+    if error_clima:
+        res = {"error": "ERROR_CLIMA", "detalle": error_clima}
+    else:
+        try:
+            res = generar_alerta_y_guardar(
+                persona=perfil["persona"],
+                promedio=perfil["promedio"],
+                margen=perfil["margen"],
+                incluir_temp=perfil["incluir_temp"],
+                lat=perfil["lat"],
+                lon=perfil["lon"],
+                temp=temp,
+            )
+        except Exception as e:
+            res = {"error": "ERROR_INESPERADO", "detalle": str(e)}
 
-def run_job_once() -> Dict[str, Any]:
-    """Ejecuta el job de alerta UNA vez con la config actual."""
-    started = datetime.now(timezone.utc).isoformat()
-    print(f"\n[SCHED] Ejecutando job a las {started} (UTC) persona={CONFIG['persona']}")
-    res = generar_alerta_y_guardar(
-        persona=CONFIG["persona"],
-        promedio=CONFIG["promedio"],
-        margen=CONFIG["margen"],
-        incluir_temp=CONFIG["incluir_temp"],
-        lat=CONFIG["lat"],
-        lon=CONFIG["lon"],
-    )
     if res.get("error"):
-        print(f"[SCHED][ERROR] {res.get('error')}: {res.get('detalle')}")
+        print(f"[SCHED][ERROR] {perfil['persona']}: {res.get('error')}: {res.get('detalle')}")
     else:
         print(
-            f"[SCHED][OK] estado={res.get('estado')} "
+            f"[SCHED][OK] {perfil['persona']}: estado={res.get('estado')} "
             f"id={res.get('id_documento')} categoria={res.get('categoria')} "
             f"url={res.get('url_audio')}"
         )
+    with _RESULTADOS_LOCK:
+        RESULTADOS[perfil["persona"]] = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "estado": "error" if res.get("error") else res.get("estado"),
+            "error": res.get("error"),
+            "categoria": res.get("categoria"),
+            "temperatura": res.get("temperatura", temp),
+            "id_documento": res.get("id_documento"),
+        }
     return res
 
 
+def run_job_once(personas: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Ejecuta el job de alerta UNA vez para todos los perfiles (o solo 'personas').
+    El clima se consulta una vez por ubicación (celda de la grilla de weather_service)
+    y las personas se procesan en un pool de CONFIG['max_workers'] hilos.
+    """
+    started = datetime.now(timezone.utc).isoformat()
+    perfiles = cargar_perfiles()
+    if personas:
+        perfiles = [p for p in perfiles if p["persona"] in personas]
+
+    ubicaciones: Dict[tuple, List[Dict[str, Any]]] = {}
+    for perfil in perfiles:
+        ubicaciones.setdefault(celda(perfil["lat"], perfil["lon"]), []).append(perfil)
+    print(f"\n[SCHED] Ejecutando job a las {started} (UTC) personas={len(perfiles)} ubicaciones={len(ubicaciones)}")
+
+    resultados: Dict[str, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, int(CONFIG["max_workers"])), thread_name_prefix="sched") as pool:
+        futuros = {}
+        for (lat, lon), grupo in ubicaciones.items():
+            try:
+                temp, error_clima = obtener_temp_actual(lat, lon), None
+            except Exception as e:
+                temp, error_clima = None, f"No se pudo obtener la temperatura: {e}"
+            for perfil in grupo:
+                futuros[perfil["persona"]] = pool.submit(_ejecutar_persona, perfil, temp, error_clima)
+        for persona, futuro in futuros.items():
+            resultados[persona] = futuro.result()
+
+    return {
+        "inicio": started,
+        "personas": len(perfiles),
+        "ubicaciones": len(ubicaciones),
+        "alertas": sum(1 for r in resultados.values() if r.get("id_documento")),
+        "errores": sum(1 for r in resultados.values() if r.get("error")),
+        "resultados": resultados,
+    }
+
+
 def _job_wrapper():
     """Wrapper interno para el scheduler."""
     try:
@@ -65,9 +204,82 @@ def _job_wrapper():
         print(f"[SCHED][FATAL] Excepción no controlada en job: {e}")
 
 
+def _retencion_wrapper():
+    """Barrido de retención: borra alertas más viejas que CONFIG['retencion_dias']."""
+    try:
+        res = eliminar_alertas_antiguas(cosmos_handler.container, CONFIG["retencion_dias"])
+        print(f"[SCHED][RETENCION] eliminadas={res['eliminados']} limite={res['limite']}")
+    except Exception as e:
+        print(f"[SCHED][FATAL] Excepción no controlada en retención: {e}")
+
+
+def _configurar_jobstore() -> str:
+    """Configura el job store antes de arrancar. Devuelve 'sqlalchemy' o 'memoria'."""
+    url = CONFIG["jobstore_url"]
+    if not url or url == "memoria":
+        return "memoria"
+    if SQLAlchemyJobStore is None:
+        print("[SCHED][WARN] sqlalchemy no está instalado: job store en memoria (los disparos perdidos no se recuperan)")
+        return "memoria"
+    SCHEDULER.configure(jobstores={"default": SQLAlchemyJobStore(url=url)})
+    return "sqlalchemy"
+
+
+def _registrar_job(func, trigger, job_id: str, misfire_grace_time: int):
+    """
+    Agrega el job, o conserva el ya persistido si tiene el mismo trigger: así su próximo disparo
+    (quizás en el pasado) se respeta y APScheduler lo pone al día según misfire_grace_time
+    (coalesce=True: varios disparos perdidos se ejecutan una sola vez).
+    """
+    existente = SCHEDULER.get_job(job_id)
+    if existente is not None and str(existente.trigger) == str(trigger):
+        existente.modify(max_instances=1, coalesce=True, misfire_grace_time=misfire_grace_time)
+        return
+    SCHEDULER.add_job(
+        func,
+        trigger=trigger,
+        id=job_id,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=misfire_grace_time,
+    )
+
+
+def _al_ganar_liderazgo():
+    """Arranca (o reanuda) el scheduler en este proceso."""
+    if not SCHEDULER.running:
+        # En pausa hasta registrar los jobs, para no disparar con la config vieja del store
+        SCHEDULER.start(paused=True)
+        atexit.register(_apagar)
+
+    _registrar_job(_job_wrapper, IntervalTrigger(minutes=int(CONFIG["every_min"])), JOB_ID,
+                   int(CONFIG["misfire_grace_seg"]))
+    if int(CONFIG["retencion_dias"] or 0) > 0:
+        _registrar_job(_retencion_wrapper, IntervalTrigger(hours=int(CONFIG["retencion_cada_horas"])),
+                       JOB_RETENCION_ID, 3600)
+    elif SCHEDULER.get_job(JOB_RETENCION_ID):
+        SCHEDULER.remove_job(JOB_RETENCION_ID)  # quedó persistido de una config anterior
+    SCHEDULER.resume()
+    print(f"[SCHED] Iniciado: cada {CONFIG['every_min']} min. Perfiles={CONFIG['perfiles']}")
+
+
+def _al_perder_liderazgo():
+    if SCHEDULER.running:
+        SCHEDULER.pause()
+
+
+def _apagar():
+    ELECCION.detener()
+    if SCHEDULER.running:
+        SCHEDULER.shutdown(wait=False)
+
+
 def init_scheduler(app_debug: bool, **overrides):
     """
-    Inicializa/arranca el scheduler en background.
+    Inicializa el scheduler en background. Se puede llamar desde todos los workers:
+    solo el proceso que gana la elección de líder ejecuta los jobs, y los demás quedan
+    como seguidores (toman el relevo si el líder muere).
     - app_debug: si Flask corre en debug (para evitar doble arranque por reloader)
     - overrides: parámetros a pisar dinámicamente (opcional)
     """
@@ -82,21 +294,11 @@ def init_scheduler(app_debug: bool, **overrides):
         print("[SCHED] Saltando arranque en proceso padre (reloader activo)")
         return
 
-    trigger = IntervalTrigger(minutes=int(CONFIG["every_min"]))
-    SCHEDULER.add_job(
-        _job_wrapper,
-        trigger=trigger,
-        id=JOB_ID,
-        replace_existing=True,
-        max_instances=1,
-        coalesce=True,
-        misfire_grace_time=60,
-    )
     if not SCHEDULER.running:
-        SCHEDULER.start()
-        atexit.register(lambda: SCHEDULER.shutdown(wait=False))
-
-    print(f"[SCHED] Iniciado: cada {CONFIG['every_min']} min. Persona={CONFIG['persona']}")
+        CONFIG["jobstore"] = _configurar_jobstore()
+    ELECCION.iniciar(al_ganar=_al_ganar_liderazgo, al_perder=_al_perder_liderazgo)
+    if not ELECCION.es_lider:
+        print("[SCHED] Otro proceso es el líder; este queda como seguidor")
 
 
 def scheduler_status() -> Dict[str, Any]:
@@ -112,6 +314,13 @@ def scheduler_status() -> Dict[str, Any]:
         "enabled": CONFIG["enabled"],
         "interval_minutes": CONFIG["every_min"],
         "persona": CONFIG["persona"],
+        "perfiles": CONFIG["perfiles"],
+        "max_workers": CONFIG["max_workers"],
+        "retencion_dias": CONFIG["retencion_dias"],
+        "jobstore": CONFIG.get("jobstore"),
+        "misfire_grace_seg": CONFIG["misfire_grace_seg"],
+        "lider": ELECCION.estado(),
         "jobs": jobs,
+        "personas": dict(RESULTADOS),
         "utc_now": datetime.now(timezone.utc).isoformat(),
     }
@@ -5,14 +5,14 @@ import sys
 # Agregar la carpeta raíz del proyecto al sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from backend.config.config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, TWILIO_PHONE_NUMBER_TO
-from twilio.rest import Client
+from backend.config.config import TWILIO_PHONE_NUMBER, TWILIO_PHONE_NUMBER_TO
+from utils.client_registry import obtener_twilio
 
 
 def enviar_sms(texto):
     try:
-        # Crear cliente de Twilio con tus credenciales
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        # Cliente de Twilio compartido (se crea una sola vez por proceso)
+        client = obtener_twilio()
 
         # Crear y enviar el mensaje
         mensaje = client.messages.create(
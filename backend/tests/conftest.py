@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del backend se importan como en main.py (service.*, utils.*, routes.*)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,24 @@
+import json
+
+from utils.audio_cache import AudioCache, nombre_por_clave
+
+CLAVE_A = "a" * 64
+CLAVE_B = "b" * 64
+
+
+def test_mismo_nombre_distinto_contenido_no_se_pisa():
+    assert nombre_por_clave("aspirina_0800.wav", CLAVE_A) == "aspirina_0800_aaaaaaaaaaaa.wav"
+    assert nombre_por_clave("aspirina_0800.wav", CLAVE_A) != nombre_por_clave("aspirina_0800.wav", CLAVE_B)
+    # Las variantes comparten la clave del original
+    assert nombre_por_clave("aspirina_0800.ulaw.wav", f"{CLAVE_A}.ulaw") == "aspirina_0800_aaaaaaaaaaaa.ulaw.wav"
+
+
+def test_registros_viejos_sin_clave_en_el_nombre_se_descartan(tmp_path):
+    url = "https://cuenta.blob.core.windows.net/audios/"
+    (tmp_path / "blobs.json").write_text(json.dumps({
+        CLAVE_A: url + "aspirina_0800.wav",
+        CLAVE_B: url + nombre_por_clave("aspirina_0800.wav", CLAVE_B),
+    }), encoding="utf-8")
+    cache = AudioCache(str(tmp_path), 1024 * 1024)
+    assert cache.url_subida(CLAVE_A) is None
+    assert cache.url_subida(CLAVE_B).endswith("aspirina_0800_bbbbbbbbbbbb.wav")
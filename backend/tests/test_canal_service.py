@@ -0,0 +1,42 @@
+import threading
+
+from service.canal_service import CanalDispositivos
+
+
+def test_eventos_desde_el_cursor():
+    canal = CanalDispositivos()
+    inicio = canal.token_cursor()
+    canal.publicar("Ana", {"tipo": "config"})
+    canal.publicar("Luis", {"tipo": "config"})
+    eventos, cursor = canal.pendientes(["Ana"], inicio)
+    assert [e["quien"] for e in eventos] == ["Ana"]
+    assert eventos[0]["cursor"] == f"{canal.epoca}:1"
+    assert cursor == canal.token_cursor()
+    assert canal.pendientes(["Ana"], cursor)[0] == []
+
+
+def test_cursor_de_otra_instancia_pide_resync():
+    anterior, canal = CanalDispositivos(), CanalDispositivos()
+    anterior.publicar("Ana", {"tipo": "config"})
+    canal.publicar("Ana", {"tipo": "config"})
+    # Mismo número, otra época: antes pasaba como cursor válido y el evento se perdía
+    eventos, _ = canal.pendientes(["Ana"], anterior.token_cursor(0))
+    assert eventos == [{"cursor": canal.token_cursor(), "tipo": "resync"}]
+    assert canal.pendientes(["Ana"], "5")[0][0]["tipo"] == "resync"
+
+
+def test_cursor_perdido_pide_resync():
+    canal = CanalDispositivos(max_eventos=2)
+    for _ in range(4):
+        canal.publicar("Ana", {"tipo": "config"})
+    assert canal.pendientes(["Ana"], canal.token_cursor(0))[0][0]["tipo"] == "resync"
+    assert len(canal.pendientes(["Ana"], canal.token_cursor(2))[0]) == 2
+
+
+def test_esperar_despierta_al_publicar():
+    canal = CanalDispositivos()
+    desde = canal.token_cursor()
+    threading.Timer(0.05, canal.publicar, ("Ana", {"tipo": "vencido"})).start()
+    eventos, cursor = canal.esperar(["Ana"], desde, timeout=2)
+    assert [e["tipo"] for e in eventos] == ["vencido"]
+    assert cursor == f"{canal.epoca}:1"
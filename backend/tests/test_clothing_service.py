@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from service import clothing_service
+
+ANTERIOR = {"id": "a1", "categoria": "frio", "mensaje": "Está haciendo frío, ponte un abrigo.",
+            "url_audio": "https://blob.example/frio_1.wav", "url_audio_variantes": {"mp3": "https://blob.example/frio_1.mp3"}}
+
+
+@pytest.fixture
+def sin_servicios(monkeypatch):
+    """TTS, Blob y Cosmos falsos; 'guardadas' junta las alertas escritas."""
+    guardadas, tts = [], []
+
+    async def ultima_async(container, quien, campos=None):
+        return dict(ANTERIOR)
+
+    async def guardar_async(container, alerta):
+        guardadas.append(alerta)
+        return {**alerta, "id": "nueva"}
+
+    async def container_async():
+        return object()
+
+    monkeypatch.setattr(clothing_service, "ch_obtener_ultima_alerta", lambda container, quien, campos=None: dict(ANTERIOR))
+    monkeypatch.setattr(clothing_service, "ch_guardar_alerta_clima",
+                        lambda container, alerta: guardadas.append(alerta) or {**alerta, "id": "nueva"})
+    monkeypatch.setattr(clothing_service, "ch_obtener_ultima_alerta_async", ultima_async)
+    monkeypatch.setattr(clothing_service, "ch_guardar_alerta_clima_async", guardar_async)
+    monkeypatch.setattr(clothing_service, "obtener_container_cosmos_async", container_async)
+    monkeypatch.setattr(clothing_service, "cosmos_handler", SimpleNamespace(container=object()))
+    monkeypatch.setattr(clothing_service, "generar_audio", lambda mensaje: tts.append(mensaje) or b"wav")
+    monkeypatch.setattr(clothing_service, "subir_a_blob", lambda datos, archivo, clave=None: f"https://blob.example/{archivo}")
+
+    async def generar_async(mensaje):
+        return clothing_service.generar_audio(mensaje)
+
+    async def subir_async(datos, archivo, clave=None):
+        return clothing_service.subir_a_blob(datos, archivo, clave=clave)
+
+    monkeypatch.setattr(clothing_service, "generar_audio_async", generar_async)
+    monkeypatch.setattr(clothing_service, "subir_a_blob_async", subir_async)
+    monkeypatch.setattr(clothing_service, "subir_variantes", lambda generar, archivo, clave=None: {})
+    monkeypatch.setattr(clothing_service.AUDIO_CACHE, "url_subida", lambda clave: None)
+    return guardadas, tts
+
+
+def _sync(temp, incluir_temp=False):
+    return clothing_service.generar_alerta_y_guardar("Ana", promedio=25, margen=3, incluir_temp=incluir_temp, temp=temp)
+
+
+def _async(monkeypatch, temp, incluir_temp=False):
+    async def clima(lat, lon):
+        return temp
+
+    monkeypatch.setattr(clothing_service, "obtener_temp_actual_async", clima)
+    return asyncio.run(clothing_service.generar_alerta_y_guardar_async("Ana", promedio=25, margen=3,
+                                                                      incluir_temp=incluir_temp))
+
+
+def test_sync_y_async_reutilizan_el_audio_de_la_alerta_anterior(sin_servicios, monkeypatch):
+    guardadas, tts = sin_servicios
+    sync, asinc = _sync(15.0), _async(monkeypatch, 15.0)
+    assert sync == asinc
+    assert sync["alerta_anterior"] == "a1"
+    assert sync["url_audio"] == ANTERIOR["url_audio"]
+    assert sync["url_audio_variantes"] == ANTERIOR["url_audio_variantes"]
+    assert tts == []
+    assert len(guardadas) == 2
+
+
+def test_mensaje_distinto_genera_audio_nuevo(sin_servicios, monkeypatch):
+    guardadas, tts = sin_servicios
+    sync = _sync(15.0, incluir_temp=True)
+    asinc = _async(monkeypatch, 15.0, incluir_temp=True)
+    assert len(tts) == 2
+    assert sync["url_audio"] != ANTERIOR["url_audio"]
+    assert sync["alerta_anterior"] == asinc["alerta_anterior"] == "a1"
+    assert set(sync) == set(asinc)
+
+
+def test_sin_alerta_anterior_si_cosmos_falla(sin_servicios, monkeypatch):
+    def falla(*a, **k):
+        raise RuntimeError("Cosmos caído")
+
+    monkeypatch.setattr(clothing_service, "ch_obtener_ultima_alerta", falla)
+    res = _sync(15.0)
+    assert res["estado"] == "alerta_guardada"
+    assert res["alerta_anterior"] is None
+
+
+def test_dentro_del_rango_mismo_payload(sin_servicios, monkeypatch):
+    assert _sync(25.0) == _async(monkeypatch, 25.0)
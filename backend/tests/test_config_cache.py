@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+from service.config_cache import ConfigCache, ConsumidorChangeFeed
+from utils.cosmos_memoria import ContenedorMemoria
+
+
+def _rec(rec_id, quien, hora="08:00", **extra):
+    return {"id": rec_id, "tipo": "recordatorio", "quien": quien, "hora": hora,
+            "medicamento": "aspirina", "mensaje": "Tomar", "activo": True, **extra}
+
+
+def _armar(*documentos):
+    """Contenedor en memoria + caché que se reconstruye desde él + consumidor del change feed."""
+    contenedor = ContenedorMemoria(list(documentos))
+    fuente = lambda: contenedor.query_items("SELECT * FROM c WHERE c.tipo = 'recordatorio' AND c.activo = true")
+    cache = ConfigCache(fuente, ttl_seg=3600)
+    feed = ConsumidorChangeFeed(SimpleNamespace(container=contenedor), [cache.aplicar])
+    cache.reconstruir()
+    feed.leer_cambios()  # fija el punto de partida en "ahora"
+    return contenedor, cache, feed
+
+
+def test_change_feed_aplica_solo_lo_nuevo():
+    contenedor, cache, feed = _armar(_rec("1", "Ana"), _rec("2", "Luis"))
+    etag = cache.obtener()[1]
+    assert feed.leer_cambios() == 0
+
+    contenedor.upsert_item(_rec("1", "Ana", hora="09:00"))
+    contenedor.upsert_item(_rec("3", "Ana"))
+    assert feed.leer_cambios() == 2
+    assert {e["id"]: e["hora"] for e in cache.entradas()} == {"1": "09:00", "2": "08:00", "3": "08:00"}
+    assert cache.obtener()[1] != etag
+    assert feed.stats()["documentos"] == 2
+
+
+def test_aplicar_sin_cambios_no_sube_la_version():
+    contenedor, cache, feed = _armar(_rec("1", "Ana"))
+    version, etag = cache.token_version(), cache.obtener()[1]
+    contenedor.upsert_item(_rec("1", "Ana"))  # mismo contenido: aparece en el feed pero no cambia nada
+    assert feed.leer_cambios() == 1
+    assert (cache.token_version(), cache.obtener()[1]) == (version, etag)
+
+
+def test_desactivar_quita_la_entrada_y_avisa():
+    contenedor, cache, feed = _armar(_rec("1", "Ana"), _rec("2", "Luis"))
+    avisos = []
+    cache.suscribir(lambda quienes, version: avisos.append((quienes, version)))
+    contenedor.upsert_item(_rec("1", "Ana", activo=False))
+    feed.leer_cambios()
+    assert [e["id"] for e in cache.entradas()] == ["2"]
+    assert avisos == [({"Ana"}, cache.token_version())]
+
+
+def test_delta_por_persona():
+    contenedor, cache, feed = _armar(_rec("1", "Ana"), _rec("2", "Luis"))
+    desde = cache.token_version()
+    contenedor.upsert_item(_rec("1", "Ana", hora="10:00"))
+    contenedor.upsert_item(_rec("2", "Luis", hora="10:00"))
+    contenedor.upsert_item(_rec("1", "Ana", activo=False))
+    contenedor.upsert_item(_rec("4", "Ana"))
+    feed.leer_cambios()
+
+    delta = cache.delta(["Ana"], desde)
+    assert delta["completo"] is False
+    assert delta["version"] == cache.token_version()
+    assert [e["id"] for e in delta["cambios"]] == ["4"]
+    assert delta["eliminados"] == ["1"]
+    assert cache.delta(["Ana"], delta["version"])["cambios"] == []
+
+
+def test_delta_de_otra_instancia_o_fuera_del_historial_es_completo():
+    contenedor, cache, feed = _armar(_rec("1", "Ana"), _rec("2", "Luis"))
+    otra = ConfigCache(lambda: [], ttl_seg=3600)
+    for desde in (otra.token_version(cache.version), "0", "basura", f"{cache.epoca}:99"):
+        delta = cache.delta(["Ana"], desde)
+        assert delta["completo"] is True
+        assert [e["id"] for e in delta["recordatorios"]] == ["1"]
+
+    chica = ConfigCache(cache.entradas, ttl_seg=3600, max_historial=1)
+    chica.reconstruir()
+    desde = chica.token_version()
+    chica.aplicar([_rec("1", "Ana", hora="11:00")])
+    chica.aplicar([_rec("5", "Ana")])
+    assert chica.delta(["Ana"], desde)["completo"] is True
+
+
+def test_vistas_por_persona_acotadas():
+    contenedor, cache, feed = _armar(_rec("1", "Ana"), _rec("2", "Luis"))
+    cache.max_vistas = 3
+    ana = cache.obtener(["Ana"])
+    for i in range(10):
+        cache.obtener([f"Nadie{i}"])  # combinaciones arbitrarias de los dispositivos
+        cache.obtener(["Ana"])        # la vista en uso no se desaloja
+    assert cache.stats()["vistas_cacheadas"] == 3
+    assert cache.obtener(["Ana"]) == ana
+    contenedor.upsert_item(_rec("1", "Ana", hora="12:00"))
+    feed.leer_cambios()
+    assert cache.obtener(["Ana"]) != ana
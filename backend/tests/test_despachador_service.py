@@ -0,0 +1,59 @@
+import time
+from datetime import datetime, timedelta
+
+from service.despachador_service import DESPACHO_TZ, DespachadorRecordatorios
+
+
+class HandlerFijo:
+    def __init__(self, recordatorios, demora_seg=0.0):
+        self.recordatorios = recordatorios
+        self.demora_seg = demora_seg
+
+    def suscribir(self, callback):
+        pass
+
+    def obtener_recordatorios_activos(self):
+        time.sleep(self.demora_seg)
+        return list(self.recordatorios)
+
+
+def _rec(hace_seg: float) -> dict:
+    hora = (datetime.now(DESPACHO_TZ) - timedelta(seconds=hace_seg)).strftime("%H:%M")
+    return {"id": "r1", "tipo": "recordatorio", "quien": "Ana", "hora": hora, "medicamento": "x", "activo": True}
+
+
+def test_recompilar_no_salta_lo_vencido_durante_la_consulta():
+    # El recordatorio venció después del último instante atendido (antes o durante la consulta a Cosmos)
+    despachador = DespachadorRecordatorios(HandlerFijo([_rec(60)]), reproductor=None,
+                                           precalentar_seg=0, recarga_seg=3600)
+    despachador._procesado_hasta = time.time() - 180
+    despachador.recompilar()
+
+    accion, rec, disparo_ts = despachador._siguiente()
+    assert accion == "disparo" and rec["id"] == "r1"
+    assert disparo_ts <= time.time()
+
+
+def test_vencidos_antes_de_recompilar():
+    despachador = DespachadorRecordatorios(HandlerFijo([_rec(60)]), reproductor=None,
+                                           precalentar_seg=0, recarga_seg=3600)
+    despachador._procesado_hasta = time.time() - 180
+    despachador.recompilar()
+    despachador.ultima_recarga = 0.0  # ya toca recompilar
+
+    siguiente = despachador._siguiente()
+    assert siguiente is not None and siguiente[0] == "disparo"
+    assert despachador._siguiente() is None  # recién ahora recompila
+
+
+def test_disparo_confirma_y_reprograma():
+    despachador = DespachadorRecordatorios(HandlerFijo([_rec(60)]), reproductor=None,
+                                           precalentar_seg=0, recarga_seg=3600)
+    despachador._procesado_hasta = time.time() - 180
+    despachador.recompilar()
+    _, rec, disparo_ts = despachador._siguiente()
+    despachador._disparar(rec, disparo_ts)
+
+    assert [v["recordatorio_id"] for v in despachador.vencidos("Ana")] == ["r1"]
+    assert despachador.confirmar("Ana", "r1")
+    assert despachador._programados["r1"][0] > time.time()  # próxima ocurrencia
@@ -0,0 +1,34 @@
+import json
+
+from service import llm_handler
+from utils.frase_cache import FraseCache
+
+FRASE = "Olga toma ibuprofeno a las 8 a.m. todos los días"
+
+
+def test_hits_de_sqlite_no_cuentan_como_miss(tmp_path):
+    ruta = str(tmp_path / "frases.db")
+    FraseCache(100, 3600, ruta).set(FRASE, json.dumps({"quien": "Olga"}))
+
+    cache = FraseCache(100, 3600, ruta)  # proceso nuevo: memoria vacía, SQLite con la frase
+    assert cache.get(FRASE) is not None   # desde SQLite
+    assert cache.get(FRASE + ".") is not None  # misma clave normalizada, ya en memoria
+    assert cache.get("otra frase") is None
+    stats = cache.stats()
+    assert (stats["hits_sqlite"], stats["hits_memoria"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == round(2 / 3, 3)
+
+
+def test_lote_guarda_lo_resuelto_por_reglas(monkeypatch):
+    cache = FraseCache(100, 3600)
+    monkeypatch.setattr(llm_handler, "FRASE_CACHE", cache)
+    monkeypatch.setattr(llm_handler, "_grupo_a_json", lambda frases: [json.dumps({"quien": "x"}) for _ in frases])
+    llamadas = []
+    original = llm_handler.parsear_frase
+    monkeypatch.setattr(llm_handler, "parsear_frase", lambda f: llamadas.append(f) or original(f))
+
+    primero = llm_handler.frases_a_json([FRASE])
+    assert json.loads(primero[0])["medicamento"] == "ibuprofeno"
+    assert llm_handler.frases_a_json([FRASE]) == primero
+    assert llamadas == [FRASE]  # la segunda vez sale del caché, sin volver a parsear
+    assert cache.stats()["hits_memoria"] == 1
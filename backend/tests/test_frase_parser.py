@@ -0,0 +1,67 @@
+from utils.frase_parser import parsear_frase
+
+
+def test_frase_completa():
+    datos, confianza = parsear_frase("Olga toma ibuprofeno a las 8 a.m. todos los días")
+    assert (datos["quien"], datos["medicamento"], datos["hora"], datos["dias"]) == ("Olga", "ibuprofeno", "08:00", ["todos"])
+    assert confianza == 1.0
+
+
+def test_hora_sin_periodo_queda_bajo_el_umbral():
+    from service.llm_handler import PARSER_UMBRAL
+
+    datos, confianza = parsear_frase("Olga toma ibuprofeno a las ocho")
+    assert datos["hora"] == "08:00"
+    assert confianza < PARSER_UMBRAL
+
+
+def test_medicamento_de_varias_palabras():
+    datos, confianza = parsear_frase("Ana toma vitamina D a las 9 de la mañana todos los días")
+    assert datos["medicamento"] == "vitamina d"
+    assert datos["audio_filename"] == "vitamina_d_0900.wav"
+    assert confianza == 1.0
+
+    datos, _ = parsear_frase("Luis debe tomar ácido fólico 5 mg a las 7 p.m., lunes a viernes")
+    assert datos["medicamento"] == "ácido fólico"
+    assert datos["hora"] == "19:00"
+    assert datos["dias"] == ["lunes", "martes", "miércoles", "jueves", "viernes"]
+
+
+def test_dosis_y_cortes_no_entran_en_el_nombre():
+    for frase in ("Mi abuela debe tomar aspirina 100 mg a las ocho de la noche",
+                  "Olga toma aspirina, a las 8 p.m.",
+                  "Olga toma aspirina diario a las 8 p.m."):
+        assert parsear_frase(frase)[0]["medicamento"] == "aspirina"
+
+
+def test_nombre_largo_o_generico_baja_la_confianza():
+    _, confianza = parsear_frase("Ana toma aspirina infantil masticable sabor naranja a las 8 p.m.")
+    assert confianza < 0.85
+    datos, confianza = parsear_frase("Ana toma la pastilla presion a las 8 p.m.")
+    assert confianza == 0.5
+
+
+def test_rango_del_lunes_al_viernes():
+    datos, confianza = parsear_frase("Olga toma ibuprofeno a las 8 a.m. del lunes al viernes")
+    assert datos["dias"] == ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    assert confianza == 1.0
+
+
+def test_limites_abiertos_van_al_llm():
+    from service.llm_handler import PARSER_UMBRAL
+
+    for frase in ("Olga toma ibuprofeno a las 8 a.m. hasta el viernes",
+                  "Olga toma ibuprofeno a las 8 a.m. desde el martes",
+                  "Olga toma ibuprofeno a las 8 a.m. a partir del lunes"):
+        _, confianza = parsear_frase(frase)
+        assert confianza < PARSER_UMBRAL, frase
+
+
+def test_cantidad_no_es_el_medicamento():
+    from service.llm_handler import PARSER_UMBRAL
+
+    datos, confianza = parsear_frase("Olga toma media pastilla de enalapril a las 8 p.m.")
+    assert datos["medicamento"] == "enalapril"
+    assert confianza < PARSER_UMBRAL  # "pastilla de ...": decide el LLM
+    datos, _ = parsear_frase("Olga toma dos aspirinas a las 8 p.m. todos los días")
+    assert datos["medicamento"] == "aspirinas"
@@ -0,0 +1,41 @@
+import json
+
+from service import frase_service, llm_handler
+from utils.frase_cache import FraseCache
+
+
+def _recordatorio(quien):
+    return {"quien": quien, "hora": "08:00", "medicamento": "aspirina", "audio_filename": "aspirina_0800.wav",
+            "mensaje": f"{quien}, son las ocho. Hora de tomar aspirina.", "frecuencia": "una vez al día",
+            "dias": ["todos"], "duracion_dias": 0}
+
+
+def test_objetos_invalidos_del_lote_se_reintentan_solos(monkeypatch):
+    respuesta = [_recordatorio("Ana"), "no es un objeto", {"quien": "Luis"}]
+    monkeypatch.setattr(llm_handler, "_completar", lambda sistema, usuario: json.dumps(respuesta))
+    reintentos = []
+    monkeypatch.setattr(llm_handler, "_frase_a_json_llm",
+                        lambda frase: reintentos.append(frase) or {"error": "sigue fallando"})
+
+    resultados = llm_handler._grupo_a_json(["f1", "f2", "f3"])
+    assert json.loads(resultados[0])["quien"] == "Ana"
+    assert resultados[1:] == [{"error": "sigue fallando"}] * 2
+    assert reintentos == ["f2", "f3"]
+
+
+def test_el_cache_solo_guarda_lo_validado(monkeypatch):
+    cache = FraseCache(100, 3600)
+    monkeypatch.setattr(llm_handler, "FRASE_CACHE", cache)
+    monkeypatch.setattr(llm_handler, "_frase_por_reglas", lambda frase: None)
+    monkeypatch.setattr(llm_handler, "_completar", lambda sistema, usuario: json.dumps([_recordatorio("Ana"), [1, 2]]))
+    monkeypatch.setattr(llm_handler, "_frase_a_json_llm", lambda frase: {"error": "sin respuesta"})
+
+    llm_handler.frases_a_json(["frase uno", "frase dos"])
+    assert cache.get("frase uno") is not None
+    assert cache.get("frase dos") is None
+
+
+def test_lote_con_elemento_que_no_es_objeto(monkeypatch):
+    monkeypatch.setattr(frase_service, "frases_a_json", lambda frases: ['"solo texto"', "[1, 2]"])
+    res = frase_service.procesar_frases_lote(["a", "b"], guardar=False)
+    assert [r["error"] for r in res["resultados"]] == ["ERROR_LLM", "ERROR_LLM"]
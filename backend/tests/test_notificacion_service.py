@@ -0,0 +1,74 @@
+import threading
+import time
+
+from service.notificacion_service import NotificadorBotones
+
+
+class HandlerFalla:
+    """Handler de Cosmos cuyo registro falla las primeras 'fallas' veces (red, credenciales)."""
+
+    def __init__(self, fallas=1):
+        self.fallas = fallas
+        self.guardados = []
+        self.procesados = []
+        self._lock = threading.Lock()
+
+    def guardar_evento_boton(self, tipo, quien):
+        with self._lock:
+            if self.fallas > 0:
+                self.fallas -= 1
+                raise ConnectionError("Cosmos no disponible")
+            self.guardados.append((tipo, quien))
+            return f"ev{len(self.guardados)}"
+
+    def marcar_evento_procesado(self, evento_id, quien):
+        self.procesados.append(evento_id)
+        return True
+
+
+def _esperar(condicion, timeout=5.0):
+    fin = time.time() + timeout
+    while time.time() < fin:
+        if condicion():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_sms_sale_aunque_falle_cosmos():
+    enviados = []
+    notificador = NotificadorBotones(HandlerFalla(fallas=1), enviar=lambda texto: enviados.append(texto) or True,
+                                     ventana_seg=0)
+    notificador.notificar("HAMBRE", "Ana")
+    assert _esperar(lambda: len(enviados) == 1)
+    assert _esperar(lambda: notificador.estado()["errores_registro"] == 1)
+
+    # La clave no queda trabada en 'agrupado': las siguientes pulsaciones generan su SMS
+    assert _esperar(lambda: notificador.estado()["profundidad"] == 0)
+    assert notificador.notificar("HAMBRE", "Ana")["estado"] == "encolado"
+    assert _esperar(lambda: len(enviados) == 2)
+    assert _esperar(lambda: notificador.handler.procesados == ["ev1"])
+
+
+def test_emergencia_sin_cosmos():
+    enviados = []
+    notificador = NotificadorBotones(HandlerFalla(fallas=10), enviar=lambda texto: enviados.append(texto) or True)
+    assert notificador.notificar("EMERGENCIA", "Luis")["estado"] == "encolado"
+    assert _esperar(lambda: len(enviados) == 1)
+    assert "EMERGENCIA" in enviados[0]
+
+
+def test_excepcion_al_enviar_se_reintenta():
+    intentos = []
+
+    def enviar(texto):
+        intentos.append(texto)
+        if len(intentos) == 1:
+            raise RuntimeError("Twilio caído")
+        return True
+
+    notificador = NotificadorBotones(HandlerFalla(fallas=0), enviar=enviar, backoff_seg=0.05, ventana_seg=0)
+    notificador.notificar("TRISTEZA", "Ana")
+    assert _esperar(lambda: notificador.estado()["enviados"] == 1)
+    assert len(intentos) == 2
+    assert notificador.estado()["reintentos"] == 1
@@ -0,0 +1,64 @@
+from service.recordatorio_index import IndiceRecordatorios
+
+
+def _rec(rec_id, quien, hora, **extra):
+    return {"id": rec_id, "tipo": "recordatorio", "quien": quien, "hora": hora, "activo": True, **extra}
+
+
+class HandlerMemoria:
+    """Lo que usa el índice de cosmos_handler; 'durante_consulta' corre en medio de la recarga."""
+
+    def __init__(self, recordatorios):
+        self.recordatorios = {r["id"]: r for r in recordatorios}
+        self.durante_consulta = None
+        self._callbacks = []
+
+    def suscribir(self, callback):
+        self._callbacks.append(callback)
+
+    def guardar(self, rec):
+        self.recordatorios[rec["id"]] = rec
+        for callback in self._callbacks:
+            callback("guardado", rec)
+
+    def desactivar(self, rec_id):
+        rec = self.recordatorios.pop(rec_id)
+        for callback in self._callbacks:
+            callback("desactivado", rec)
+
+    def obtener_recordatorios_activos(self):
+        snapshot = list(self.recordatorios.values())
+        if self.durante_consulta:
+            self.durante_consulta()
+        return snapshot
+
+    def obtener_recordatorios_por_persona(self, quien):
+        return [r for r in self.recordatorios.values() if r["quien"] == quien]
+
+
+def test_cambios_durante_la_recarga_no_se_pierden():
+    handler = HandlerMemoria([_rec("1", "Ana", "08:00"), _rec("2", "Ana", "09:00")])
+    indice = IndiceRecordatorios(handler, refresh_seg=3600)
+    assert indice.en_hora("Ana", "08:00")["id"] == "1"
+
+    def escrituras():
+        handler.guardar(_rec("3", "Ana", "10:00"))
+        handler.guardar(_rec("4", "Luis", "07:00"))  # persona que el índice todavía no tenía
+        handler.desactivar("2")
+
+    handler.durante_consulta = escrituras
+    indice.recargar()
+    handler.durante_consulta = None
+
+    assert [r["id"] for r in indice.agenda("Ana", "00:00", "2026-01-01")] == ["1", "3"]
+    assert indice.en_hora("Luis", "07:00")["id"] == "4"
+    assert indice.cargas_persona == 1  # Luis quedó en el índice sin consultar su partición
+    assert indice._cambios_en_recarga == []
+
+
+def test_recarga_sin_cambios_intermedios():
+    handler = HandlerMemoria([_rec("1", "Ana", "08:00")])
+    indice = IndiceRecordatorios(handler, refresh_seg=3600)
+    handler.recordatorios["5"] = _rec("5", "Ana", "08:00", prioridad=2)  # escrito por otro proceso
+    indice.recargar()
+    assert indice.en_hora("Ana", "08:00")["id"] == "5"
@@ -0,0 +1,80 @@
+from service.reproductor_service import ReproductorAudio
+from utils.audio_cache import AudioCache
+
+URL = "https://blob.example/audios/aspirina_0800.wav"
+
+
+class Respuesta:
+    def __init__(self, status_code, content=b"", etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class SesionFalsa:
+    def __init__(self, etag='"v1"', datos=b"RIFF-audio"):
+        self.etag, self.datos, self.pedidos = etag, datos, []
+
+    def get(self, url, headers=None, timeout=None):
+        self.pedidos.append(dict(headers or {}))
+        if (headers or {}).get("If-None-Match") == self.etag:
+            return Respuesta(304)
+        return Respuesta(200, self.datos, self.etag)
+
+
+def test_cache_en_disco_sobrevive_al_reinicio(tmp_path, monkeypatch):
+    sesion = SesionFalsa()
+    monkeypatch.setattr("service.reproductor_service.obtener_sesion_http", lambda: sesion)
+
+    primero = ReproductorAudio(AudioCache(str(tmp_path), 1024 * 1024))
+    assert primero.obtener_audio(URL) == b"RIFF-audio"
+    assert primero.stats["descargas"] == 1
+
+    # Proceso nuevo sobre el mismo directorio: revalida con el ETag guardado y no descarga
+    segundo = ReproductorAudio(AudioCache(str(tmp_path), 1024 * 1024))
+    assert segundo.obtener_audio(URL) == b"RIFF-audio"
+    assert sesion.pedidos[-1] == {"If-None-Match": '"v1"'}
+    assert (segundo.stats["descargas"], segundo.stats["revalidados_304"]) == (0, 1)
+    assert segundo.obtener_audio(URL) == b"RIFF-audio"
+    assert segundo.stats["desde_cache"] == 1
+
+
+def test_registro_ilegible_no_rompe(tmp_path, monkeypatch):
+    (tmp_path / "etags.json").write_text("no es json", encoding="utf-8")
+    sesion = SesionFalsa()
+    monkeypatch.setattr("service.reproductor_service.obtener_sesion_http", lambda: sesion)
+    reproductor = ReproductorAudio(AudioCache(str(tmp_path), 1024 * 1024))
+    assert reproductor.obtener_audio(URL) == b"RIFF-audio"
+    assert reproductor.stats["descargas"] == 1
+
+
+def test_descargas_concurrentes_no_rompen_el_registro(tmp_path, monkeypatch):
+    import json
+    import threading
+
+    class SesionPorUrl:
+        def get(self, url, headers=None, timeout=None):
+            return Respuesta(200, url.encode(), f'"{url}"')
+
+    monkeypatch.setattr("service.reproductor_service.obtener_sesion_http", lambda: SesionPorUrl())
+    reproductor = ReproductorAudio(AudioCache(str(tmp_path), 1024 * 1024))
+    errores = []
+
+    def descargar(prefijo):
+        try:
+            for i in range(50):
+                reproductor.obtener_audio(f"https://blob.example/{prefijo}_{i}.wav")
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=descargar, args=(p,)) for p in ("reproductor", "precalentar")]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
+    assert len(json.loads((tmp_path / "etags.json").read_text(encoding="utf-8"))) == 100
@@ -0,0 +1,30 @@
+import json
+
+from service import scheduler_service
+
+
+def _perfiles_desde_archivo(tmp_path, monkeypatch, perfiles):
+    ruta = tmp_path / "perfiles.json"
+    ruta.write_text(json.dumps(perfiles), encoding="utf-8")
+    monkeypatch.setitem(scheduler_service.CONFIG, "perfiles", "archivo")
+    monkeypatch.setitem(scheduler_service.CONFIG, "perfiles_archivo", str(ruta))
+    return scheduler_service.cargar_perfiles()
+
+
+def test_incluir_temp_como_texto(tmp_path, monkeypatch):
+    perfiles = _perfiles_desde_archivo(tmp_path, monkeypatch, [
+        {"persona": "Ana", "incluir_temp": "false"},
+        {"persona": "Luis", "incluir_temp": "true"},
+        {"persona": "Olga", "incluir_temp": 0},
+    ])
+    assert {p["persona"]: p["incluir_temp"] for p in perfiles} == {"Ana": False, "Luis": True, "Olga": False}
+
+
+def test_persona_duplicada_se_ejecuta_una_vez(tmp_path, monkeypatch):
+    perfiles = _perfiles_desde_archivo(tmp_path, monkeypatch, [
+        {"persona": "Ana", "promedio": 20},
+        {"quien": "Ana", "promedio": 30},
+        {"persona": "Luis"},
+        {"persona": "Pedro", "activo": False},
+    ])
+    assert [(p["persona"], p["promedio"]) for p in perfiles] == [("Ana", 20.0), ("Luis", scheduler_service.CONFIG["promedio"])]
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from utils import weather_service
+
+
+@pytest.fixture(autouse=True)
+def limpio():
+    weather_service._CACHE.clear()
+    weather_service._ERRORES.clear()
+    for clave in weather_service._STATS:
+        weather_service._STATS[clave] = 0
+    yield
+    assert weather_service._EN_VUELO == {}
+
+
+def _en_paralelo(n, funcion):
+    resultados, hilos = [], []
+    for _ in range(n):
+        def correr():
+            try:
+                resultados.append(funcion())
+            except Exception as e:
+                resultados.append(e)
+        hilos.append(threading.Thread(target=correr))
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def test_una_consulta_por_celda(monkeypatch):
+    llamadas = []
+
+    def consultar(lat, lon, unidades, lang):
+        llamadas.append((lat, lon))
+        time.sleep(0.05)
+        return 24.5
+
+    monkeypatch.setattr(weather_service, "_consultar_openweather", consultar)
+    resultados = _en_paralelo(20, lambda: weather_service.obtener_temp_actual(9.93, -84.09))
+    assert resultados == [24.5] * 20
+    assert len(llamadas) == 1
+    assert weather_service.obtener_temp_actual(9.931, -84.091) == 24.5  # misma celda, del caché
+    assert len(llamadas) == 1
+
+
+def test_error_sin_valor_previo_no_se_repite(monkeypatch):
+    llamadas = []
+
+    def consultar(lat, lon, unidades, lang):
+        llamadas.append((lat, lon))
+        time.sleep(0.05)
+        raise ConnectionError("OpenWeather caído")
+
+    monkeypatch.setattr(weather_service, "_consultar_openweather", consultar)
+    resultados = _en_paralelo(10, lambda: weather_service.obtener_temp_actual(9.93, -84.09))
+    assert all(isinstance(r, Exception) for r in resultados)
+    assert len(llamadas) == 1
+    with pytest.raises(RuntimeError, match="OpenWeather caído"):
+        weather_service.obtener_temp_actual(9.93, -84.09)
+    assert len(llamadas) == 1
+    assert weather_service.estado_cache()["errores_cacheados"] == 10
+
+
+def test_error_con_valor_previo_devuelve_el_viejo(monkeypatch):
+    monkeypatch.setattr(weather_service, "_consultar_openweather", lambda *a: 20.0)
+    assert weather_service.obtener_temp_actual(9.93, -84.09) == 20.0
+    monkeypatch.setattr(weather_service, "CLIMA_TTL_SEG", 0)
+
+    def falla(*a):
+        raise ConnectionError("OpenWeather caído")
+
+    monkeypatch.setattr(weather_service, "_consultar_openweather", falla)
+    assert weather_service.obtener_temp_actual(9.93, -84.09) == 20.0
+    assert weather_service.estado_cache()["stale"] == 1
@@ -0,0 +1,108 @@
+import asyncio
+import os
+
+from config.config import (
+    AZURE_COSMOS_DATABASE_NAME,
+    AZURE_COSMOS_DB_CONTAINER_NAME,
+    AZURE_COSMOS_KEY,
+    AZURE_COSMOS_URL,
+    AZURE_STORAGE_CONNECTION_STRING,
+    AZURE_STORAGE_CONTAINER_NAME,
+)
+
+try:
+    import httpx  # opcional: pip install httpx (solo para el modo ASGI)
+except ImportError:
+    httpx = None
+
+# === Registro de clientes async (modo ASGI) ===
+# Equivalente async de client_registry: un cliente por proceso, creado perezosamente dentro
+# del event loop del servidor ASGI (los clientes aio quedan atados al loop que los crea).
+HTTP_ASYNC_MAX_CONEXIONES = int(os.getenv("HTTP_ASYNC_MAX_CONEXIONES", "100"))
+
+_CLIENTES: dict = {}
+_LOCK = asyncio.Lock()
+
+
+async def _obtener(nombre: str, fabrica):
+    """Devuelve el cliente 'nombre', creándolo con la corutina 'fabrica' la primera vez."""
+    cliente = _CLIENTES.get(nombre)
+    if cliente is not None:
+        return cliente
+    async with _LOCK:
+        cliente = _CLIENTES.get(nombre)
+        if cliente is None:
+            cliente = await fabrica()
+            _CLIENTES[nombre] = cliente
+        return cliente
+
+
+async def _crear_http():
+    if httpx is None:
+        raise RuntimeError("El modo ASGI requiere httpx (pip install httpx)")
+    limites = httpx.Limits(max_connections=HTTP_ASYNC_MAX_CONEXIONES,
+                           max_keepalive_connections=HTTP_ASYNC_MAX_CONEXIONES // 2)
+    return httpx.AsyncClient(limits=limites, timeout=httpx.Timeout(30.0, connect=10.0))
+
+
+async def obtener_http_async():
+    """httpx.AsyncClient keep-alive compartido (Azure Speech, OpenWeather)."""
+    return await _obtener("http", _crear_http)
+
+
+async def _crear_cosmos():
+    from azure.cosmos.aio import CosmosClient
+
+    return CosmosClient(AZURE_COSMOS_URL, AZURE_COSMOS_KEY)
+
+
+async def obtener_container_cosmos_async():
+    """ContainerProxy de azure.cosmos.aio sobre el mismo contenedor que cosmos_handler."""
+    cliente = await _obtener("cosmos", _crear_cosmos)
+    return cliente.get_database_client(AZURE_COSMOS_DATABASE_NAME).get_container_client(AZURE_COSMOS_DB_CONTAINER_NAME)
+
+
+async def _crear_blob():
+    from azure.storage.blob.aio import BlobServiceClient
+
+    return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+
+
+async def obtener_blob_service_async():
+    return await _obtener("blob", _crear_blob)
+
+
+async def _crear_container_blob(servicio):
+    from azure.core.exceptions import HttpResponseError, ResourceExistsError
+
+    container_client = servicio.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+    # Crear el contenedor si no existe (solo una vez por proceso)
+    try:
+        await container_client.create_container()
+    except ResourceExistsError:
+        pass
+    except HttpResponseError as e:
+        # Igual que client_registry: sin permiso de creación se sigue con el contenedor existente
+        print(f"[CLIENTES][WARN] No se pudo crear el contenedor '{AZURE_STORAGE_CONTAINER_NAME}': {e}")
+    return container_client
+
+
+async def obtener_container_blob_async():
+    """ContainerClient async del contenedor de audios (se verifica su existencia una sola vez)."""
+    # El servicio se obtiene antes: _obtener no es reentrante (asyncio.Lock)
+    servicio = await obtener_blob_service_async()
+    return await _obtener("blob_container", lambda: _crear_container_blob(servicio))
+
+
+async def cerrar_clientes_async():
+    """Cierra los clientes async (lifespan 'shutdown' del servidor ASGI)."""
+    async with _LOCK:
+        for nombre, cliente in list(_CLIENTES.items()):
+            if nombre == "blob_container":
+                continue  # comparte el transporte con "blob"
+            cerrar = getattr(cliente, "aclose", None) or getattr(cliente, "close", None)
+            try:
+                await cerrar()
+            except Exception as e:
+                print(f"[CLIENTES][WARN] No se pudo cerrar '{nombre}': {e}")
+        _CLIENTES.clear()
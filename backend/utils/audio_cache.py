@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# === CONFIGURACIÓN DEL CACHÉ DE AUDIO ===
+# Ruta base -> backend/
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(BASE_DIR, "esp32", "audio_cache"))
+CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "200"))
+
+# Archivo donde se registran los blobs ya subidos (clave -> url)
+BLOBS_INDEX = "blobs.json"
+EXTENSION = ".wav"
+# Caracteres de la clave que van en el nombre del blob (ver nombre_por_clave)
+CLAVE_EN_NOMBRE = 12
+
+
+def clave_audio(texto: str, voz: str, formato: str) -> str:
+    """Clave de contenido (sha256) para un audio: mismo texto + voz + formato => mismo audio."""
+    base = "\x1f".join([texto.strip(), voz, formato])
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def nombre_por_clave(nombre_blob: str, clave: str) -> str:
+    """
+    Nombre del blob con la clave de contenido: 'aspirina_0800.wav' -> 'aspirina_0800_<clave>.wav'
+    (y 'aspirina_0800.mp3' -> 'aspirina_0800_<clave>.mp3'). Dos mensajes distintos con el mismo
+    nombre sugerido no se pisan, y la URL registrada siempre apunta a su propio audio.
+    """
+    base, punto, extension = nombre_blob.partition(".")
+    return f"{base}_{clave[:CLAVE_EN_NOMBRE]}{punto}{extension}"
+
+
+class AudioCache:
+    """
+    Caché de audio direccionado por contenido con dos niveles:
+      - Disco local: archivos <clave>.wav con desalojo LRU por tamaño total.
+      - Registro de blobs: clave -> URL ya subida a Blob Storage (persistido en JSON).
+    """
+
+    def __init__(self, directorio: str, max_bytes: int):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[str, int]" = OrderedDict()  # clave -> tamaño (bytes)
+        self._total = 0
+        self._blobs: dict[str, str] = {}
+        self.stats = {"hits_disco": 0, "misses_disco": 0, "hits_blob": 0, "misses_blob": 0, "desalojos": 0}
+
+        os.makedirs(self.directorio, exist_ok=True)
+        self._cargar_disco()
+        self._cargar_blobs()
+
+    # ---------- Nivel disco ----------
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave + EXTENSION)
+
+    def _cargar_disco(self):
+        """Reconstruye el orden LRU desde el mtime de los archivos existentes."""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(EXTENSION):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, nombre[: -len(EXTENSION)], st.st_size))
+        for _, clave, tam in sorted(entradas):
+            self._lru[clave] = tam
+            self._total += tam
+
+    def leer(self, clave: str) -> bytes | None:
+        """Devuelve los bytes del audio si están en disco (y lo marca como usado)."""
+        with self._lock:
+            if clave not in self._lru:
+                self.stats["misses_disco"] += 1
+                return None
+            ruta = self._ruta(clave)
+            try:
+                with open(ruta, "rb") as f:
+                    data = f.read()
+                os.utime(ruta, None)
+            except OSError:
+                # El archivo desapareció por fuera del caché
+                self._total -= self._lru.pop(clave, 0)
+                self.stats["misses_disco"] += 1
+                return None
+            self._lru.move_to_end(clave)
+            self.stats["hits_disco"] += 1
+            return data
+
+    def contiene(self, clave: str) -> bool:
+        """True si el audio está en disco (sin marcarlo como usado)."""
+        with self._lock:
+            return clave in self._lru
+
+    def guardar(self, clave: str, data: bytes):
+        """Guarda el audio en disco y desaloja los menos usados si se excede el tamaño."""
+        if not data:
+            return
+        with self._lock:
+            ruta = self._ruta(clave)
+            tmp = ruta + ".tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, ruta)
+            except OSError as e:
+                print(f"[CACHE][WARN] No se pudo guardar audio {clave[:12]}: {e}")
+                return
+            self._total -= self._lru.pop(clave, 0)
+            self._lru[clave] = len(data)
+            self._total += len(data)
+            self._desalojar()
+
+    def _desalojar(self):
+        while self._total > self.max_bytes and len(self._lru) > 1:
+            clave, tam = self._lru.popitem(last=False)
+            self._total -= tam
+            self.stats["desalojos"] += 1
+            try:
+                os.remove(self._ruta(clave))
+            except OSError:
+                pass
+
+    # ---------- Registro de blobs ----------
+    def _cargar_blobs(self):
+        ruta = os.path.join(self.directorio, BLOBS_INDEX)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                blobs = json.load(f)
+            # Los registros de antes de nombre_por_clave pueden apuntar a un blob que otro mensaje
+            # con el mismo nombre sobrescribió: se descartan (el audio se vuelve a subir una vez)
+            self._blobs = {c: u for c, u in blobs.items() if f"_{c[:CLAVE_EN_NOMBRE]}." in u}
+        except FileNotFoundError:
+            self._blobs = {}
+        except (OSError, ValueError) as e:
+            print(f"[CACHE][WARN] Registro de blobs ilegible, se reinicia: {e}")
+            self._blobs = {}
+
+    def _persistir_blobs(self):
+        ruta = os.path.join(self.directorio, BLOBS_INDEX)
+        tmp = ruta + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._blobs, f)
+            os.replace(tmp, ruta)
+        except OSError as e:
+            print(f"[CACHE][WARN] No se pudo persistir registro de blobs: {e}")
+
+    def url_subida(self, clave: str) -> str | None:
+        """URL del blob si este audio ya fue subido antes."""
+        with self._lock:
+            url = self._blobs.get(clave)
+            self.stats["hits_blob" if url else "misses_blob"] += 1
+            return url
+
+    def registrar_subida(self, clave: str, url: str):
+        if not url:
+            return
+        with self._lock:
+            self._blobs[clave] = url
+            self._persistir_blobs()
+
+    def olvidar_subida(self, clave: str):
+        """Elimina el registro (p.ej. si el blob fue borrado en Azure)."""
+        with self._lock:
+            if self._blobs.pop(clave, None) is not None:
+                self._persistir_blobs()
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "archivos": len(self._lru),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "blobs_registrados": len(self._blobs),
+                **self.stats,
+            }
+
+
+# Instancia global para usar en toda la aplicación
+AUDIO_CACHE = AudioCache(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024)
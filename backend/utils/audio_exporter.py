@@ -1,27 +1,96 @@
 import os
-from config.config import AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
-
-
-def subir_a_blob(nombre_local, nombre_blob):
-
- # Crear cliente del servicio
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-    
-    # Crear cliente del contenedor
-    container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
-    
-    # Crear el contenedor si no existe
-    try:
-        container_client.create_container()
-    except Exception:
-        pass  # si ya existe, ignorar
-    
-    # Subir el archivo
+from config.config import AZURE_STORAGE_CONTAINER_NAME
+from utils.async_clients import obtener_blob_service_async, obtener_container_blob_async
+from utils.audio_cache import AUDIO_CACHE, nombre_por_clave
+from utils.audio_transcoder import VARIANTES, nombre_variante, transcodificar, variantes_disponibles
+from utils.client_registry import obtener_blob_service, obtener_container_blob
+
+
+def subir_a_blob(origen, nombre_blob, clave=None, content_type="audio/wav"):
+    """
+    Sube audio a Blob Storage y devuelve su URL pública.
+    'origen' puede ser la ruta de un archivo local, bytes, un objeto tipo archivo
+    o un iterador de chunks (p.ej. generar_audio(texto, stream=True)).
+    Si se pasa 'clave' (ver tts_generator.clave_tts), el nombre del blob la incluye
+    (nombre_por_clave) y la URL queda registrada en el caché de audio para que el mismo
+    mensaje no vuelva a sintetizarse ni subirse.
+    """
+    from azure.storage.blob import ContentSettings  # import pesado: recién al primer upload
+
+    if clave:
+        nombre_blob = nombre_por_clave(nombre_blob, clave)
+
+    # Clientes compartidos del proceso (el contenedor se verifica una sola vez)
+    blob_service_client = obtener_blob_service()
+    container_client = obtener_container_blob()
+
+    # Subir el audio (desde disco solo si 'origen' es una ruta)
     blob_client = container_client.get_blob_client(nombre_blob)
-    with open(nombre_local, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True)
-    
+    ajustes = ContentSettings(content_type=content_type)
+    if isinstance(origen, (str, os.PathLike)):
+        with open(origen, "rb") as data:
+            blob_client.upload_blob(data, overwrite=True, content_settings=ajustes)
+    else:
+        blob_client.upload_blob(origen, overwrite=True, content_settings=ajustes)
+
     # Generar la URL pública del blob
     url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_STORAGE_CONTAINER_NAME}/{nombre_blob}"
-    return url
\ No newline at end of file
+    if clave:
+        AUDIO_CACHE.registrar_subida(clave, url)
+    return url
+
+
+async def subir_a_blob_async(datos: bytes, nombre_blob, clave=None, content_type="audio/wav"):
+    """Versión async de subir_a_blob (modo ASGI) para audio ya en memoria. Devuelve la URL pública."""
+    from azure.storage.blob import ContentSettings
+
+    if clave:
+        nombre_blob = nombre_por_clave(nombre_blob, clave)
+    blob_service_client = await obtener_blob_service_async()
+    container_client = await obtener_container_blob_async()
+    await container_client.get_blob_client(nombre_blob).upload_blob(
+        datos, overwrite=True, content_settings=ContentSettings(content_type=content_type)
+    )
+    url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_STORAGE_CONTAINER_NAME}/{nombre_blob}"
+    if clave:
+        AUDIO_CACHE.registrar_subida(clave, url)
+    return url
+
+
+def subir_variantes(obtener_wav, nombre_blob, clave=None, variantes=None):
+    """
+    Genera y sube las variantes comprimidas del audio junto al original
+    ('olga_0800.wav' -> 'olga_0800.ulaw.wav', 'olga_0800.mp3', ...).
+    'obtener_wav' es una función que devuelve los bytes del WAV original; solo se llama
+    si falta alguna variante (con 'clave', las ya subidas se reutilizan del caché).
+    Devuelve { variante: url }; las variantes que fallan se omiten.
+    """
+    urls = {}
+    pendientes = []
+    for variante in variantes if variantes is not None else variantes_disponibles():
+        url = AUDIO_CACHE.url_subida(f"{clave}.{variante}") if clave else None
+        if url:
+            urls[variante] = url
+        else:
+            pendientes.append(variante)
+    if not pendientes:
+        return urls
+
+    wav_bytes = obtener_wav()
+    if not wav_bytes:
+        return urls
+    for variante in pendientes:
+        audio = transcodificar(wav_bytes, variante)
+        if not audio:
+            continue
+        try:
+            urls[variante] = subir_a_blob(
+                audio,
+                nombre_variante(nombre_blob, variante),
+                clave=f"{clave}.{variante}" if clave else None,
+                content_type=VARIANTES[variante][1],
+            )
+            print(f"[AUDIO] Variante {variante}: {len(audio)} bytes (original {len(wav_bytes)})")
+        except Exception as e:
+            print(f"[AUDIO][WARN] No se pudo subir la variante {variante}: {e}")
+    return urls
@@ -0,0 +1,129 @@
+import io
+import os
+import shutil
+import struct
+import subprocess
+import warnings
+import wave
+from typing import Dict, List, Optional, Tuple
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop  # stdlib hasta Python 3.12
+    except ImportError:
+        audioop = None
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# Variantes a generar junto al WAV original (las no disponibles se omiten)
+AUDIO_VARIANTES = [v.strip() for v in os.getenv("AUDIO_VARIANTES", "ulaw8k,mp3,opus").split(",") if v.strip()]
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFMPEG_TIMEOUT_SEG = int(os.getenv("FFMPEG_TIMEOUT_SEG", "30"))
+
+# variante -> (extensión del blob, content-type, herramienta)
+VARIANTES = {
+    "pcm8k": (".8k.wav", "audio/wav", "audioop"),       # PCM 16-bit 8 kHz (la mitad)
+    "ulaw8k": (".ulaw.wav", "audio/wav", "audioop"),    # G.711 u-law 8 kHz (una cuarta parte)
+    "mp3": (".mp3", "audio/mpeg", "ffmpeg"),            # MP3 24 kbps mono
+    "opus": (".opus", "audio/ogg", "ffmpeg"),           # Opus 16 kbps mono en Ogg
+}
+
+_FFMPEG_ARGS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "24k", "-f", "mp3"],
+    "opus": ["-c:a", "libopus", "-b:a", "16k", "-application", "voip", "-f", "ogg"],
+}
+
+WAVE_FORMAT_MULAW = 7
+
+
+def variantes_disponibles() -> List[str]:
+    """Variantes pedidas en AUDIO_VARIANTES que se pueden generar en esta máquina."""
+    hay_ffmpeg = shutil.which(FFMPEG_BIN) is not None
+    disponibles = []
+    for nombre in AUDIO_VARIANTES:
+        if nombre not in VARIANTES:
+            continue
+        herramienta = VARIANTES[nombre][2]
+        if (herramienta == "audioop" and audioop is not None) or (herramienta == "ffmpeg" and hay_ffmpeg):
+            disponibles.append(nombre)
+    return disponibles
+
+
+def _leer_wav(wav_bytes: bytes) -> Tuple[bytes, int, int, int]:
+    """(frames PCM, canales, bytes por muestra, frecuencia)."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+        return wav.readframes(wav.getnframes()), wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+
+
+def _a_8k_mono(wav_bytes: bytes) -> bytes:
+    """PCM 16-bit mono a 8 kHz."""
+    frames, canales, ancho, frecuencia = _leer_wav(wav_bytes)
+    if ancho != 2:
+        frames = audioop.lin2lin(frames, ancho, 2)
+    if canales == 2:
+        frames = audioop.tomono(frames, 2, 0.5, 0.5)
+    if frecuencia != 8000:
+        frames, _ = audioop.ratecv(frames, 2, 1, frecuencia, 8000, None)
+    return frames
+
+
+def _wav_pcm8k(wav_bytes: bytes) -> bytes:
+    salida = io.BytesIO()
+    with wave.open(salida, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(_a_8k_mono(wav_bytes))
+    return salida.getvalue()
+
+
+def _wav_ulaw8k(wav_bytes: bytes) -> bytes:
+    """WAV G.711 u-law (el módulo 'wave' solo escribe PCM, así que el header se arma a mano)."""
+    datos = audioop.lin2ulaw(_a_8k_mono(wav_bytes), 2)
+    fmt = struct.pack("<HHIIHHH", WAVE_FORMAT_MULAW, 1, 8000, 8000, 1, 8, 0)
+    return b"".join([
+        b"RIFF", struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(datos)), b"WAVE",
+        b"fmt ", struct.pack("<I", len(fmt)), fmt,
+        b"data", struct.pack("<I", len(datos)), datos,
+    ])
+
+
+def _ffmpeg(wav_bytes: bytes, variante: str) -> bytes:
+    comando = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+               "-ac", "1", *_FFMPEG_ARGS[variante], "pipe:1"]
+    resultado = subprocess.run(comando, input=wav_bytes, capture_output=True, timeout=FFMPEG_TIMEOUT_SEG)
+    if resultado.returncode != 0 or not resultado.stdout:
+        raise RuntimeError(resultado.stderr.decode("utf-8", errors="ignore")[:200] or "ffmpeg sin salida")
+    return resultado.stdout
+
+
+def transcodificar(wav_bytes: bytes, variante: str) -> Optional[bytes]:
+    """Convierte el WAV original a 'variante'. None si falla (el original sigue sirviendo)."""
+    try:
+        if variante == "pcm8k":
+            return _wav_pcm8k(wav_bytes)
+        if variante == "ulaw8k":
+            return _wav_ulaw8k(wav_bytes)
+        if variante in _FFMPEG_ARGS:
+            return _ffmpeg(wav_bytes, variante)
+        raise ValueError(f"Variante desconocida: {variante}")
+    except Exception as e:
+        print(f"[AUDIO][WARN] No se pudo generar la variante {variante}: {e}")
+        return None
+
+
+def nombre_variante(nombre_blob: str, variante: str) -> str:
+    """'olga_0800.wav' + 'mp3' -> 'olga_0800.mp3'."""
+    base = nombre_blob[:-4] if nombre_blob.lower().endswith(".wav") else nombre_blob
+    return base + VARIANTES[variante][0]
+
+
+def elegir_variante(url_original: Optional[str], variantes: Optional[Dict[str, str]],
+                    preferidas: List[str]) -> Optional[str]:
+    """URL de la primera variante de 'preferidas' que exista; si ninguna, la original."""
+    for nombre in preferidas:
+        if nombre in ("wav", "pcm16k"):
+            return url_original
+        if variantes and variantes.get(nombre):
+            return variantes[nombre]
+    return url_original
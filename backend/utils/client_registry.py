@@ -0,0 +1,110 @@
+import atexit
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.config import (
+    AZURE_STORAGE_CONNECTION_STRING,
+    AZURE_STORAGE_CONTAINER_NAME,
+    OPENAI_API_KEY,
+    TWILIO_ACCOUNT_SID,
+    TWILIO_AUTH_TOKEN,
+)
+
+# === Registro de clientes compartidos por todo el proceso ===
+# Cada cliente se construye una sola vez (perezosamente) y se reutiliza entre requests,
+# evitando el handshake TLS y la creación de objetos en cada llamada.
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+
+_CLIENTES: dict = {}
+_LOCK = threading.Lock()
+
+
+def _obtener(nombre: str, fabrica):
+    """Devuelve el cliente 'nombre', creándolo con 'fabrica' la primera vez (thread-safe)."""
+    cliente = _CLIENTES.get(nombre)
+    if cliente is not None:
+        return cliente
+    with _LOCK:
+        cliente = _CLIENTES.get(nombre)
+        if cliente is None:
+            cliente = fabrica()
+            _CLIENTES[nombre] = cliente
+        return cliente
+
+
+def _crear_sesion_http():
+    sesion = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+    sesion.mount("https://", adapter)
+    sesion.mount("http://", adapter)
+    return sesion
+
+
+def obtener_sesion_http() -> requests.Session:
+    """Session keep-alive con pool de conexiones (Azure Speech, OpenWeather, descargas)."""
+    return _obtener("http", _crear_sesion_http)
+
+
+def obtener_blob_service():
+    """BlobServiceClient único construido desde el connection string."""
+    from azure.storage.blob import BlobServiceClient
+
+    return _obtener(
+        "blob_service",
+        lambda: BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING),
+    )
+
+
+def _crear_container_blob():
+    from azure.core.exceptions import HttpResponseError, ResourceExistsError
+
+    container_client = obtener_blob_service().get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+    # Crear el contenedor si no existe (solo una vez por proceso)
+    try:
+        container_client.create_container()
+        print(f"[CLIENTES] Contenedor '{AZURE_STORAGE_CONTAINER_NAME}' creado")
+    except ResourceExistsError:
+        pass  # si ya existe, ignorar
+    except HttpResponseError as e:
+        # p.ej. una SAS sin permiso de creación: el contenedor puede existir igual, se sigue
+        print(f"[CLIENTES][WARN] No se pudo crear el contenedor '{AZURE_STORAGE_CONTAINER_NAME}': {e}")
+    return container_client
+
+
+def obtener_container_blob():
+    """ContainerClient del contenedor de audios (se verifica su existencia una sola vez)."""
+    return _obtener("blob_container", _crear_container_blob)
+
+
+def obtener_twilio():
+    """Cliente de Twilio reutilizable."""
+    from twilio.rest import Client
+
+    return _obtener("twilio", lambda: Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
+
+
+def obtener_openai():
+    """Cliente de OpenAI reutilizable (el paquete openai tarda casi un segundo en importarse)."""
+    from openai import OpenAI
+
+    return _obtener("openai", lambda: OpenAI(api_key=OPENAI_API_KEY))
+
+
+def cerrar_clientes():
+    """Cierra los clientes que mantienen conexiones abiertas (al apagar el proceso)."""
+    with _LOCK:
+        for nombre, cliente in list(_CLIENTES.items()):
+            cerrar = getattr(cliente, "close", None)
+            if callable(cerrar):
+                try:
+                    cerrar()
+                except Exception as e:
+                    print(f"[CLIENTES][WARN] No se pudo cerrar '{nombre}': {e}")
+        _CLIENTES.clear()
+
+
+atexit.register(cerrar_clientes)
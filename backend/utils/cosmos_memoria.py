@@ -0,0 +1,136 @@
+import copy
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from azure.cosmos import exceptions
+
+# Contenedor de Cosmos DB en memoria para pruebas locales (sin credenciales ni red).
+# Implementa solo lo que usa el backend: CRUD por id + partition key ('quien'),
+# consultas simples (igualdades unidas con AND) y el change feed en modo "latest version".
+
+_IGUALDAD = re.compile(r"c\.(\w+)\s*=\s*(@\w+|'[^']*'|true|false|\d+)", re.IGNORECASE)
+
+
+class _PaginasFeed:
+    """Imita el pager de ItemPaged.by_page(): itera páginas y expone 'continuation_token'."""
+
+    def __init__(self, paginas: List[List[dict]], token: str):
+        self._paginas = iter(paginas)
+        self.continuation_token = token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return iter(next(self._paginas))
+
+
+class _Feed:
+    def __init__(self, items: List[dict], token: str, tam_pagina: int):
+        self._items = items
+        self._token = token
+        self._tam = max(1, tam_pagina)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def by_page(self, continuation_token: Optional[str] = None):
+        paginas = [self._items[i:i + self._tam] for i in range(0, len(self._items), self._tam)]
+        return _PaginasFeed(paginas, self._token)
+
+
+class ContenedorMemoria:
+    """Sustituto de ContainerProxy con partition key '/quien'."""
+
+    def __init__(self, documentos: Optional[List[dict]] = None):
+        self._docs: Dict[tuple, dict] = {}
+        self._log: List[tuple] = []   # (lsn, clave) en orden de modificación
+        self._lock = threading.Lock()
+        for doc in documentos or []:
+            self.upsert_item(doc)
+
+    def _registrar(self, doc: dict):
+        clave = (doc.get("quien"), doc["id"])
+        doc["_ts"] = int(time.time())
+        self._docs[clave] = doc
+        self._log.append((len(self._log) + 1, clave))
+
+    def create_item(self, body: dict, **kwargs) -> dict:
+        with self._lock:
+            if (body.get("quien"), body["id"]) in self._docs:
+                raise exceptions.CosmosResourceExistsError(message=f"Ya existe id={body['id']}")
+            self._registrar(copy.deepcopy(body))
+        return copy.deepcopy(body)
+
+    def upsert_item(self, body: dict, **kwargs) -> dict:
+        with self._lock:
+            self._registrar(copy.deepcopy(body))
+        return copy.deepcopy(body)
+
+    def replace_item(self, item, body: dict, **kwargs) -> dict:
+        item_id = item.get("id") if isinstance(item, dict) else item
+        with self._lock:
+            if (body.get("quien"), item_id) not in self._docs:
+                raise exceptions.CosmosResourceNotFoundError(message=f"No existe id={item_id}")
+            self._registrar(copy.deepcopy(body))
+        return copy.deepcopy(body)
+
+    def read_item(self, item, partition_key, **kwargs) -> dict:
+        with self._lock:
+            doc = self._docs.get((partition_key, item))
+        if doc is None:
+            raise exceptions.CosmosResourceNotFoundError(message=f"No existe id={item}")
+        return copy.deepcopy(doc)
+
+    def delete_item(self, item, partition_key, **kwargs):
+        with self._lock:
+            # Igual que Cosmos en modo "latest version": los borrados no aparecen en el change feed
+            if self._docs.pop((partition_key, item), None) is None:
+                raise exceptions.CosmosResourceNotFoundError(message=f"No existe id={item}")
+
+    def query_items(self, query: str, parameters=None, partition_key=None, **kwargs) -> List[dict]:
+        """Soporta 'SELECT * FROM c WHERE c.a = @x AND c.b = true ...' (solo igualdades)."""
+        params = {p["name"]: p["value"] for p in (parameters or [])}
+        filtros = []
+        for campo, valor in _IGUALDAD.findall(query):
+            if valor.startswith("@"):
+                valor = params.get(valor)
+            elif valor.startswith("'"):
+                valor = valor[1:-1]
+            elif valor.lower() in ("true", "false"):
+                valor = valor.lower() == "true"
+            else:
+                valor = int(valor)
+            filtros.append((campo, valor))
+        with self._lock:
+            docs = [
+                copy.deepcopy(d) for (quien, _), d in self._docs.items()
+                if (partition_key is None or quien == partition_key)
+                and all(d.get(campo) == valor for campo, valor in filtros)
+            ]
+        return docs
+
+    def query_items_change_feed(self, continuation: Optional[str] = None, start_time=None,
+                                max_item_count: int = 100, **kwargs) -> _Feed:
+        """
+        Cambios posteriores a 'continuation' (o desde 'start_time': "Beginning" | "Now").
+        Devuelve la última versión de cada documento modificado, en orden de modificación.
+        """
+        with self._lock:
+            ultimo = len(self._log)
+            if continuation is not None:
+                desde = int(continuation)
+            elif start_time == "Beginning":
+                desde = 0
+            else:
+                desde = ultimo
+            vistos, items = set(), []
+            for _, clave in reversed(self._log[desde:]):
+                if clave in vistos or clave not in self._docs:
+                    continue
+                vistos.add(clave)
+                items.append(copy.deepcopy(self._docs[clave]))
+        items.reverse()
+        return _Feed(items, str(ultimo), max_item_count or 100)
@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import json
+import os
+import struct
+import uuid
+from typing import Any, List, Optional
+
+from utils.ttl_cache import TTLCache
+
+try:
+    import msgpack  # opcional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+# Codificaciones que ofrece el blueprint del ESP32 (negociadas con el header Accept).
+#
+# Binario ("application/x-mediamigo-bin"), little-endian, registros de tamaño fijo:
+#   cabecera (5 bytes): b"MA" | version u8 (=1) | cantidad u16
+#   registro (64 bytes):
+#     minuto del día u16 | id uuid 16 bytes | audio_id 6 bytes |
+#     quien char[16] | medicamento char[24]   (UTF-8, rellenado con 0, recortado)
+# El audio se pide aparte con GET /api/esp32/audio/<audio_id> (12 caracteres hex).
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+BINARIO = "application/x-mediamigo-bin"
+
+GZIP_MIN_BYTES = int(os.getenv("ESP32_GZIP_MIN_BYTES", "512"))
+AUDIO_ID_BYTES = 6
+
+_CABECERA = struct.Struct("<2sBH")
+_REGISTRO = struct.Struct("<H16s6s16s24s")
+
+# audio_id -> URL del blob (se llena al codificar; ver resolver_audio)
+_AUDIOS = TTLCache(max_items=int(os.getenv("ESP32_AUDIO_IDS_MAX", "20000")), ttl_seg=30 * 24 * 3600)
+
+
+def formatos_disponibles() -> List[str]:
+    """JSON primero: es lo que recibe un cliente que manda 'Accept: */*'."""
+    formatos = [JSON, BINARIO]
+    if msgpack is not None:
+        formatos.insert(1, MSGPACK)
+    return formatos
+
+
+def id_audio(url: Optional[str]) -> Optional[str]:
+    """ID corto y estable de un audio (12 hex). Queda registrado para resolver_audio."""
+    if not url:
+        return None
+    audio_id = hashlib.sha256(url.encode("utf-8")).hexdigest()[:AUDIO_ID_BYTES * 2]
+    _AUDIOS.set(audio_id, url)
+    return audio_id
+
+
+def resolver_audio(audio_id: str) -> Optional[str]:
+    return _AUDIOS.get((audio_id or "").lower())
+
+
+def compactar(entrada: dict) -> dict:
+    """Recordatorio con claves cortas, sin 'mensaje' y con audio_id en vez de audio_url."""
+    return {
+        "i": entrada.get("id") or entrada.get("recordatorio_id"),
+        "q": entrada.get("quien"),
+        "h": entrada.get("hora"),
+        "m": entrada.get("medicamento"),
+        "a": id_audio(entrada.get("audio_url")),
+    }
+
+
+def _compactar_datos(datos: Any) -> Any:
+    """Compacta un recordatorio, una lista de ellos o las listas de un delta {cambios, recordatorios, ...}."""
+    if isinstance(datos, list):
+        return [compactar(e) for e in datos]
+    if isinstance(datos, dict) and "audio_url" in datos:
+        return compactar(datos)
+    if isinstance(datos, dict):
+        return {k: _compactar_datos(v) if k in ("cambios", "recordatorios") else v for k, v in datos.items()}
+    return datos
+
+
+def _texto_fijo(texto: Optional[str], largo: int) -> bytes:
+    crudo = (texto or "").encode("utf-8")[:largo]
+    # No dejar un carácter multibyte cortado a la mitad
+    return crudo.decode("utf-8", errors="ignore").encode("utf-8").ljust(largo, b"\0")
+
+
+def _id_binario(rec_id: Optional[str]) -> bytes:
+    try:
+        return uuid.UUID(str(rec_id)).bytes
+    except ValueError:
+        return _texto_fijo(rec_id, 16)
+
+
+def _binario(entradas: List[dict]) -> bytes:
+    partes = [_CABECERA.pack(b"MA", 1, len(entradas))]
+    for e in entradas:
+        try:
+            hora, minuto = str(e.get("hora") or "0:0").split(":")[:2]
+            minuto_dia = int(hora) * 60 + int(minuto)
+        except ValueError:
+            minuto_dia = 0xFFFF  # hora inválida: el firmware la ignora
+        audio_id = id_audio(e.get("audio_url"))
+        partes.append(_REGISTRO.pack(
+            minuto_dia,
+            _id_binario(e.get("id") or e.get("recordatorio_id")),
+            bytes.fromhex(audio_id) if audio_id else b"\0" * AUDIO_ID_BYTES,
+            _texto_fijo(e.get("quien"), 16),
+            _texto_fijo(e.get("medicamento"), 24),
+        ))
+    return b"".join(partes)
+
+
+def codificar(datos: Any, formato: str, compacto: bool = False) -> bytes:
+    """
+    Serializa 'datos' (lista de recordatorios o dict) en 'formato'.
+    MessagePack y binario siempre van compactos; JSON solo si 'compacto'.
+    El binario solo admite listas de recordatorios (ValueError si no).
+    """
+    if formato == BINARIO:
+        if not isinstance(datos, list):
+            raise ValueError("El formato binario solo admite listas de recordatorios")
+        return _binario(datos)
+    if formato == MSGPACK:
+        return msgpack.packb(_compactar_datos(datos), use_bin_type=True)
+    if compacto:
+        datos = _compactar_datos(datos)
+        return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(datos, ensure_ascii=False).encode("utf-8")
+
+
+def comprimir(body: bytes, accept_encoding: str) -> tuple:
+    """(body, gzip_aplicado). Solo comprime si el cliente acepta gzip y vale la pena."""
+    if len(body) < GZIP_MIN_BYTES or "gzip" not in (accept_encoding or "").lower():
+        return body, False
+    return gzip.compress(body, compresslevel=6), True
@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from utils.ttl_cache import TTLCache
+
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+FRASE_CACHE_MAX = int(os.getenv("FRASE_CACHE_MAX", "2000"))
+FRASE_CACHE_TTL_SEG = int(os.getenv("FRASE_CACHE_TTL_SEG", str(7 * 24 * 3600)))
+# Ruta del archivo SQLite para que el caché sobreviva reinicios (vacío = solo memoria)
+FRASE_CACHE_DB = os.getenv("FRASE_CACHE_DB", "")
+
+# Campos relativos a la fecha de procesamiento: nunca se guardan, los recalcula date_calculator
+CAMPOS_VOLATILES = ("fecha_inicio", "fecha_fin")
+
+
+def normalizar_frase(frase: str) -> str:
+    """Clave del caché: minúsculas, sin acentos, espacios colapsados y sin puntuación final."""
+    texto = unicodedata.normalize("NFD", (frase or "").lower())
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    texto = " ".join(texto.split())
+    return re.sub(r"[\s.!?¡¿]+$", "", texto)
+
+
+class FraseCache:
+    """
+    Memoización de frase -> JSON del recordatorio.
+    Nivel 1: TTLCache en memoria (TTL + LRU). Nivel 2 opcional: SQLite persistente.
+    """
+
+    def __init__(self, max_items: int, ttl_seg: int, ruta_db: str = ""):
+        self.memoria = TTLCache(max_items=max_items, ttl_seg=ttl_seg)
+        self.ttl_seg = ttl_seg
+        self._db = None
+        self._db_lock = threading.Lock()
+        # Contadores por nivel: un hit de SQLite no cuenta como miss del caché
+        self._stats_lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_db = 0
+        self.misses = 0
+        if ruta_db:
+            try:
+                self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS frases (clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM frases WHERE expira < ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[FRASE_CACHE][WARN] SQLite deshabilitado ({ruta_db}): {e}")
+                self._db = None
+
+    def _contar(self, nivel: str):
+        with self._stats_lock:
+            setattr(self, nivel, getattr(self, nivel) + 1)
+
+    def get(self, frase: str) -> str | None:
+        clave = normalizar_frase(frase)
+        valor = self.memoria.get(clave)
+        if valor is not None:
+            self._contar("hits_memoria")
+            return valor
+        if self._db is None:
+            self._contar("misses")
+            return None
+        with self._db_lock:
+            try:
+                fila = self._db.execute(
+                    "SELECT valor, expira FROM frases WHERE clave = ?", (clave,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"[FRASE_CACHE][WARN] Lectura SQLite falló: {e}")
+                fila = None
+        if not fila or fila[1] < time.time():
+            self._contar("misses")
+            return None
+        self._contar("hits_db")
+        self.memoria.set(clave, fila[0], ttl_seg=fila[1] - time.time())
+        return fila[0]
+
+    def set(self, frase: str, json_str: str):
+        """Guarda el JSON (sin campos de fecha). Ignora respuestas que no sean un objeto JSON."""
+        try:
+            datos = json.loads(json_str)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(datos, dict) or datos.get("error"):
+            return
+        for campo in CAMPOS_VOLATILES:
+            datos.pop(campo, None)
+        valor = json.dumps(datos, ensure_ascii=False)
+        clave = normalizar_frase(frase)
+        self.memoria.set(clave, valor)
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO frases (clave, valor, expira) VALUES (?, ?, ?)",
+                    (clave, valor, time.time() + self.ttl_seg),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[FRASE_CACHE][WARN] Escritura SQLite falló: {e}")
+
+    def stats(self) -> dict:
+        """hit_rate = frases resueltas por cualquiera de los dos niveles."""
+        memoria = self.memoria.stats()
+        with self._stats_lock:
+            hits_memoria, hits_db, misses = self.hits_memoria, self.hits_db, self.misses
+        total = hits_memoria + hits_db + misses
+        return {
+            "items": memoria["items"],
+            "max_items": memoria["max_items"],
+            "ttl_seg": memoria["ttl_seg"],
+            "hits_memoria": hits_memoria,
+            "hits_sqlite": hits_db,
+            "misses": misses,
+            "hit_rate": round((hits_memoria + hits_db) / total, 3) if total else None,
+            "sqlite": self._db is not None,
+        }
+
+
+# Instancia global para usar en toda la aplicación
+FRASE_CACHE = FraseCache(FRASE_CACHE_MAX, FRASE_CACHE_TTL_SEG, FRASE_CACHE_DB)
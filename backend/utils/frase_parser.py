@@ -0,0 +1,262 @@
+import re
+import unicodedata
+
+# Parser por reglas para las frases más comunes, p.ej.:
+#   "Olga toma ibuprofeno a las 8 a.m. todos los días"
+#   "Mi abuela debe tomar aspirina 100 mg a las ocho de la noche, lunes a viernes, durante 5 días"
+# Devuelve el mismo esquema que el LLM (ver llm_handler.PROMPT_INICIAL) y una confianza 0..1.
+
+DIAS_SEMANA = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+
+NUMEROS = {
+    "un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12, "trece": 13,
+    "catorce": 14, "quince": 15, "veinte": 20, "treinta": 30,
+}
+HORAS_PALABRAS = {v: k for k, v in NUMEROS.items() if 1 <= v <= 12 and k not in ("un", "uno")}
+
+PARENTESCOS = {
+    "abuela", "abuelo", "mama", "papa", "madre", "padre", "tia", "tio", "esposa", "esposo",
+    "hermana", "hermano", "suegra", "suegro", "hija", "hijo", "senora", "senor", "paciente",
+}
+
+# Palabras que suelen indicar frases que el parser no cubre bien (se delegan al LLM)
+COMPLEJAS = re.compile(
+    r"\b(antes|despues|cuando|si|excepto|menos los|salvo|ayunas|comida|almuerzo|cena|desayuno|"
+    r"alterna|alternar|semana por medio|dia por medio|hasta|desde|a partir del?)\b"
+)
+
+VERBOS_TOMAR = r"(?:debe\s+tomar(?:se)?|tiene\s+que\s+tomar|toma|tomara|se\s+toma|necesita\s+tomar|usa|se\s+aplica)"
+ARTICULOS = {"el", "la", "los", "las", "su", "sus", "un", "una", "unas", "unos", "de", "del"}
+# Cantidades ("media pastilla", "dos tabletas"): no son parte del nombre
+CANTIDADES = {"media", "medio", "mitad", "cuarto", "doble"} | set(NUMEROS)
+GENERICOS = {"pastilla", "pastillas", "tableta", "tabletas", "capsula", "capsulas", "medicina", "medicamento", "jarabe", "gotas"}
+# Palabras que cortan el nombre del medicamento ("vitamina d a las 8", "ibuprofeno todos los días")
+FIN_MEDICAMENTO = {
+    "a", "al", "cada", "todos", "todas", "durante", "por", "de", "del", "el", "la", "los", "las",
+    "y", "en", "con", "para", "diario", "diariamente", "mg", "ml", "hoy", "manana",
+    "lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo", "fines", "fin",
+}
+
+_NUM = r"(\d{1,2}|" + "|".join(sorted(NUMEROS, key=len, reverse=True)) + r")"
+
+
+def _sin_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+
+def _a_numero(token: str) -> int | None:
+    if token.isdigit():
+        return int(token)
+    return NUMEROS.get(token)
+
+
+def _buscar_quien(original: str, norm: str) -> tuple[str | None, float]:
+    m = re.match(r"\s*(?:mi|mis|el|la|don|dona)?\s*([a-zñ]+)\s+" + VERBOS_TOMAR + r"\b", norm)
+    if not m:
+        return None, 0.0
+    palabra = m.group(1)
+    inicio, fin = m.span(1)
+    texto_original = original[inicio:fin]  # conserva mayúsculas/acentos del usuario
+    if palabra in PARENTESCOS:
+        return texto_original.lower(), 1.0
+    if texto_original[:1].isupper():
+        return texto_original, 1.0
+    return texto_original, 0.6
+
+
+def _buscar_medicamento(norm_original: str, norm: str) -> tuple[str | None, float]:
+    m = re.search(VERBOS_TOMAR + r"\s+(.+)", norm)
+    if not m:
+        return None, 0.0
+    inicio = m.start(1)
+    generico = False
+    a = b = None
+    for tok in re.finditer(r"[a-zñ0-9]+", norm[inicio:]):
+        palabra = tok.group(0)
+        if a is not None:
+            # Nombres de varias palabras ("vitamina d", "ácido fólico") hasta un corte o una dosis
+            separador = norm[b:inicio + tok.start()]
+            if separador.strip() or palabra in FIN_MEDICAMENTO or palabra[0].isdigit():
+                break
+            b = inicio + tok.end()
+            continue
+        if palabra in ARTICULOS or palabra in CANTIDADES or palabra.isdigit():
+            continue
+        if palabra in GENERICOS:
+            generico = True  # "la pastilla de la presión": el nombre real es ambiguo
+            continue
+        if palabra in ("a", "cada", "todos", "durante", "por"):
+            return None, 0.0
+        a, b = inicio + tok.start(), inicio + tok.end()
+    if a is None:
+        return None, 0.0
+    nombre = norm_original[a:b].lower()
+    if generico:
+        return nombre, 0.5
+    # Más de dos palabras suele ser texto que el parser no entendió: mejor que decida el LLM
+    return nombre, 1.0 if len(nombre.split()) <= 2 else 0.6
+
+
+def _buscar_hora(norm: str) -> tuple[str | None, float]:
+    """Devuelve ('HH:MM', confianza). Si hay más de una hora, confianza baja (schema tiene una sola)."""
+    if "mediodia" in norm:
+        return "12:00", 1.0
+    if "medianoche" in norm:
+        return "00:00", 1.0
+
+    patron = re.compile(
+        r"(?:a\s+las?\s+)?\b" + _NUM + r"(?:\s*[:h]\s*(\d{2}))?"
+        r"(?:\s+y\s+(media|cuarto|quince|treinta))?"
+        r"\s*(a\.?\s*m\.?|p\.?\s*m\.?|de\s+la\s+(?:manana|tarde|noche|madrugada)|hrs?\b|horas\b)?"
+    )
+    encontrados = []
+    for m in patron.finditer(norm):
+        prefijo = norm[max(0, m.start() - 6):m.start()]
+        tiene_a_las = m.group(0).startswith("a la")
+        periodo = (m.group(4) or "").replace(" ", "").replace(".", "")
+        if not tiene_a_las and not periodo and not m.group(2):
+            continue  # un número suelto (p.ej. "100 mg", "durante 5 días") no es una hora
+        if periodo in ("horas", "hr", "hrs") and ("cada" in prefijo or not tiene_a_las):
+            continue  # "cada 8 horas"
+        hora = _a_numero(m.group(1))
+        if hora is None or hora > 24:
+            continue
+        minuto = int(m.group(2)) if m.group(2) else 0
+        if m.group(3) in ("media", "treinta"):
+            minuto = 30
+        elif m.group(3) in ("cuarto", "quince"):
+            minuto = 15
+        if minuto > 59:
+            continue
+
+        if periodo.startswith("pm") or periodo in ("delatarde", "delanoche"):
+            if hora < 12:
+                hora += 12
+            elif periodo == "delanoche" and hora == 12:
+                hora = 0
+        elif periodo.startswith("am") or periodo in ("delamanana", "delamadrugada"):
+            if hora == 12:
+                hora = 0
+        hora = hora % 24
+        if periodo or m.group(2) or hora >= 13:
+            confianza = 1.0
+        else:
+            # "a las ocho": se asume a.m., pero queda por debajo de PARSER_UMBRAL y decide el LLM
+            confianza = 0.8 if tiene_a_las else 0.75
+        encontrados.append((f"{hora:02d}:{minuto:02d}", confianza))
+
+    if not encontrados:
+        return None, 0.0
+    if len({h for h, _ in encontrados}) > 1:
+        return encontrados[0][0], 0.3
+    return encontrados[0]
+
+
+def _buscar_dias(norm: str) -> tuple[list[str], float]:
+    if re.search(r"\b(todos\s+los\s+dias|diario|diariamente|cada\s+dia|a\s+diario)\b", norm):
+        return ["todos"], 1.0
+    if re.search(r"\bfines?\s+de\s+semana\b", norm):
+        return ["sábado", "domingo"], 1.0
+
+    sin_acento = [_sin_acentos(d) for d in DIAS_SEMANA]
+    # "lunes a viernes", "de lunes a viernes", "del lunes al viernes"
+    rango = re.search(r"\b(?:del?\s+)?(" + "|".join(sin_acento) + r")\s+al?\s+(" + "|".join(sin_acento) + r")\b", norm)
+    if rango:
+        i, j = sin_acento.index(rango.group(1)), sin_acento.index(rango.group(2))
+        if i <= j:
+            return DIAS_SEMANA[i:j + 1], 1.0
+        return DIAS_SEMANA[i:] + DIAS_SEMANA[:j + 1], 1.0
+
+    presentes = [DIAS_SEMANA[i] for i, d in enumerate(sin_acento) if re.search(r"\b" + d + r"\b", norm)]
+    if presentes:
+        return presentes, 1.0
+    # Sin días explícitos => diario (mismo criterio que el ejemplo del prompt)
+    return ["todos"], 0.9
+
+
+def _buscar_duracion(norm: str) -> tuple[int, float]:
+    m = re.search(r"\b(?:durante|por)\s+" + _NUM + r"\s+(dias?|semanas?|mes(?:es)?)\b", norm)
+    if not m:
+        if re.search(r"\b(?:durante|por)\s+(?:una\s+)?semana\b", norm):
+            return 7, 1.0
+        if re.search(r"\b(?:durante|por)\b.*\b(dias?|semanas?|mes(?:es)?)\b", norm):
+            return 0, 0.3  # hay una duración que no se pudo interpretar
+        return 0, 1.0
+    n = _a_numero(m.group(1)) or 0
+    unidad = m.group(2)
+    if unidad.startswith("semana"):
+        n *= 7
+    elif unidad.startswith("mes"):
+        n *= 30
+    return n, 1.0
+
+
+def _buscar_frecuencia(norm_original: str, norm: str) -> str:
+    m = re.search(r"\bcada\s+" + _NUM + r"\s+horas?\b", norm)
+    if m:
+        return norm_original[m.start():m.end()]
+    m = re.search(r"\b" + _NUM + r"\s+veces\s+al\s+dia\b", norm)
+    if m:
+        return norm_original[m.start():m.end()]
+    return "una vez al día"
+
+
+def _hora_en_palabras(hhmm: str) -> str:
+    hora, minuto = map(int, hhmm.split(":"))
+    h12 = hora % 12 or 12
+    base = "es la una" if h12 == 1 else f"son las {HORAS_PALABRAS[h12]}"
+    if minuto == 0:
+        return base
+    if minuto == 30:
+        return base + " y media"
+    if minuto == 15:
+        return base + " y cuarto"
+    return f"{base} y {minuto}"
+
+
+def _nombre_archivo(medicamento: str, hhmm: str) -> str:
+    limpio = re.sub(r"[^a-z0-9]+", "_", _sin_acentos(medicamento.lower())).strip("_")
+    return f"{limpio}_{hhmm.replace(':', '')}.wav"
+
+
+def parsear_frase(frase: str) -> tuple[dict | None, float]:
+    """
+    Intenta extraer el recordatorio sin LLM.
+    Devuelve (datos, confianza). 'datos' tiene el mismo esquema que devuelve el LLM
+    (quien, hora, medicamento, mensaje, audio_filename, frecuencia, dias, duracion_dias)
+    o es None si faltan campos obligatorios.
+    """
+    if not frase or not frase.strip():
+        return None, 0.0
+    original = " ".join(unicodedata.normalize("NFC", frase).strip().split())
+    # Misma longitud que 'original' para poder recortar el texto del usuario por posiciones
+    norm_original = original.lower()
+    norm = _sin_acentos(norm_original)
+
+    quien, c_quien = _buscar_quien(original, norm)
+    medicamento, c_med = _buscar_medicamento(norm_original, norm)
+    hora, c_hora = _buscar_hora(norm)
+    if not (quien and medicamento and hora):
+        return None, 0.0
+
+    dias, c_dias = _buscar_dias(norm)
+    duracion_dias, c_dur = _buscar_duracion(norm)
+    frecuencia = _buscar_frecuencia(norm_original, norm)
+
+    confianza = min(c_quien, c_med, c_hora, c_dias, c_dur)
+    if COMPLEJAS.search(norm):
+        confianza = min(confianza, 0.4)
+
+    nombre = quien[:1].upper() + quien[1:]
+    datos = {
+        "quien": quien,
+        "hora": hora,
+        "medicamento": medicamento,
+        "mensaje": f"{nombre}, {_hora_en_palabras(hora)}. Hora de tomar {medicamento}.",
+        "audio_filename": _nombre_archivo(medicamento, hora),
+        "frecuencia": frecuencia,
+        "dias": dias,
+        "duracion_dias": duracion_dias,
+    }
+    return datos, round(confianza, 2)
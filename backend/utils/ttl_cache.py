@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    Caché en memoria con expiración por tiempo (TTL) y desalojo LRU por cantidad de items.
+    Thread-safe. Lleva contadores de aciertos/fallos para monitoreo.
+    """
+
+    def __init__(self, max_items: int = 1000, ttl_seg: float = 3600):
+        self.max_items = max_items
+        self.ttl_seg = ttl_seg
+        self._datos: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()  # clave -> (expira, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave: Hashable, default: Any = None) -> Any:
+        """Devuelve el valor si existe y no venció; si no, 'default'."""
+        ahora = time.time()
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None or item[0] < ahora:
+                if item is not None:
+                    del self._datos[clave]
+                self.misses += 1
+                return default
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return item[1]
+
+    def set(self, clave: Hashable, valor: Any, ttl_seg: float | None = None):
+        expira = time.time() + (self.ttl_seg if ttl_seg is None else ttl_seg)
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave: Hashable):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._datos),
+                "max_items": self.max_items,
+                "ttl_seg": self.ttl_seg,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
@@ -1,10 +1,28 @@
 import os
 
-import requests
 from config.config import AZURE_SPEECH_KEY
+from utils.async_clients import obtener_http_async
+from utils.audio_cache import AUDIO_CACHE, clave_audio
+from utils.client_registry import obtener_sesion_http
 
+VOZ = "es-CR-MariaNeural"
+FORMATO = "riff-16khz-16bit-mono-pcm" #representa un archivo de tipo wav
+CHUNK_SIZE = 16 * 1024
 
-def generar_audio(texto, nombre_archivo):
+
+def clave_tts(texto):
+    """Clave de caché del audio que generaría este texto con la voz y formato actuales."""
+    return clave_audio(texto, VOZ, FORMATO)
+
+
+def _escribir_wav(nombre_archivo, data):
+    nombre_archivo_final = nombre_archivo if nombre_archivo.endswith(".wav") else nombre_archivo + ".wav"
+    with open(nombre_archivo_final, "wb") as audio_file:
+        audio_file.write(data)
+
+
+def _peticion_tts(texto):
+    """(endpoint, headers, cuerpo SSML) de la llamada a Azure TTS."""
     region = "eastus2"
     endpoint_url = "https://" + region + ".tts.speech.microsoft.com/cognitiveservices/v1"
 
@@ -12,44 +30,117 @@ def generar_audio(texto, nombre_archivo):
     headers = {
         "Ocp-Apim-Subscription-Key": AZURE_SPEECH_KEY,
         "Content-Type": "application/ssml+xml",
-        "X-Microsoft-OutputFormat": "riff-16khz-16bit-mono-pcm" #representa un archivo de tipo wav
+        "X-Microsoft-OutputFormat": FORMATO
     }
 
-    #Si el texto está vacío, se cancela la generacion del archivo
-    if not texto.strip():
-        print("Texto vacío. Cancelando generación.")
-        return False
-
     #Configurar la voz de azure a femenina en español
     ssml = (
         "<speak version='1.0' xml:lang='es-ES'>"
-        "<voice xml:lang='es-ES' xml:gender='Female' name='es-CR-MariaNeural'>"
+        f"<voice xml:lang='es-ES' xml:gender='Female' name='{VOZ}'>"
         f"{texto}"
         "</voice></speak>"
     )
+    return endpoint_url, headers, ssml.encode("utf-8")
+
 
-    response = requests.post(endpoint_url, headers=headers, data=ssml.encode("utf-8"))
+def _sintetizar(texto, stream=False):
+    """Llama a Azure TTS. Devuelve la respuesta HTTP si es audio válido, o None."""
+    endpoint_url, headers, cuerpo = _peticion_tts(texto)
+    response = obtener_sesion_http().post(endpoint_url, headers=headers, data=cuerpo, stream=stream)
 
     #Para debuggear el endpoint
     #print("Endpoint cargado:", endpoint_url)
     #print("Content-Type recibido:", response.headers.get("Content-Type", "No definido"))
 
-    #Si azure devuelve 200 (success) se crea el archivo
+    #Si azure devuelve 200 (success) y el contenido es audio, se acepta la respuesta
     if response.status_code == 200:
         content_type = response.headers.get("Content-Type", "")
         if content_type.startswith("audio/"):
-            nombre_archivo_final = nombre_archivo if nombre_archivo.endswith(".wav") else nombre_archivo + ".wav"
-            with open(nombre_archivo_final, "wb") as audio_file:
-                audio_file.write(response.content)
-                print("Audio generado correctamente")
+            return response
+        print("Azure respondió con contenido NO de audio. No se guarda el archivo.")
+        print("Contenido recibido (primeros 200 caracteres):") #Para debuggear el contenido generado por Azure
+        print(response.text[:200]) #Imprime los primero 200 caracteres del contenido del archivo
+        return None
+    #Si azure no devuelve 200 (success), no se genera el audio y muestra el error para informacion del usuario
+    print(f"Error generando audio: Respuesta: {response.text}")
+    print(f"Error generando audio: Código: {response.status_code}")
+    return None
+
+
+def _stream_y_cachear(response, clave):
+    """Entrega el audio por chunks y al terminar lo guarda completo en el caché."""
+    partes = []
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                partes.append(chunk)
+                yield chunk
+    finally:
+        response.close()
+    AUDIO_CACHE.guardar(clave, b"".join(partes))
+    print("Audio generado correctamente")
+
+
+def generar_audio(texto, nombre_archivo=None, stream=False):
+    """
+    Convierte 'texto' en audio WAV con Azure TTS (reutilizando el caché si existe).
+      - nombre_archivo: escribe el WAV en disco y devuelve True/False (modo original).
+      - sin nombre_archivo: devuelve los bytes del audio, o None si falló.
+      - stream=True (sin nombre_archivo): devuelve un iterador de chunks de bytes, o None si falló.
+    Los bytes/stream pueden pasarse directo a audio_exporter.subir_a_blob sin tocar disco.
+    """
+    #Si el texto está vacío, se cancela la generacion del audio
+    if not texto.strip():
+        print("Texto vacío. Cancelando generación.")
+        return False if nombre_archivo else None
+
+    #Si el mismo texto ya se sintetizó antes, se reutiliza el audio del caché local
+    clave = clave_tts(texto)
+    cacheado = AUDIO_CACHE.leer(clave)
+    if cacheado is not None:
+        print("Audio reutilizado desde caché")
+        if nombre_archivo:
+            _escribir_wav(nombre_archivo, cacheado)
             return True
-        else:
-            print("Azure respondió con contenido NO de audio. No se guarda el archivo.")
-            print("Contenido recibido (primeros 200 caracteres):") #Para debuggear el contenido generado por Azure
-            print(response.text[:200]) #Imprime los primero 200 caracteres del contenido del archivo
-            return False
-    #Si azure no devuelve 200 (success), no se genera el archivo y muestra el error para informacion del usuario
-    else:
-        print(f"Error generando audio: Respuesta: {response.text}")
-        print(f"Error generando audio: Código: {response.status_code}")
-        return False
\ No newline at end of file
+        return iter([cacheado]) if stream else cacheado
+
+    response = _sintetizar(texto, stream=stream and not nombre_archivo)
+    if response is None:
+        return False if nombre_archivo else None
+
+    if stream and not nombre_archivo:
+        return _stream_y_cachear(response, clave)
+
+    AUDIO_CACHE.guardar(clave, response.content)
+    print("Audio generado correctamente")
+    if nombre_archivo:
+        _escribir_wav(nombre_archivo, response.content)
+        return True
+    return response.content
+
+
+async def generar_audio_async(texto):
+    """
+    Versión async de generar_audio (modo ASGI, httpx): devuelve los bytes del WAV o None.
+    Usa y alimenta el mismo caché de audio.
+    """
+    if not texto.strip():
+        print("Texto vacío. Cancelando generación.")
+        return None
+
+    clave = clave_tts(texto)
+    cacheado = AUDIO_CACHE.leer(clave)
+    if cacheado is not None:
+        print("Audio reutilizado desde caché")
+        return cacheado
+
+    endpoint_url, headers, cuerpo = _peticion_tts(texto)
+    cliente = await obtener_http_async()
+    response = await cliente.post(endpoint_url, headers=headers, content=cuerpo)
+    if response.status_code != 200 or not response.headers.get("Content-Type", "").startswith("audio/"):
+        print(f"Error generando audio: Código: {response.status_code} Respuesta: {response.text[:200]}")
+        return None
+
+    AUDIO_CACHE.guardar(clave, response.content)
+    print("Audio generado correctamente")
+    return response.content
@@ -1,15 +1,186 @@
+import asyncio
 import os
-import requests
+import threading
+import time
+from typing import Dict, Tuple
+
+from utils.async_clients import obtener_http_async
+from utils.client_registry import obtener_sesion_http
+from utils.ttl_cache import TTLCache
 
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
 BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5/weather")
 
-def obtener_temp_actual(lat: float, lon: float, unidades: str = "metric", lang: str = "es") -> float:
-    """Devuelve la temperatura actual (°C) usando OpenWeather."""
+# ======== Config por defecto (puede ser sobrescrita por ENV) ========
+# Tamaño de la celda en grados: coordenadas dentro de la misma celda comparten consulta (0.05° ≈ 5.5 km)
+CLIMA_GRID_GRADOS = float(os.getenv("CLIMA_GRID_GRADOS", "0.05"))
+# OpenWeather actualiza el clima actual cada ~10 minutos
+CLIMA_TTL_SEG = int(os.getenv("CLIMA_TTL_SEG", "600"))
+# Si OpenWeather falla, se sirve el último valor conocido hasta esta antigüedad
+CLIMA_STALE_MAX_SEG = int(os.getenv("CLIMA_STALE_MAX_SEG", "10800"))
+# Tras un error, la celda no vuelve a consultar OpenWeather durante este tiempo (rate limit)
+CLIMA_REINTENTO_SEG = int(os.getenv("CLIMA_REINTENTO_SEG", "60"))
+# Sin valor previo, el error se recuerda este tiempo: los pedidos siguientes fallan sin consultar
+CLIMA_ERROR_SEG = int(os.getenv("CLIMA_ERROR_SEG", "15"))
+CLIMA_CACHE_MAX = int(os.getenv("CLIMA_CACHE_MAX", "2000"))
+
+# celda -> (temperatura, obtenido_ts, no_consultar_hasta_ts);
+# vive CLIMA_STALE_MAX_SEG y es "fresca" durante CLIMA_TTL_SEG (o hasta no_consultar_hasta_ts)
+_CACHE = TTLCache(max_items=CLIMA_CACHE_MAX, ttl_seg=CLIMA_STALE_MAX_SEG)
+# celda -> mensaje del último error (solo celdas sin valor conocido)
+_ERRORES = TTLCache(max_items=CLIMA_CACHE_MAX, ttl_seg=CLIMA_ERROR_SEG)
+_EN_VUELO: Dict[tuple, list] = {}  # celda -> [lock, hilos que lo usan]
+_EN_VUELO_ASYNC: Dict[tuple, asyncio.Future] = {}
+_LOCK = threading.Lock()
+_STATS = {"frescos": 0, "consultas": 0, "esperas": 0, "stale": 0, "errores": 0, "errores_cacheados": 0}
+
+
+def celda(lat: float, lon: float) -> Tuple[float, float]:
+    """Centro de la celda de la grilla que contiene (lat, lon)."""
+    g = CLIMA_GRID_GRADOS
+    return round(round(lat / g) * g, 6), round(round(lon / g) * g, 6)
+
+
+def _params(lat: float, lon: float, unidades: str, lang: str) -> dict:
     if not API_KEY:
         raise RuntimeError("Falta OPENWEATHER_API_KEY en el entorno")
-    params = {"lat": lat, "lon": lon, "appid": API_KEY, "units": unidades, "lang": lang}
-    r = requests.get(BASE_URL, params=params, timeout=10)
+    return {"lat": lat, "lon": lon, "appid": API_KEY, "units": unidades, "lang": lang}
+
+
+def _consultar_openweather(lat: float, lon: float, unidades: str, lang: str) -> float:
+    r = obtener_sesion_http().get(BASE_URL, params=_params(lat, lon, unidades, lang), timeout=10)
+    r.raise_for_status()
+    data = r.json()
+    return float(data["main"]["temp"])
+
+
+async def _consultar_openweather_async(lat: float, lon: float, unidades: str, lang: str) -> float:
+    cliente = await obtener_http_async()
+    r = await cliente.get(BASE_URL, params=_params(lat, lon, unidades, lang), timeout=10)
     r.raise_for_status()
     data = r.json()
     return float(data["main"]["temp"])
+
+
+def _fresco(item) -> bool:
+    ahora = time.time()
+    return item is not None and (ahora - item[1] < CLIMA_TTL_SEG or ahora < item[2])
+
+
+def _error_reciente(clave: tuple):
+    """Relanza el error reciente de una celda sin valor conocido (no se vuelve a consultar)."""
+    mensaje = _ERRORES.get(clave)
+    if mensaje is not None:
+        _STATS["errores_cacheados"] += 1
+        raise RuntimeError(mensaje)
+
+
+def _valor_viejo(clave: tuple, item, error: Exception) -> float:
+    """Tras un error de OpenWeather: el último valor de la celda (y pausa de reintentos) o relanza."""
+    _STATS["errores"] += 1
+    if item is None:
+        _ERRORES.set(clave, f"OpenWeather no disponible: {error}")
+        raise error
+    _STATS["stale"] += 1
+    edad = time.time() - item[1]
+    _CACHE.set(clave, (item[0], item[1], time.time() + CLIMA_REINTENTO_SEG),
+               ttl_seg=max(CLIMA_STALE_MAX_SEG - edad, 1))
+    print(f"[CLIMA][WARN] OpenWeather falló ({error}); se usa el valor de hace {edad:.0f}s")
+    return item[0]
+
+
+def obtener_temp_actual(lat: float, lon: float, unidades: str = "metric", lang: str = "es") -> float:
+    """
+    Devuelve la temperatura actual (°C) usando OpenWeather, con caché por celda de la grilla.
+    - Una sola consulta por celda a la vez: los demás pedidos esperan su resultado.
+    - Si OpenWeather falla, devuelve el último valor de la celda (hasta CLIMA_STALE_MAX_SEG);
+      sin valor previo, el error se repite sin consultar durante CLIMA_ERROR_SEG.
+    """
+    lat_c, lon_c = celda(lat, lon)
+    clave = (lat_c, lon_c, unidades)
+
+    item = _CACHE.get(clave)
+    if _fresco(item):
+        _STATS["frescos"] += 1
+        return item[0]
+    if item is None:
+        _error_reciente(clave)
+
+    with _LOCK:
+        # El lock de la celda vive mientras algún hilo lo use (el último lo borra)
+        entrada = _EN_VUELO.setdefault(clave, [threading.Lock(), 0])
+        entrada[1] += 1
+    lock = entrada[0]
+    if not lock.acquire(blocking=False):
+        # Otro hilo ya está consultando esta celda
+        _STATS["esperas"] += 1
+        lock.acquire()
+    try:
+        item = _CACHE.get(clave)
+        if _fresco(item):
+            return item[0]
+        if item is None:
+            _error_reciente(clave)
+        _STATS["consultas"] += 1
+        try:
+            temp = _consultar_openweather(lat_c, lon_c, unidades, lang)
+        except Exception as e:
+            return _valor_viejo(clave, item, e)
+        _CACHE.set(clave, (temp, time.time(), 0.0))
+        return temp
+    finally:
+        lock.release()
+        with _LOCK:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del _EN_VUELO[clave]
+
+
+async def obtener_temp_actual_async(lat: float, lon: float, unidades: str = "metric", lang: str = "es") -> float:
+    """Versión async de obtener_temp_actual (modo ASGI): mismo caché, single-flight con un future por celda."""
+    lat_c, lon_c = celda(lat, lon)
+    clave = (lat_c, lon_c, unidades)
+
+    item = _CACHE.get(clave)
+    if _fresco(item):
+        _STATS["frescos"] += 1
+        return item[0]
+    if item is None:
+        _error_reciente(clave)
+
+    en_vuelo = _EN_VUELO_ASYNC.get(clave)
+    if en_vuelo is not None:
+        _STATS["esperas"] += 1
+        return await asyncio.shield(en_vuelo)
+
+    futuro = asyncio.get_running_loop().create_future()
+    _EN_VUELO_ASYNC[clave] = futuro
+    try:
+        _STATS["consultas"] += 1
+        try:
+            temp = await _consultar_openweather_async(lat_c, lon_c, unidades, lang)
+            _CACHE.set(clave, (temp, time.time(), 0.0))
+        except Exception as e:
+            temp = _valor_viejo(clave, item, e)
+        futuro.set_result(temp)
+        return temp
+    except Exception as e:
+        futuro.set_exception(e)
+        futuro.exception()  # evita el aviso "exception was never retrieved" si nadie esperaba
+        raise
+    finally:
+        del _EN_VUELO_ASYNC[clave]
+
+
+def estado_cache() -> dict:
+    """Contadores del caché; hit_rate = pedidos resueltos sin llamar a OpenWeather."""
+    atendidos = _STATS["frescos"] + _STATS["esperas"] + _STATS["consultas"] + _STATS["errores_cacheados"]
+    return {
+        "grid_grados": CLIMA_GRID_GRADOS,
+        "ttl_seg": CLIMA_TTL_SEG,
+        "stale_max_seg": CLIMA_STALE_MAX_SEG,
+        "celdas": _CACHE.stats()["items"],
+        "celdas_con_error": _ERRORES.stats()["items"],
+        **_STATS,
+        "hit_rate": round(1 - _STATS["consultas"] / atendidos, 3) if atendidos else None,
+    }